@@ -1,42 +1,714 @@
 import google.generativeai as genai
 import os
+import json
+import time
+import re
+import zlib
+import hashlib
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+import numpy as np
 from dotenv import load_dotenv
+import metrics
+from utils import get_financial_glossary
+from intent_router import CalculatorRouter
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+SYSTEM_INSTRUCTION = "Você é o FinAI, um consultor financeiro prático. Use negrito para valores."
+PREFERRED_MODEL = "models/gemini-1.5-flash"
+FALLBACK_MODEL = "gemini-pro"
+
+# Cache em disco do modelo descoberto (evita listar modelos a cada inicialização)
+MODEL_CACHE_FILE = os.path.join("./data", "model_cache.json")
+MODEL_CACHE_TTL = int(os.getenv("FINAI_MODEL_CACHE_TTL", 24 * 3600))
+
+# Cache de respostas (perguntas repetidas de FAQ não voltam ao Gemini)
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = int(os.getenv("FINAI_RESPONSE_CACHE_TTL", 6 * 3600))
+
+# Orçamento do histórico enviado ao modelo (turnos completos + resumo dos antigos)
+HISTORY_TOKEN_BUDGET = int(os.getenv("FINAI_HISTORY_TOKEN_BUDGET", 2000))
+SUMMARY_TOKEN_BUDGET = 300
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Métricas (ver metrics.py): latência do modelo, origem das respostas e falhas
+LLM_SECONDS = metrics.histogram("finai_llm_seconds", "Duração das chamadas ao modelo", ("mode",))
+LLM_FIRST_TOKEN = metrics.histogram("finai_llm_first_token_seconds", "Tempo até o primeiro trecho no streaming")
+LLM_ERRORS = metrics.counter("finai_llm_errors_total", "Chamadas ao modelo que falharam", ("mode", "error"))
+RESPONSES = metrics.counter("finai_responses_total", "Respostas por origem", ("source",))
+_RESPONSE_SOURCE = {fonte: RESPONSES.labels(source=fonte) for fonte in ("calculadora", "glossario", "cache", "modelo", "erro")}
+LOOKUP_SECONDS = metrics.histogram("finai_lookup_seconds", "Busca no glossário e no cache de respostas", buckets=metrics.FAST_BUCKETS)
+
+
+def _read_model_cache(cache_file, ttl):
+    """Retorna o modelo salvo em disco se ainda estiver dentro do TTL"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if time.time() - data["discovered_at"] < ttl:
+            return data["selected_model"]
+    except Exception:
+        pass
+    return None
+
+
+def _write_model_cache(cache_file, selected_model):
+    """Grava o modelo descoberto de forma atômica (arquivo temporário + rename)"""
+    try:
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"selected_model": selected_model, "discovered_at": time.time()}, f)
+        os.replace(tmp_file, cache_file)
+    except Exception:
+        pass
+
+
+def discover_model(cache_file=MODEL_CACHE_FILE, ttl=MODEL_CACHE_TTL, force_refresh=False):
+    """
+    Descobre o modelo a usar, consultando o cache em disco antes de chamar a API
+
+    Args:
+        cache_file: Arquivo JSON com o resultado da última descoberta
+        ttl: Validade do cache em segundos
+        force_refresh: Ignora o cache e lista os modelos novamente
+
+    Returns:
+        Nome do modelo selecionado
+    """
+    if not force_refresh:
+        cached = _read_model_cache(cache_file, ttl)
+        if cached:
+            return cached
+
+    # --- DETECTOR AUTOMÁTICO DE MODELO ---
+    try:
+        # Lista os modelos e pega o primeiro que suporta gerar conteúdo
+        models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+        # Prioriza o flash, se não tiver, pega o primeiro da lista
+        selected_model = PREFERRED_MODEL if PREFERRED_MODEL in models else models[0]
+    except Exception:
+        # Fallback total caso a listagem falhe (não vai para o cache, tenta de novo na próxima)
+        return FALLBACK_MODEL
+
+    _write_model_cache(cache_file, selected_model)
+    return selected_model
+
+
+def normalize_prompt(text):
+    """Minúsculas, sem acentos, sem pontuação e com espaços únicos ("O que é CDI?" -> "o que e cdi")"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s%]", " ", text)
+    return " ".join(text.split())
+
+
+def _text_vector(text, dim=512):
+    """Vetor local de trigramas de caracteres (hash estável), normalizado para cosseno"""
+    padded = f" {text} "
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class GlossaryIndex:
+    """
+    Índice pré-calculado do glossário (utils.get_financial_glossary)
+
+    Perguntas de definição ("o que é CDI?", "significado de liquidez") são
+    respondidas direto do índice, sem chamada ao modelo.
+    """
+
+    QUESTION_PATTERN = re.compile(
+        r"^(?:(?:o )?que (?:e|sao|significa)|qual (?:e )?o significado de|significado de|"
+        r"defina|define|explique o que e|me explica o que e)\s+(?:o |a |os |as |um |uma )?(.+?)$"
+    )
+
+    def __init__(self, glossary=None):
+        glossary = glossary if glossary is not None else get_financial_glossary()
+        self._index = {normalize_prompt(term): (term, definition) for term, definition in glossary.items()}
+
+    def lookup(self, user_input):
+        """Retorna a resposta do glossário ou None se a pergunta não for uma definição conhecida"""
+        normalized = normalize_prompt(user_input)
+        match = self.QUESTION_PATTERN.match(normalized)
+        entry = self._index.get(match.group(1) if match else normalized)
+        if entry is None:
+            return None
+        term, definition = entry
+        return f"**{term}**: {definition}."
+
+
+class ResponseCache:
+    """
+    Cache de respostas do modelo (LRU + TTL, tamanho limitado)
+
+    Camadas:
+    1. Exata: prompt normalizado + digest do histórico
+    2. Similaridade (opcional): cosseno entre vetores locais de trigramas,
+       apenas entre entradas com o mesmo histórico e os mesmos números
+       ("rende 10 mil" nunca reaproveita a resposta de "rende 20 mil")
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, similarity_threshold=None):
+        """
+        Args:
+            max_entries: Máximo de respostas guardadas (as menos usadas saem primeiro)
+            ttl: Validade de cada resposta em segundos
+            similarity_threshold: Cosseno mínimo para a camada de similaridade (None desativa)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()  # chave -> (criado_em, (digest, números), vetor, resposta)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def history_digest(history):
+        payload = json.dumps(history, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _group(normalized, digest):
+        # Só entradas do mesmo grupo (histórico + números citados) podem ser "parecidas"
+        return digest, tuple(re.findall(r"\d+", normalized))
+
+    def get(self, user_input, history):
+        """Retorna a resposta guardada para o prompt/histórico ou None"""
+        normalized = normalize_prompt(user_input)
+        digest = self.history_digest(history)
+        key = (digest, normalized)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[3]
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self.similarity_threshold is not None:
+                answer = self._similar(normalized, self._group(normalized, digest), now)
+                if answer is not None:
+                    self.stats["similar_hits"] += 1
+                    return answer
+
+            self.stats["misses"] += 1
+            return None
+
+    def _similar(self, normalized, group, now):
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry[1] == group and now - entry[0] < self.ttl
+        ]
+        if not candidates:
+            return None
+
+        scores = np.stack([entry[2] for _, entry in candidates]) @ _text_vector(normalized)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        return entry[3]
+
+    def put(self, user_input, history, answer):
+        normalized = normalize_prompt(user_input)
+        digest = self.history_digest(history)
+        vector = _text_vector(normalized) if self.similarity_threshold is not None else None
+
+        with self._lock:
+            self._entries[(digest, normalized)] = (time.time(), self._group(normalized, digest), vector, answer)
+            self._entries.move_to_end((digest, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self):
+        hits = self.stats["hits"] + self.stats["similar_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def estimate_tokens(text):
+    """Estimativa local de tokens (~4 caracteres por token), sem chamada ao count_tokens"""
+    return len(text) // 4 + 1
+
+
+def _summarize_turn(role, text, max_chars=160):
+    # Resumo extrativo: primeira frase do turno, truncada
+    first = re.split(r"(?<=[.!?])\s|\n", text.strip(), maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rstrip() + "..."
+    return f"{'Usuário' if role == 'user' else 'FinAI'}: {first}"
+
+
+class ConversationMemory:
+    """
+    Histórico de conversa limitado por orçamento de tokens
+
+    Turnos recentes ficam completos; quando o orçamento estoura, os pares
+    (usuário, modelo) mais antigos viram linhas de um resumo contínuo, que
+    também tem tamanho limitado. O prompt enviado ao Gemini fica estável
+    mesmo em conversas longas.
+    """
+
+    def __init__(self, token_budget=None, summary_budget=None):
+        """
+        Args:
+            token_budget: Tokens máximos dos turnos completos
+            summary_budget: Tokens máximos do resumo dos turnos antigos
+        """
+        self.token_budget = HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self.summary_budget = SUMMARY_TOKEN_BUDGET if summary_budget is None else summary_budget
+
+        self.turns = deque()          # (role, texto, tokens) em pares user/model
+        self.tokens = 0
+        self.summary = deque()        # (linha, tokens)
+        self.summary_tokens = 0
+
+    def append(self, user_text, model_text):
+        """Acrescenta um par de turnos; retorna True se turnos antigos foram compactados"""
+        for role, text in (("user", user_text), ("model", model_text)):
+            tokens = estimate_tokens(text)
+            self.turns.append((role, text, tokens))
+            self.tokens += tokens
+        return self._trim()
+
+    def _trim(self):
+        trimmed = False
+        # Mantém sempre o par mais recente, mesmo que sozinho estoure o orçamento
+        while self.tokens > self.token_budget and len(self.turns) > 2:
+            for _ in range(2):
+                role, text, tokens = self.turns.popleft()
+                self.tokens -= tokens
+                line = _summarize_turn(role, text)
+                line_tokens = estimate_tokens(line)
+                self.summary.append((line, line_tokens))
+                self.summary_tokens += line_tokens
+            trimmed = True
+
+        while self.summary_tokens > self.summary_budget and self.summary:
+            _, line_tokens = self.summary.popleft()
+            self.summary_tokens -= line_tokens
+        return trimmed
+
+    def history(self):
+        """Histórico no formato do Gemini (resumo primeiro, depois os turnos completos)"""
+        history = []
+        if self.summary:
+            resumo = "\n".join(line for line, _ in self.summary)
+            history.append({"role": "user", "parts": [f"Resumo da conversa anterior:\n{resumo}"]})
+            history.append({"role": "model", "parts": ["Entendido, vou considerar esse contexto."]})
+        for role, text, _ in self.turns:
+            history.append({"role": role, "parts": [text]})
+        return history
+
+    def prompt_tokens(self):
+        return self.tokens + self.summary_tokens
+
+
+class FinAIChat:
+    """
+    Chat persistente de uma sessão (guardar em st.session_state)
+
+    O objeto de chat do Gemini é criado uma vez e recebe os turnos
+    incrementalmente; só é ressincronizado quando a memória compacta
+    turnos antigos ou quando uma resposta veio do cache.
+    """
+
+    def __init__(self, engine, token_budget=None, summary_budget=None):
+        self.engine = engine
+        self.memory = ConversationMemory(token_budget, summary_budget)
+        self._chat = None
+        self._model = None
+
+    def chat(self):
+        # Recria o chat se ainda não existe ou se o modelo foi trocado (refresh_model)
+        if self._chat is None or self._model is not self.engine.model:
+            self._model = self.engine.model
+            self._chat = self._model.start_chat(history=self.memory.history())
+        return self._chat
+
+    def history(self):
+        return self.memory.history()
+
+    def record(self, user_input, answer, synced=True):
+        """
+        Registra o par de turnos na memória
+
+        Args:
+            synced: False quando o turno não passou pelo chat do Gemini (ex: cache)
+        """
+        trimmed = self.memory.append(user_input, answer)
+        if self._chat is not None and (trimmed or not synced):
+            self._chat.history = self.memory.history()
+
+    def invalidate(self):
+        """
+        Descarta o chat do Gemini; o próximo chat() o recria a partir da memória
+
+        Usado depois de erros, respostas bloqueadas e streams abandonados: o
+        ChatSession guarda a resposta quebrada e falharia em todo envio seguinte.
+        """
+        self._chat = None
+
+    def reset(self):
+        self.memory = ConversationMemory(self.memory.token_budget, self.memory.summary_budget)
+        self._chat = None
+
+
 class FinAIEngine:
-    def __init__(self):
+    def __init__(self, cache_file=None, cache_ttl=None, response_cache=None, glossary=None, router=None):
         api_key = os.getenv("GEMINI_API_KEY")
         genai.configure(api_key=api_key)
-        
-        # --- DETECTOR AUTOMÁTICO DE MODELO ---
-        try:
-            # Lista os modelos e pega o primeiro que suporta gerar conteúdo
-            models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-            # Prioriza o flash, se não tiver, pega o primeiro da lista
-            self.selected_model = "models/gemini-1.5-flash" if "models/gemini-1.5-flash" in models else models[0]
-        except Exception:
-            # Fallback total caso a listagem falhe
-            self.selected_model = "gemini-pro"
-
-        self.model = genai.GenerativeModel(
-            model_name=self.selected_model,
-            system_instruction="Você é o FinAI, um consultor financeiro prático. Use negrito para valores."
+
+        self.cache_file = cache_file or MODEL_CACHE_FILE
+        self.cache_ttl = MODEL_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.glossary = glossary if glossary is not None else GlossaryIndex()
+        self.router = router if router is not None else CalculatorRouter()
+        self.stats = {"glossary_hits": 0, "local_calls": 0, "local_seconds": 0.0, "llm_calls": 0, "llm_seconds": 0.0}
+        self._load_model()
+
+    def _load_model(self, force_refresh=False):
+        selected_model = discover_model(self.cache_file, self.cache_ttl, force_refresh)
+        model = genai.GenerativeModel(
+            model_name=selected_model,
+            system_instruction=SYSTEM_INSTRUCTION
         )
+        self.selected_model, self.model = selected_model, model
+
+    def refresh_model(self):
+        """Força nova descoberta do modelo (ignora o cache em disco) e recria o GenerativeModel"""
+        self._load_model(force_refresh=True)
+        return self.selected_model
+
+    def new_chat(self, token_budget=None, summary_budget=None):
+        """Cria o chat persistente de uma sessão"""
+        return FinAIChat(self, token_budget, summary_budget)
+
+    def build_history(self, context, session=None):
+        """Histórico a enviar: o da sessão persistente ou o reconstruído a partir das mensagens"""
+        if session is not None:
+            return session.history()
+        memory = ConversationMemory()
+        history = self._format_history(context)
+        for i in range(0, len(history), 2):
+            memory.append(history[i]["parts"][0], history[i + 1]["parts"][0])
+        return memory.history()
+
+    def start_chat(self, history, session=None):
+        """Chat do modelo com o histórico já montado (ou o chat persistente da sessão)"""
+        if session is not None:
+            return session.chat()
+        # Criamos o chat com o histórico
+        return self.model.start_chat(history=history)
+
+    def local_response(self, user_input, history, calculator=None):
+        """
+        Resposta sem chamar o modelo, na ordem: calculadora (pergunta numérica),
+        glossário pré-indexado e cache de respostas
+        """
+        start = time.perf_counter()
+        answer = self.router.route(user_input, calculator)
+        if answer is not None:
+            self.stats["local_calls"] += 1
+            self.stats["local_seconds"] += time.perf_counter() - start
+            _RESPONSE_SOURCE["calculadora"].inc()
+            return answer
+
+        with LOOKUP_SECONDS.time():
+            answer = self.glossary.lookup(user_input)
+            if answer is not None:
+                self.stats["glossary_hits"] += 1
+                _RESPONSE_SOURCE["glossario"].inc()
+                return answer
+            answer = self.response_cache.get(user_input, history)
+            if answer is not None:
+                _RESPONSE_SOURCE["cache"].inc()
+            return answer
+
+    def record_llm_call(self, start, mode="sync"):
+        """Registra uma chamada ao modelo iniciada em `start` (perf_counter) bem-sucedida"""
+        duration = time.perf_counter() - start
+        self.stats["llm_calls"] += 1
+        self.stats["llm_seconds"] += duration
+        LLM_SECONDS.labels(mode=mode).observe(duration)
+        _RESPONSE_SOURCE["modelo"].inc()
+
+    def record_error(self, error, mode="sync"):
+        """
+        Falha do modelo (chamar dentro do except): contada por tipo de exceção
+        e registrada no log; o usuário recebe a mensagem de erro como resposta
+        """
+        LLM_ERRORS.labels(mode=mode, error=type(error).__name__).inc()
+        _RESPONSE_SOURCE["erro"].inc()
+        # Chamado dentro do except: o log leva o traceback
+        logger.exception("Erro na chamada ao modelo (%s, %s): %s: %s", mode, self.selected_model, type(error).__name__, error)
+        return f"Erro: {str(error)}. Modelo usado: {self.selected_model}"
+
+    def routing_report(self):
+        """Fração de perguntas numéricas resolvidas localmente e latência economizada (estimada)"""
+        local, llm = self.stats["local_calls"], self.stats["llm_calls"]
+        avg_llm = self.stats["llm_seconds"] / llm if llm else 0.0
+        avg_local = self.stats["local_seconds"] / local if local else 0.0
+        return {
+            "local_fraction": local / (local + llm) if local + llm else 0.0,
+            "routed_fraction": self.router.routed_fraction(),
+            "avg_llm_seconds": avg_llm,
+            "avg_local_seconds": avg_local,
+            "latency_saved_seconds": local * (avg_llm - avg_local),
+        }
+
+    def remember(self, user_input, history, answer):
+        """Guarda a resposta completa do modelo no cache de respostas"""
+        self.response_cache.put(user_input, history, answer)
+
+    def generate_response(self, user_input, context, calculator=None, session=None):
+        history = self.build_history(context, session)
+        cached = self.local_response(user_input, history, calculator)
+        if cached is not None:
+            if session is not None:
+                session.record(user_input, cached, synced=False)
+            return cached
 
-    def generate_response(self, user_input, context, calculator=None):
         try:
-            # Criamos o chat com o histórico
-            chat = self.model.start_chat(history=self._format_history(context[-10:]))
+            chat = self.start_chat(history, session)
+            start = time.perf_counter()
             response = chat.send_message(user_input)
+            self.record_llm_call(start)
+            self.remember(user_input, history, response.text)
+            if session is not None:
+                session.record(user_input, response.text)
             return response.text
         except Exception as e:
-            return f"Erro: {str(e)}. Modelo usado: {self.selected_model}"
+            if session is not None:
+                session.invalidate()
+            return self.record_error(e)
+
+    def generate_response_stream(self, user_input, context, calculator=None, session=None):
+        """
+        Versão em streaming de generate_response: gera os trechos do texto
+        conforme o modelo os envia (o usuário vê o primeiro token, não a resposta inteira)
+        """
+        history = self.build_history(context, session)
+        cached = self.local_response(user_input, history, calculator)
+        if cached is not None:
+            if session is not None:
+                session.record(user_input, cached, synced=False)
+            yield cached
+            return
+
+        completa = False
+        try:
+            chat = self.start_chat(history, session)
+            chunks = []
+            start = time.perf_counter()
+            for chunk in chat.send_message(user_input, stream=True):
+                if chunk.text:
+                    if not chunks:
+                        LLM_FIRST_TOKEN.observe(time.perf_counter() - start)
+                    chunks.append(chunk.text)
+                    yield chunk.text
+            self.record_llm_call(start, mode="stream")
+            # Só guarda respostas que chegaram inteiras
+            if chunks:
+                self.remember(user_input, history, "".join(chunks))
+                if session is not None:
+                    session.record(user_input, "".join(chunks))
+                completa = True
+        except Exception as e:
+            yield self.record_error(e, mode="stream")
+        finally:
+            # Erro, resposta vazia/bloqueada ou gerador fechado antes do fim
+            if not completa and session is not None:
+                session.invalidate()
 
     def _format_history(self, context):
+        """
+        Converte mensagens em pares user/model do Gemini
+
+        Aceita o formato do app ({"role", "content"}) e o legado ({"user", "assistant"}).
+        Mensagem de usuário sem resposta (ex: a pergunta atual) fica de fora.
+        """
         history = []
+        pending_user = None
         for msg in context:
             if "user" in msg and "assistant" in msg:
                 history.append({"role": "user", "parts": [msg["user"]]})
                 history.append({"role": "model", "parts": [msg["assistant"]]})
-        return history
\ No newline at end of file
+            elif msg.get("role") == "user":
+                pending_user = msg.get("content", "")
+            elif msg.get("role") == "assistant" and pending_user is not None:
+                history.append({"role": "user", "parts": [pending_user]})
+                history.append({"role": "model", "parts": [msg.get("content", "")]})
+                pending_user = None
+        return history
+
+
+def get_engine():
+    """
+    Retorna a instância de FinAIEngine compartilhada pelo processo
+
+    Streamlit reexecuta o script a cada interação; com a instância única o
+    configure/list_models acontece uma vez só por processo.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = FinAIEngine()
+    return _engine
+
+
+def refresh_engine():
+    """Redescobre o modelo da instância compartilhada e retorna o nome selecionado"""
+    return get_engine().refresh_model()
+
+
+def reset_engine():
+    """Descarta a instância compartilhada (a próxima chamada a get_engine recria)"""
+    global _engine
+    with _engine_lock:
+        _engine = None
+
+
+class AsyncFinAIEngine:
+    """
+    Variante assíncrona do FinAIEngine para atender muitas sessões ao mesmo tempo
+
+    - Limita o número de chamadas simultâneas ao Gemini (max_concurrency)
+    - Fila justa: cada sessão tem sua fila e o despacho é round-robin entre sessões
+    - Coalescência: pedidos idênticos em andamento (mesmo prompt + mesmo histórico)
+      compartilham uma única chamada ao modelo
+    """
+
+    def __init__(self, engine=None, max_concurrency=4, coalesce=True):
+        """
+        Args:
+            engine: FinAIEngine usado para montar o chat (padrão: instância compartilhada)
+            max_concurrency: Máximo de chamadas simultâneas ao modelo
+            coalesce: Reaproveita chamadas idênticas em andamento
+        """
+        self.engine = engine or get_engine()
+        self.max_concurrency = max_concurrency
+        self.coalesce = coalesce
+
+        self._queues = OrderedDict()   # session_id -> deque de pedidos pendentes
+        self._inflight = {}            # fingerprint -> Future compartilhado
+        self._active = 0
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0}
+
+    def fingerprint(self, user_input, history):
+        """Identifica o pedido pelo que de fato é enviado ao modelo"""
+        payload = json.dumps(
+            [self.engine.selected_model, history, user_input],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def generate_response(self, user_input, context, session_id="default", calculator=None):
+        """
+        Equivalente assíncrono de FinAIEngine.generate_response
+
+        `calculator` (taxas de mercado e cache do chamador) responde as
+        perguntas numéricas, como na versão síncrona
+        """
+        self.stats["requests"] += 1
+        history = self.engine.build_history(context)
+        cached = self.engine.local_response(user_input, history, calculator)
+        if cached is not None:
+            return cached
+
+        key = self.fingerprint(user_input, history) if self.coalesce else None
+
+        if key is not None and key in self._inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._inflight[key] = future
+
+        self._queues.setdefault(session_id, deque()).append((key, user_input, history, future))
+        self._dispatch()
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        # Round-robin: pega um pedido da primeira sessão e a manda para o fim da fila
+        while self._active < self.max_concurrency and self._queues:
+            session_id, queue = self._queues.popitem(last=False)
+            pedido = queue.popleft()
+            if queue:
+                self._queues[session_id] = queue
+
+            self._active += 1
+            asyncio.ensure_future(self._run(*pedido))
+
+    async def _run(self, key, user_input, history, future):
+        try:
+            self.stats["upstream_calls"] += 1
+            chat = self.engine.start_chat(history)
+            start = time.perf_counter()
+            response = await chat.send_message_async(user_input)
+            self.engine.record_llm_call(start, mode="async")
+            self.engine.remember(user_input, history, response.text)
+            future.set_result(response.text)
+        except Exception as e:
+            future.set_result(self.engine.record_error(e, mode="async"))
+        finally:
+            self._active -= 1
+            if key is not None:
+                self._inflight.pop(key, None)
+            self._dispatch()
+
+    def submit(self, user_input, context, session_id="default", calculator=None):
+        """
+        Agenda o pedido a partir de código síncrono (ex: threads de sessão do Streamlit)
+
+        Returns:
+            concurrent.futures.Future com o texto da resposta
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.generate_response(user_input, context, session_id, calculator),
+            self._ensure_loop()
+        )
+
+    def _ensure_loop(self):
+        # Todas as sessões compartilham um único event loop em thread de fundo
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="finai-async-engine", daemon=True
+                )
+                self._loop_thread.start()
+        return self._loop
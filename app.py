@@ -1,9 +1,30 @@
 import streamlit as st
+import functools
 import os
+import time
+from collections import deque
+from contextlib import contextmanager
 import plotly.graph_objects as go
-from fpdf import FPDF
-from ai_core import FinAIEngine
-from data_handler import FinancialCalculator
+from streamlit.errors import StreamlitAPIException
+import metrics
+from ai_core import get_engine
+from data_handler import CalculoCache, FinancialCalculator
+from market_data import MarketDataService, make_provider
+from timeseries import TimeSeriesStore
+from reports import PDFReportCache, render_client_report
+from utils import ConversationManager, format_currency, format_dataframe, generate_user_id
+
+# Mensagens renderizadas por rerun (0 = conversa inteira)
+CHAT_WINDOW = int(os.getenv("FINAI_CHAT_WINDOW", "20"))
+DATA_DIR = os.getenv("FINAI_DATA_DIR", "./data")
+# Tempos de cada rerun/fragmento na barra lateral (FINAI_SHOW_TIMINGS=1)
+SHOW_TIMINGS = os.getenv("FINAI_SHOW_TIMINGS") == "1"
+TIMINGS_KEPT = 200
+# Endpoint local de métricas (/metrics e /metrics.json) se a porta for definida
+METRICS_PORT = os.getenv("FINAI_METRICS_PORT")
+RERUN_SECONDS = metrics.histogram("finai_rerun_seconds", "Execuções do script e dos fragmentos do app", ("secao",))
+# Intervalo em que o painel relê o cache de mercado (atualizado em segundo plano)
+DASHBOARD_REFRESH = os.getenv("FINAI_DASHBOARD_REFRESH", "60s")
 
 # Configuração de Página
 st.set_page_config(page_title="FinAI CORE v2.3 Premium", page_icon="🤖", layout="wide")
@@ -16,119 +37,338 @@ st.markdown("""
     .main-header { font-size: 2.5rem !important; font-weight: 900; text-align: center; background: linear-gradient(90deg, #00f2ff, #00ff88); -webkit-background-clip: text; -webkit-text-fill-color: transparent; margin-bottom: 5px; }
     .robot-container { display: flex; justify-content: center; margin: 10px 0; }
     .robot-img { width: 100px; filter: drop-shadow(0 0 10px #00f2ff); transition: all 0.5s ease; }
-    .robot-blink { animation: blink-green 0.8s ease-in-out; }
     @keyframes blink-green {
         0% { transform: scale(1); filter: drop-shadow(0 0 10px #00f2ff); }
         50% { transform: scale(1.1); filter: drop-shadow(0 0 30px #00ff88); }
         100% { transform: scale(1); filter: drop-shadow(0 0 10px #00f2ff); }
     }
+    @keyframes blink-green-again {
+        0% { transform: scale(1); filter: drop-shadow(0 0 10px #00f2ff); }
+        50% { transform: scale(1.1); filter: drop-shadow(0 0 30px #00ff88); }
+        100% { transform: scale(1); filter: drop-shadow(0 0 10px #00f2ff); }
+    }
     [data-testid="stMetric"] { background: rgba(0, 0, 0, 0.4) !important; border: 1px solid #00f2ff !important; border-radius: 10px !important; text-align: center !important; }
 </style>
 """, unsafe_allow_html=True)
 
-# --- FUNÇÃO EXPORTAR PDF (VERSÃO BLINDADA CONTRA UNICODE) ---
-def export_pdf(messages):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Helvetica", 'B', 16) 
-    pdf.cell(200, 10, txt="FinAI CORE - Relatorio de Consultoria", ln=True, align='C')
-    pdf.ln(10)
-    pdf.set_font("Helvetica", size=12)
-    
-    for msg in messages:
-        role = "USUARIO" if msg["role"] == "user" else "FINAI"
-        
-        # Limpa caracteres que a fonte Helvetica não suporta (como o traço longo do Gemini)
-        content = msg["content"].encode('latin-1', 'ignore').decode('latin-1')
-        
-        pdf.multi_cell(0, 10, txt=f"{role}: {content}")
-        pdf.ln(5)
-    
-    # Converte bytearray para bytes para compatibilidade com Streamlit
-    pdf_output = pdf.output(dest='S')
-    return bytes(pdf_output)
-
-def render_neon_chart():
-    meses = ['Set', 'Out', 'Nov', 'Dez', 'Jan', 'Fev']
-    valores = [10.50, 10.75, 11.25, 11.75, 11.75, 11.25]
+def render_schedule(tabela):
+    with st.expander(f"TABELA DE AMORTIZACAO ({tabela.sistema} - {len(tabela)} meses)"):
+        # Só a página visível é montada a cada rerun
+        pagina = st.number_input("Página", min_value=1, max_value=tabela.total_paginas(12), value=1)
+        # A tabela calcula em colunas numéricas; o texto em R$ é só na exibição
+        valores = [coluna for coluna in tabela.COLUNAS if coluna != "mes"]
+        st.dataframe(format_dataframe(tabela.pagina(pagina, tamanho=12), currency_columns=valores), use_container_width=True, hide_index=True)
+        resumo = tabela.resumo()
+        st.caption(f"Total pago: {format_currency(resumo['total_pago'])} | Juros: {format_currency(resumo['total_juros'])}")
+
+@st.cache_resource(max_entries=4)
+def neon_figure(meses, valores):
+    # Montada uma vez por versão da série, não a cada rerun
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=meses, y=valores, mode='lines+markers', line=dict(color='#00f2ff', width=3), marker=dict(size=8, color='#00ff88')))
+    fig.add_trace(go.Scatter(x=list(meses), y=list(valores), mode='lines+markers', line=dict(color='#00f2ff', width=3), marker=dict(size=8, color='#00ff88')))
     fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#00f2ff', family='Orbitron'), height=200, margin=dict(l=20, r=20, t=10, b=10), showlegend=False)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+def render_neon_chart(market):
+    # Meta Selic no fim de cada um dos últimos 6 meses
+    selic = market.get("selic", block=False)
+    if not len(selic):
+        st.caption("Carregando histórico da SELIC...")
+        return
+    mensal = selic.groupby([selic.index.year, selic.index.month]).last().tail(6)
+    meses = tuple(MESES[mes - 1] for _, mes in mensal.index)
+    st.plotly_chart(neon_figure(meses, tuple(mensal.tolist())), use_container_width=True)
+
+def format_rate(valor):
+    return f"{valor:.2f}%".replace(".", ",")
+
+def format_delta(variacao):
+    if variacao is None:
+        return None
+    return f"{variacao:+.2f}%".replace(".", ",")
+
+@st.cache_resource
+def get_calculator():
+    # Calculadora (e cache de cálculos) compartilhada entre sessões:
+    # cenários repetidos, como o padrão 200000 / 0,9% / 120, não são recalculados
+    # Taxas atuais do serviço de mercado; histórico para simulações com taxas
+    # realizadas (preenchido por `python timeseries.py`)
+    return FinancialCalculator(
+        cache=CalculoCache(max_entries=2048), mercado=get_market_data(),
+        historico=TimeSeriesStore(os.path.join(DATA_DIR, "history"))
+    )
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def cached_calculation(chave, _calculator, _metodo, _args):
+    # Só `chave` entra no hash do Streamlit: é a mesma chave normalizada do CalculoCache
+    return getattr(_calculator, _metodo)(*_args)
+
+def calcular(calculator, metodo, *args):
+    chave = calculator.chave_cache(metodo, *args)
+    if chave is None:
+        return getattr(calculator, metodo)(*args)
+    return cached_calculation(chave, calculator, metodo, args)
+
+@st.cache_resource
+def get_pdf_cache():
+    # Documento diagramado por conversa: novas mensagens só são acrescentadas
+    return PDFReportCache()
+
+@st.cache_resource
+def get_market_data():
+    # Séries de mercado compartilhadas por todas as sessões do processo
+    # (provedor em FINAI_MARKET_PROVIDER; cache em disco em DATA_DIR/market)
+    return MarketDataService(make_provider(), os.path.join(DATA_DIR, "market"))
+
+@st.cache_resource
+def metrics_endpoint():
+    # Um servidor por processo, em thread própria (não depende dos reruns)
+    return metrics.start_http_server(int(METRICS_PORT))
+
+@st.cache_resource
+def get_conversation_manager():
+    return ConversationManager(DATA_DIR)
+
+def get_user_id():
+    # Histórico gravado só para quem entrou (st.login, se configurado) ou para
+    # esta sessão do navegador: um ID na URL abriria a conversa de outra pessoa
+    # a quem tivesse o link
+    if "user_id" not in st.session_state:
+        identidade = getattr(st.user, "sub", None) or getattr(st.user, "email", None) \
+            if getattr(st.user, "is_logged_in", False) else None
+        st.session_state.user_id = generate_user_id(identidade)
+    return st.session_state.user_id
+
+def load_window(manager, user_id):
+    # Só a cauda da conversa é lida e renderizada: custo por rerun constante
+    if CHAT_WINDOW:
+        st.session_state.messages, st.session_state.older_cursor = manager.load_conversation_page(user_id, CHAT_WINDOW)
+    else:
+        st.session_state.messages, st.session_state.older_cursor = manager.load_conversation(user_id), None
+    st.session_state.expanded = False
+
+def load_older(manager, user_id):
+    # Próxima página (mais antiga), lida do store a partir do cursor
+    older, st.session_state.older_cursor = manager.load_conversation_page(
+        user_id, CHAT_WINDOW, before=st.session_state.older_cursor
+    )
+    st.session_state.messages = older + st.session_state.messages
+    st.session_state.expanded = True
+
+def save_message(manager, user_id, message):
+    manager.append_message(user_id, message)
+    st.session_state.messages.append(message)
+    if CHAT_WINDOW and not st.session_state.expanded and len(st.session_state.messages) > CHAT_WINDOW:
+        load_window(manager, user_id)
+
+def rerun_fragment():
+    # Num clique o fragmento roda sozinho e só ele é reexecutado; quando roda
+    # dentro do script inteiro (primeira carga) scope="fragment" não é aceito
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def prime_chat(chat_session, messages):
+    # Turnos já salvos entram na memória do chat (nova sessão, mesma conversa)
+    for anterior, atual in zip(messages, messages[1:]):
+        if anterior["role"] == "user" and atual["role"] == "assistant":
+            chat_session.record(anterior["content"], atual["content"])
+
+def render_messages(manager, user_id):
+    if st.session_state.older_cursor is not None:
+        if st.button("⬆ CARREGAR MENSAGENS ANTERIORES"):
+            load_older(manager, user_id)
+            rerun_fragment()
+    elif st.session_state.expanded:
+        st.caption("Início da conversa")
+
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.write(msg["content"])
+
+    if st.session_state.expanded and st.button("⬇ MOSTRAR SÓ AS RECENTES"):
+        load_window(manager, user_id)
+        rerun_fragment()
+
+def record_timing(secao, segundos):
+    RERUN_SECONDS.labels(secao=secao).observe(segundos)
+    if "rerun_timings" not in st.session_state:
+        st.session_state.rerun_timings = deque(maxlen=TIMINGS_KEPT)
+    st.session_state.rerun_timings.append((secao, segundos))
+
+@contextmanager
+def timed(secao):
+    # Tempo de cada execução do script ou de um fragmento (ver render_timings)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(secao, time.perf_counter() - inicio)
+
+def timed_fragment(secao, **kwargs):
+    # st.fragment que registra o tempo de cada execução: um clique dentro do
+    # fragmento reexecuta só a função decorada, não o script inteiro
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            with timed(secao):
+                return func(*args, **kw)
+        return st.fragment(wrapper, **kwargs)
+    return decorator
+
+def render_timings():
+    with st.expander("TEMPOS DE RERUN"):
+        por_secao = {}
+        for secao, segundos in st.session_state.get("rerun_timings", ()):
+            por_secao.setdefault(secao, []).append(segundos * 1000)
+        for secao, tempos in sorted(por_secao.items()):
+            st.caption(f"{secao}: último {tempos[-1]:.1f} ms | mediana {sorted(tempos)[len(tempos) // 2]:.1f} ms ({len(tempos)}x)")
+
+@timed_fragment("dashboard", run_every=DASHBOARD_REFRESH)
+def dashboard_panel():
+    # Só lê o cache: séries vencidas são atualizadas em segundo plano e
+    # aparecem na próxima execução do fragmento (run_every)
+    market = get_market_data()
+    dados = market.snapshot()
+    selic, ipca, cdi, ibov = dados["selic"], dados["ipca_12m"], dados["cdi"], dados["ibovespa"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("SELIC (META)", format_rate(selic["valor"]), format_delta(selic["variacao"]))
+    m2.metric("IPCA (12M)", format_rate(ipca["valor"]), format_delta(ipca["variacao"]), delta_color="inverse")
+    m3.metric("CDI (HOJE)", format_rate(cdi["valor"]), format_delta(cdi["variacao"]))
+    # Séries que o provedor não oferece (o Ibovespa no BCB) ficam no valor de referência
+    m4.metric("IBOVESPA" if ibov["supported"] else "IBOVESPA (REF.)", f"{ibov['valor']:,.0f}".replace(",", "."), format_delta(ibov["variacao"]))
+    if any(d["data"] is None for d in dados.values() if d["supported"]):
+        st.caption("Valores de referência: aguardando o provedor de dados de mercado")
+    render_neon_chart(market)
+
+def render_blink():
+    # O robô fica fora do fragmento da calculadora, que é o único reexecutado no
+    # clique: a animação vem de um <style> emitido pelo fragmento. Alternar o nome
+    # da animação a cada cálculo faz o navegador reiniciá-la
+    if st.session_state.blink:
+        animacao = "blink-green" if st.session_state.blink % 2 else "blink-green-again"
+        st.markdown(f"<style>.robot-img {{ animation: {animacao} 0.8s ease-in-out; }}</style>", unsafe_allow_html=True)
+
+@timed_fragment("calculadora")
+def calculator_panel(calculator, manager, user_id):
+    calc = st.selectbox("Escolha o Módulo:", ["Juros Compostos", "Financiamento"])
+
+    if calc == "Juros Compostos":
+        p = st.number_input("Capital Inicial (R$)", value=1000.0)
+        t = st.number_input("Taxa Anual (%)", value=10.0)
+        a = st.number_input("Anos", value=5)
+        if st.button("CALCULAR"):
+            res = calcular(calculator, "juros_compostos", p, t/100, a)
+            st.session_state.last_result = f"PROJECAO JUROS: R$ {res:,.2f}"
+            st.session_state.simulacao = {"tipo": "investimento", "parametros": {"principal": p, "aporte_mensal": 0, "taxa": t/100, "prazo": a}}
+            st.session_state.blink += 1
+
+    elif calc == "Financiamento":
+        v = st.number_input("Valor Total (R$)", value=200000.0)
+        taxa_m = st.number_input("Taxa Mensal (%)", value=0.9)
+        meses = st.number_input("Qtd Meses", value=120)
+        sistema = st.selectbox("Sistema", ["PRICE", "SAC", "SACRE"])
+        if st.button("CALCULAR PARCELA"):
+            tabela = calcular(calculator, "gerar_tabela_amortizacao", v, taxa_m/100, int(meses), sistema)
+            res = tabela.resumo()["primeira_parcela"]
+            st.session_state.tabela = tabela
+            st.session_state.last_result = f"PARCELA MENSAL: R$ {res:,.2f}" if sistema == "PRICE" else f"PRIMEIRA PARCELA ({sistema}): R$ {res:,.2f}"
+            st.session_state.simulacao = {"tipo": "financiamento", "parametros": {"valor": v, "taxa_mensal": taxa_m/100, "prazo_meses": int(meses), "sistema": sistema}}
+            st.session_state.blink += 1
+
+    render_blink()
+    if st.session_state.last_result:
+        st.success(st.session_state.last_result)
+    if st.session_state.tabela is not None:
+        render_schedule(st.session_state.tabela)
+    if st.session_state.simulacao:
+        # Relatório com gráfico e tabela da última simulação, também gerado só no clique
+        simulacao = st.session_state.simulacao
+        st.download_button(
+            "📊 RELATORIO DA SIMULACAO",
+            data=lambda: render_client_report(simulacao, calculator),
+            file_name=f"simulacao_{simulacao['tipo']}.pdf", mime="application/pdf"
+        )
+
+    st.divider()
+    # PDF gerado só no clique, numa thread do servidor (callable do download_button)
+    tabela = st.session_state.tabela
+    st.download_button(
+        "📥 BAIXAR RELATORIO PDF",
+        data=lambda: get_pdf_cache().build(user_id, manager.iter_conversation(user_id), tabela),
+        file_name="consultoria_finai.pdf", mime="application/pdf"
+    )
+
+@timed_fragment("chat")
+def chat_panel(manager, user_id, ai_engine, calculator):
+    render_messages(manager, user_id)
+
+    if prompt := st.chat_input("Consulte o FinAI..."):
+        save_message(manager, user_id, {"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.write(prompt)
+
+        full_prompt = f"(Contexto: {st.session_state.last_result}) {prompt}" if st.session_state.last_result else prompt
+        # Streaming: a resposta aparece conforme o modelo gera os trechos
+        with st.chat_message("assistant"):
+            response = st.write_stream(ai_engine.generate_response_stream(
+                full_prompt, st.session_state.messages, calculator=calculator, session=st.session_state.chat_session
+            ))
+        save_message(manager, user_id, {"role": "assistant", "content": response})
+        rerun_fragment()
 
 def main():
-    if 'blink' not in st.session_state: st.session_state.blink = False
+    with timed("script"):
+        run_app()
+
+def run_app():
+    if 'blink' not in st.session_state: st.session_state.blink = 0
     if 'last_result' not in st.session_state: st.session_state.last_result = None
-    if "messages" not in st.session_state: st.session_state.messages = []
+    if 'tabela' not in st.session_state: st.session_state.tabela = None
+    if 'simulacao' not in st.session_state: st.session_state.simulacao = None
+
+    with timed("recursos"):
+        if METRICS_PORT:
+            metrics_endpoint()
+        manager = get_conversation_manager()
+        user_id = get_user_id()
+        if "messages" not in st.session_state: load_window(manager, user_id)
+
+        # Instância única por processo (modelo já descoberto, sem list_models a cada rerun)
+        ai_engine = get_engine()
+        # Chat persistente da sessão: histórico incremental e limitado por tokens
+        if "chat_session" not in st.session_state:
+            st.session_state.chat_session = ai_engine.new_chat()
+            prime_chat(st.session_state.chat_session, st.session_state.messages)
+        calculator = get_calculator()
 
     st.markdown('<h1 class="main-header">FINAI CORE v2.3</h1>', unsafe_allow_html=True)
-    
-    blink_class = "robot-blink" if st.session_state.blink else ""
     robot_url = "https://cdn-icons-png.flaticon.com/512/4712/4712139.png"
-    st.markdown(f'<div class="robot-container"><img src="{robot_url}" class="robot-img {blink_class}"></div>', unsafe_allow_html=True)
-    st.session_state.blink = False
+    st.markdown(f'<div class="robot-container"><img src="{robot_url}" class="robot-img"></div>', unsafe_allow_html=True)
 
-    m1, m2, m3, m4 = st.columns(4)
-    m1.metric("SELIC (META)", "11,25%", "+0,50%")
-    m2.metric("IPCA (12M)", "3,95%", "-0,10%", delta_color="inverse")
-    m3.metric("CDI (HOJE)", "11,15%", "0,00%")
-    m4.metric("IBOVESPA", "134.500", "+1,15%")
-    
-    render_neon_chart()
+    dashboard_panel()
     st.markdown("---")
 
-    ai_engine = FinAIEngine()
-    calculator = FinancialCalculator()
-
     with st.sidebar:
         st.markdown("<h3 style='color:#00f2ff;'>PAINEL DE CONTROLE</h3>", unsafe_allow_html=True)
-        calc = st.selectbox("Escolha o Módulo:", ["Juros Compostos", "Financiamento"])
-        
-        if calc == "Juros Compostos":
-            p = st.number_input("Capital Inicial (R$)", value=1000.0)
-            t = st.number_input("Taxa Anual (%)", value=10.0)
-            a = st.number_input("Anos", value=5)
-            if st.button("CALCULAR"):
-                res = calculator.juros_compostos(p, t/100, a)
-                st.session_state.last_result = f"PROJECAO JUROS: R$ {res:,.2f}"
-                st.session_state.blink = True 
-                st.rerun()
-
-        elif calc == "Financiamento":
-            v = st.number_input("Valor Total (R$)", value=200000.0)
-            taxa_m = st.number_input("Taxa Mensal (%)", value=0.9)
-            meses = st.number_input("Qtd Meses", value=120)
-            if st.button("CALCULAR PARCELA"):
-                res = calculator.calcular_financiamento(v, taxa_m/100, meses)
-                st.session_state.last_result = f"PARCELA MENSAL: R$ {res:,.2f}"
-                st.session_state.blink = True
-                st.rerun()
-
-        if st.session_state.last_result:
-            st.success(st.session_state.last_result)
-
-        st.divider()
-        if st.session_state.messages:
-            # Geração segura do PDF
-            pdf_data = export_pdf(st.session_state.messages)
-            st.download_button("📥 BAIXAR RELATORIO PDF", data=pdf_data, file_name="consultoria_finai.pdf", mime="application/pdf")
-        
+        calculator_panel(calculator, manager, user_id)
+
         if st.button("REINICIAR TUDO"):
-            st.session_state.messages = []
+            manager.delete_conversation(user_id)
+            load_window(manager, user_id)
             st.session_state.last_result = None
+            st.session_state.tabela = None
+            st.session_state.simulacao = None
+            st.session_state.chat_session.reset()
             st.rerun()
 
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
+        if SHOW_TIMINGS:
+            render_timings()
 
-    if prompt := st.chat_input("Consulte o FinAI..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.spinner("PROCESSANDO..."):
-            full_prompt = f"(Contexto: {st.session_state.last_result}) {prompt}" if st.session_state.last_result else prompt
-            response = ai_engine.generate_response(full_prompt, st.session_state.messages)
-        st.session_state.messages.append({"role": "assistant", "content": response})
-        st.rerun()
+    chat_panel(manager, user_id, ai_engine, calculator)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,1527 @@
+"""
+FinAI Companion - Benchmarks
+Medições de desempenho dos módulos principais
+
+Uso:
+    python benchmarks.py              # executa todos
+    python benchmarks.py engine_startup
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {}
+
+
+def benchmark(func: Callable[[], None]) -> Callable[[], None]:
+    """Registra uma função de benchmark pelo nome"""
+    BENCHMARKS[func.__name__.replace("bench_", "")] = func
+    return func
+
+
+def measure(func: Callable, repeat: int = 5) -> List[float]:
+    """Executa func `repeat` vezes e retorna os tempos em segundos"""
+    tempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def report(titulo: str, linhas: List[tuple]) -> None:
+    """Imprime uma tabela simples (rótulo, valor)"""
+    print(f"\n=== {titulo} ===")
+    largura = max(len(str(rotulo)) for rotulo, _ in linhas)
+    for rotulo, valor in linhas:
+        print(f"  {str(rotulo):<{largura}}  {valor}")
+
+
+def percentile(valores: List[float], p: float) -> float:
+    """Percentil por posição (nearest-rank) de uma lista de valores"""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[indice]
+
+
+def _ms(segundos: float) -> str:
+    return f"{segundos * 1000:10.3f} ms"
+
+
+@contextmanager
+def fake_gemini(**kwargs):
+    """Troca google.generativeai pelo FakeGenAI e isola o cache de modelo num diretório temporário"""
+    import ai_core
+    from fake_genai import FakeGenAI
+
+    fake = FakeGenAI(**kwargs)
+    original_genai, original_cache = ai_core.genai, ai_core.MODEL_CACHE_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        ai_core.genai = fake
+        ai_core.MODEL_CACHE_FILE = os.path.join(tmp, "model_cache.json")
+        ai_core.reset_engine()
+        try:
+            yield fake
+        finally:
+            ai_core.reset_engine()
+            ai_core.genai, ai_core.MODEL_CACHE_FILE = original_genai, original_cache
+
+
+@benchmark
+def bench_engine_startup() -> None:
+    """Custo de obter o FinAIEngine: frio, cache em disco e instância compartilhada"""
+    import ai_core
+
+    with fake_gemini(list_latency=0.3) as fake:
+        # Sem cache: cada construção lista os modelos
+        frio = measure(lambda: ai_core.FinAIEngine(cache_ttl=0), repeat=3)
+
+        # Cache em disco válido: simula um processo novo
+        ai_core.FinAIEngine()
+        disco = measure(ai_core.FinAIEngine, repeat=20)
+
+        # Instância do processo: o que cada rerun do Streamlit paga
+        ai_core.get_engine()
+        compartilhada = measure(ai_core.get_engine, repeat=1000)
+
+    report("engine_startup (list_models simulado = 300 ms)", [
+        ("sem cache (média)", _ms(sum(frio) / len(frio))),
+        ("cache em disco (média)", _ms(sum(disco) / len(disco))),
+        ("get_engine() (média)", _ms(sum(compartilhada) / len(compartilhada))),
+        ("chamadas list_models", fake.list_calls),
+    ])
+
+
+@benchmark
+def bench_streaming() -> None:
+    """Tempo até o primeiro trecho (streaming) versus resposta completa (bloqueante)"""
+    import ai_core
+
+    with fake_gemini(list_latency=0, response_latency=1.0, chunk_size=8):
+        engine = ai_core.FinAIEngine(response_cache=ai_core.ResponseCache(max_entries=0))
+        pergunta = "Vale a pena investir em CDB ou Tesouro Selic hoje?"
+
+        inicio = time.perf_counter()
+        engine.generate_response(pergunta, [])
+        bloqueante = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        primeiro = None
+        trechos = 0
+        for _ in engine.generate_response_stream(pergunta, []):
+            trechos += 1
+            if primeiro is None:
+                primeiro = time.perf_counter() - inicio
+        total_stream = time.perf_counter() - inicio
+
+    report("streaming (resposta simulada de 1 s)", [
+        ("bloqueante: primeira exibição", _ms(bloqueante)),
+        ("stream: primeiro trecho", _ms(primeiro)),
+        ("stream: resposta completa", _ms(total_stream)),
+        ("trechos recebidos", trechos),
+    ])
+
+
+@benchmark
+def bench_async_load() -> None:
+    """Carga concorrente contra servidor simulado: latência p50/p95/p99 e vazão"""
+    import asyncio
+    import random
+    import ai_core
+
+    sessoes, pedidos_por_sessao = 40, 5
+    faq = ["O que é CDI?", "Vale a pena poupança?", "O que é Tesouro Selic?", "O que é FGC?", "CDB ou LCI?"]
+
+    def gerar_pedidos(seed: int) -> List[List[str]]:
+        rng = random.Random(seed)
+        # Metade das perguntas repete o FAQ (mesmo histórico vazio => coalescíveis)
+        return [
+            [rng.choice(faq) if rng.random() < 0.5 else f"Pergunta única {s}-{i}" for i in range(pedidos_por_sessao)]
+            for s in range(sessoes)
+        ]
+
+    async def executar(enviar) -> tuple:
+        latencias = []
+
+        async def sessao(indice: int, perguntas: List[str]) -> None:
+            for pergunta in perguntas:
+                inicio = time.perf_counter()
+                await enviar(pergunta, f"sessao-{indice}")
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(sessao(i, p) for i, p in enumerate(gerar_pedidos(42))))
+        return latencias, time.perf_counter() - inicio
+
+    cenarios = [("sem limite (1 chamada por pedido)", None, False)]
+    for limite in (4, 8, 16):
+        cenarios.append((f"async max={limite} sem coalescência", limite, False))
+        cenarios.append((f"async max={limite} com coalescência", limite, True))
+
+    linhas = []
+    for nome, limite, coalesce in cenarios:
+        with fake_gemini(list_latency=0, response_latency=0.05, server_capacity=8) as fake:
+            # Sem cache de respostas/glossário: mede só fila e coalescência
+            engine = ai_core.FinAIEngine(
+                response_cache=ai_core.ResponseCache(max_entries=0), glossary=ai_core.GlossaryIndex({})
+            )
+            if limite is None:
+                async def enviar(pergunta, sessao_id):
+                    return (await engine.start_chat([]).send_message_async(pergunta)).text
+            else:
+                motor = ai_core.AsyncFinAIEngine(engine, max_concurrency=limite, coalesce=coalesce)
+
+                async def enviar(pergunta, sessao_id):
+                    return await motor.generate_response(pergunta, [], session_id=sessao_id)
+
+            latencias, duracao = asyncio.run(executar(enviar))
+            linhas.append((
+                nome,
+                f"p50 {percentile(latencias, 50) * 1000:7.1f} ms | "
+                f"p95 {percentile(latencias, 95) * 1000:7.1f} ms | "
+                f"p99 {percentile(latencias, 99) * 1000:7.1f} ms | "
+                f"{len(latencias) / duracao:7.1f} req/s | "
+                f"chamadas {fake.send_calls}"
+            ))
+
+    report(f"async_load ({sessoes} sessões x {pedidos_por_sessao} pedidos, servidor 8 vagas, 50 ms)", linhas)
+
+
+@benchmark
+def bench_response_cache() -> None:
+    """Tráfego de FAQ repetido: chamadas ao modelo e latência com e sem cache de respostas"""
+    import random
+    import ai_core
+
+    perguntas = [
+        "O que é CDI?", "o que e cdi", "O que é o CDI ?", "Vale a pena poupança?", "vale a pena poupanca",
+        "Poupança vale a pena?", "O que é Tesouro Direto?", "Como funciona o FGC?", "Qual a diferença entre CDB e LCI?",
+        "Qual a diferença entre CDB e LCI", "Significado de liquidez", "Como montar reserva de emergência?",
+    ]
+    rng = random.Random(7)
+    trafego = [rng.choice(perguntas) if rng.random() < 0.8 else f"Pergunta única {i}" for i in range(300)]
+
+    cenarios = [
+        ("sem cache", lambda: ai_core.ResponseCache(max_entries=0), {}),
+        ("cache exato", lambda: ai_core.ResponseCache(), {}),
+        ("cache exato + glossário", lambda: ai_core.ResponseCache(), None),
+        ("exato + similaridade 0.85 + glossário", lambda: ai_core.ResponseCache(similarity_threshold=0.85), None),
+    ]
+
+    linhas = []
+    for nome, criar_cache, glossario in cenarios:
+        with fake_gemini(list_latency=0, response_latency=0.01) as fake:
+            engine = ai_core.FinAIEngine(
+                response_cache=criar_cache(),
+                glossary=ai_core.GlossaryIndex(glossario) if glossario is not None else None
+            )
+            inicio = time.perf_counter()
+            for pergunta in trafego:
+                engine.generate_response(pergunta, [])
+            duracao = time.perf_counter() - inicio
+            cache = engine.response_cache
+            linhas.append((
+                nome,
+                f"{duracao * 1000:8.1f} ms | chamadas ao modelo {fake.send_calls:3d} | "
+                f"hits {cache.stats['hits']:3d} | similares {cache.stats['similar_hits']:3d} | "
+                f"glossário {engine.stats['glossary_hits']:3d}"
+            ))
+
+    report(f"response_cache ({len(trafego)} perguntas, 80% FAQ, modelo simulado 10 ms)", linhas)
+
+
+@benchmark
+def bench_history() -> None:
+    """Conversa longa: tamanho do prompt e custo local por turno (reconstrução x sessão persistente)"""
+    import ai_core
+
+    turnos = 400
+    with fake_gemini(list_latency=0) as fake:
+        engine = ai_core.FinAIEngine(response_cache=ai_core.ResponseCache(max_entries=0))
+
+        # Sem sessão: reconstrói o histórico a partir de todas as mensagens a cada chamada
+        mensagens, tempos_sem = [], []
+        for i in range(turnos):
+            pergunta = f"Pergunta {i}: quanto devo guardar por mês?"
+            inicio = time.perf_counter()
+            resposta = engine.generate_response(pergunta, mensagens)
+            tempos_sem.append(time.perf_counter() - inicio)
+            mensagens += [{"role": "user", "content": pergunta}, {"role": "assistant", "content": resposta}]
+
+        # Com sessão persistente: turnos incrementais
+        sessao, tempos_com = engine.new_chat(), []
+        for i in range(turnos):
+            inicio = time.perf_counter()
+            engine.generate_response(f"Pergunta {i}: quanto devo guardar por mês?", [], session=sessao)
+            tempos_com.append(time.perf_counter() - inicio)
+
+        prompt_completo = sum(ai_core.estimate_tokens(m["content"]) for m in mensagens)
+        prompt_sessao = sessao.memory.prompt_tokens()
+
+    report(f"history ({turnos} turnos, mediana dos 20 primeiros / 20 últimos)", [
+        ("reconstruído", f"{_ms(percentile(tempos_sem[:20], 50))} / {_ms(percentile(tempos_sem[-20:], 50))}"),
+        ("sessão persistente", f"{_ms(percentile(tempos_com[:20], 50))} / {_ms(percentile(tempos_com[-20:], 50))}"),
+        ("tokens histórico completo", prompt_completo),
+        ("tokens enviados pela sessão", prompt_sessao),
+    ])
+
+
+@benchmark
+def bench_router() -> None:
+    """Perguntas numéricas resolvidas pela calculadora local versus LLM"""
+    import random
+    import ai_core
+
+    numericas = [
+        "Quanto rende 10 mil a 10% ao ano em 5 anos?",
+        "quanto rende R$ 25.000,00 a 0,8% ao mês por 36 meses",
+        "Qual a parcela de um financiamento de 200 mil a 0,9% ao mês em 120 meses?",
+        "financiamento SAC de 300.000 a 1% a.m. em 30 anos",
+        "Quanto preciso guardar por mês para juntar 100 mil em 10 anos a 8% ao ano?",
+        "quanto terei investindo 5 mil com aportes de 500 por mês a 12% ao ano em 20 anos",
+    ]
+    abertas = [
+        "Vale a pena investir em CDB?", "Como montar minha reserva de emergência?",
+        "quanto rende 10 mil na poupança em 5 anos", "CDB de 110% do CDI rende quanto em 2 anos com 10 mil?",
+    ]
+    rng = random.Random(3)
+    trafego = [rng.choice(numericas) if rng.random() < 0.5 else rng.choice(abertas) for _ in range(200)]
+
+    with fake_gemini(list_latency=0, response_latency=0.05):
+        engine = ai_core.FinAIEngine(response_cache=ai_core.ResponseCache(max_entries=0), glossary=ai_core.GlossaryIndex({}))
+        inicio = time.perf_counter()
+        for pergunta in trafego:
+            engine.generate_response(pergunta, [])
+        duracao = time.perf_counter() - inicio
+        relatorio = engine.routing_report()
+
+    report(f"router ({len(trafego)} perguntas, ~50% numéricas, LLM simulado 50 ms)", [
+        ("servidas localmente", f"{relatorio['local_fraction'] * 100:.1f}%"),
+        ("latência média local", _ms(relatorio["avg_local_seconds"])),
+        ("latência média LLM", _ms(relatorio["avg_llm_seconds"])),
+        ("latência economizada", f"{relatorio['latency_saved_seconds']:.2f} s de {duracao:.2f} s"),
+    ])
+
+
+def _cenarios_calculadora(n: int, seed: int = 0) -> Dict[str, "np.ndarray"]:
+    """Parâmetros aleatórios realistas para os benchmarks da calculadora"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return {
+        "principal": rng.uniform(1_000, 500_000, n).round(2),
+        "taxa": rng.uniform(0.02, 0.15, n),
+        "anos": rng.integers(1, 41, n),
+        "aporte": rng.choice([0.0, 100.0, 500.0, 1_500.0], n),
+        "taxa_mensal": rng.uniform(0.003, 0.02, n),
+        "meses": rng.integers(12, 421, n),
+        "retorno": rng.uniform(0.5, 3.0, n),
+        "dias": rng.integers(1, 1_500, n),
+        "inflacao": rng.uniform(0.0, 0.12, n),
+    }
+
+
+@benchmark
+def bench_batch_calculator() -> None:
+    """Laços escalares x versões em lote (NumPy) da FinancialCalculator, de 1e3 a 1e7 cenários"""
+    import numpy as np
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    # Laço escalar acima deste tamanho é extrapolado (FINAI_BENCH_FULL=1 mede tudo)
+    limite_escalar = 10 ** 7 if os.getenv("FINAI_BENCH_FULL") else 10 ** 5
+
+    metodos = {
+        "juros_compostos": (
+            lambda p, i: calc.juros_compostos(p["principal"][i], p["taxa"][i], p["anos"][i], p["aporte"][i]),
+            lambda p: calc.juros_compostos_lote(p["principal"], p["taxa"], p["anos"], p["aporte"]),
+        ),
+        "financiamento PRICE": (
+            lambda p, i: calc.calcular_financiamento(p["principal"][i], p["taxa_mensal"][i], p["meses"][i]),
+            lambda p: calc.calcular_financiamento_lote(p["principal"], p["taxa_mensal"], p["meses"]),
+        ),
+        "financiamento SAC": (
+            lambda p, i: calc.calcular_financiamento(p["principal"][i], p["taxa_mensal"][i], p["meses"][i], "SAC"),
+            lambda p: calc.calcular_financiamento_lote(p["principal"], p["taxa_mensal"], p["meses"], "SAC"),
+        ),
+        "poupanca_objetivo": (
+            lambda p, i: calc.calcular_poupanca_objetivo(p["principal"][i], p["taxa"][i], p["anos"][i])["aporte_mensal"],
+            lambda p: calc.calcular_poupanca_objetivo_lote(p["principal"], p["taxa"], p["anos"])["aporte_mensal"].to_numpy(),
+        ),
+        "roi": (
+            lambda p, i: calc.calcular_roi(p["principal"][i], p["principal"][i] * p["retorno"][i])["roi_percentual"],
+            lambda p: calc.calcular_roi_lote(p["principal"], p["principal"] * p["retorno"])["roi_percentual"].to_numpy(),
+        ),
+        "imposto_renda": (
+            lambda p, i: calc.calcular_imposto_renda_investimento(p["principal"][i], p["dias"][i])["rendimento_liquido"],
+            lambda p: calc.calcular_imposto_renda_investimento_lote(p["principal"], p["dias"])["rendimento_liquido"].to_numpy(),
+        ),
+        "inflacao_real": (
+            lambda p, i: calc.calcular_inflacao_real(p["taxa"][i], p["inflacao"][i]),
+            lambda p: calc.calcular_inflacao_real_lote(p["taxa"], p["inflacao"]),
+        ),
+    }
+
+    linhas = []
+    for nome, (escalar, lote) in metodos.items():
+        # Conferência ao centavo numa amostra
+        amostra = _cenarios_calculadora(10_000, seed=1)
+        esperado = np.array([escalar(amostra, i) for i in range(10_000)])
+        diferenca = np.abs(lote(amostra) - esperado).max()
+
+        por_cenario = 0.0
+        for expoente in range(3, 8):
+            n = 10 ** expoente
+            params = _cenarios_calculadora(n)
+            tempo_lote = min(measure(lambda: lote(params), repeat=3 if n < 10 ** 7 else 1))
+            if n <= limite_escalar:
+                tempo_escalar = measure(lambda: [escalar(params, i) for i in range(n)], repeat=1)[0]
+                por_cenario, rotulo = tempo_escalar / n, ""
+            else:
+                tempo_escalar, rotulo = por_cenario * n, " (estimado)"
+            linhas.append((
+                f"{nome} n=1e{expoente}",
+                f"escalar {tempo_escalar:9.4f} s{rotulo:<11} | lote {tempo_lote:8.4f} s | "
+                f"{tempo_escalar / tempo_lote:7.1f}x | dif. máx R$ {diferenca:.4f}"
+            ))
+
+    report("batch_calculator", linhas)
+
+
+def _simular_investimento_laco(principal, aporte_mensal, taxa_anual, anos):
+    """Implementação original (laço mês a mês) de simular_investimento_tempo, usada como referência"""
+    import math
+    import pandas as pd
+
+    taxa_mensal = math.pow(1 + taxa_anual, 1/12) - 1
+    dados = []
+    saldo = principal
+    total_investido = principal
+    for mes in range(1, anos * 12 + 1):
+        saldo += aporte_mensal
+        total_investido += aporte_mensal
+        rendimento_mes = saldo * taxa_mensal
+        saldo += rendimento_mes
+        dados.append({
+            "mes": mes,
+            "ano": mes // 12 + 1,
+            "saldo": round(saldo, 2),
+            "total_investido": round(total_investido, 2),
+            "rendimento_acumulado": round(saldo - total_investido, 2),
+            "rendimento_mes": round(rendimento_mes, 2)
+        })
+    return pd.DataFrame(dados)
+
+
+@benchmark
+def bench_simulation() -> None:
+    """simular_investimento_tempo: laço original x motor colunar, 1 e muitos cenários de 40 anos"""
+    import numpy as np
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    colunas = ["saldo", "total_investido", "rendimento_acumulado", "rendimento_mes"]
+
+    referencia = _simular_investimento_laco(10_000, 800, 0.11, 40)
+    diferenca = (calc.simular_investimento_tempo(10_000, 800, 0.11, 40)[colunas] - referencia[colunas]).abs().max().max()
+
+    linhas = [("dif. máx x laço original", f"R$ {diferenca:.4f}")]
+    laco_1 = min(measure(lambda: _simular_investimento_laco(10_000, 800, 0.11, 40), repeat=5))
+    colunar_1 = min(measure(lambda: calc.simular_investimento_tempo(10_000, 800, 0.11, 40), repeat=5))
+    linhas.append(("1 cenário (480 meses)", f"laço {_ms(laco_1)} | colunar {_ms(colunar_1)} | {laco_1 / colunar_1:6.1f}x"))
+
+    rng = np.random.default_rng(0)
+    por_cenario = laco_1
+    for n in (100, 1_000, 10_000):
+        p, a = rng.uniform(0, 100_000, n).tolist(), rng.uniform(0, 3_000, n).tolist()
+        t, anos = rng.uniform(0.03, 0.14, n).tolist(), [40] * n
+        colunar = min(measure(lambda: calc.simular_investimentos_lote(p, a, t, anos), repeat=3))
+        if n <= 1_000:
+            laco = measure(lambda: [_simular_investimento_laco(p[i], a[i], t[i], 40) for i in range(n)], repeat=1)[0]
+            por_cenario, rotulo = laco / n, ""
+        else:
+            laco, rotulo = por_cenario * n, " (estimado)"
+        linhas.append((
+            f"{n} cenários x 480 meses",
+            f"laço {laco:8.3f} s{rotulo} | colunar {colunar:8.3f} s | {laco / colunar:6.1f}x"
+        ))
+
+    report("simulation (40 anos)", linhas)
+
+
+@benchmark
+def bench_amortization() -> None:
+    """Tabela de amortização de 420 meses (PRICE/SAC/SACRE) e paginação sob demanda"""
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    extras = {mes: 5_000 for mes in range(12, 420, 12)}
+    linhas = []
+    for sistema in ("PRICE", "SAC", "SACRE"):
+        simples = min(measure(lambda: calc.gerar_tabela_amortizacao(300_000, 0.009, 420, sistema), repeat=200))
+        com_extras = min(measure(lambda: calc.gerar_tabela_amortizacao(300_000, 0.009, 420, sistema, extras), repeat=200))
+        linhas.append((sistema, f"sem extras {simples * 1e6:7.1f} µs | 34 extras {com_extras * 1e6:7.1f} µs"))
+
+    tabela = calc.gerar_tabela_amortizacao(300_000, 0.009, 420, "SAC")
+    pagina = min(measure(lambda: tabela.pagina(1, tamanho=12), repeat=200))
+    completa = min(measure(tabela.to_dataframe, repeat=50))
+    linhas.append(("1 página (12 linhas) x tabela inteira", f"{pagina * 1e6:7.1f} µs x {completa * 1e6:7.1f} µs"))
+    report("amortization (300 mil, 0,9% a.m., 420 meses)", linhas)
+
+
+@benchmark
+def bench_irr_npv() -> None:
+    """TIR (Newton + bissecção) e VPL em matriz para 100 mil séries de fluxos aleatórios"""
+    import numpy as np
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    rng = np.random.default_rng(11)
+    n, periodos = 100_000, 11
+    fluxos = rng.normal(250, 400, (n, periodos))
+    fluxos[:, 0] = -rng.uniform(500, 3_000, n)
+
+    amostra = 1_000
+    escalar = measure(lambda: [calc.calcular_tir(fluxos[i]) for i in range(amostra)], repeat=1)[0] * n / amostra
+    lote = min(measure(lambda: calc.calcular_tir_lote(fluxos), repeat=3))
+    resultado = calc.calcular_tir_lote(fluxos)
+
+    # Conferência: VPL na TIR encontrada deve ser ~0 (relativo à soma dos fluxos descontados)
+    ok = resultado["convergiu"].to_numpy()
+    descontados = fluxos[ok] * np.power(1 + resultado["tir"].to_numpy()[ok, None], -np.arange(periodos))
+    residuo = np.abs(descontados.sum(axis=1)) / np.abs(descontados).sum(axis=1)
+
+    taxas = np.linspace(0.0, 0.25, 50)
+    vpl_escalar = measure(
+        lambda: [calc.valor_presente_liquido(fluxos[i], r) for i in range(200) for r in taxas], repeat=1
+    )[0] * n / 200
+    vpl_lote = min(measure(lambda: calc.valor_presente_liquido_lote(fluxos, taxas), repeat=3))
+
+    metodos = resultado["metodo"].value_counts().to_dict()
+    report(f"irr_npv ({n} séries x {periodos} períodos)", [
+        ("TIR laço escalar (estimado)", f"{escalar:8.3f} s"),
+        ("TIR lote", f"{lote:8.3f} s | {escalar / lote:6.1f}x"),
+        ("métodos", ", ".join(f"{k}: {v}" for k, v in metodos.items())),
+        ("iterações de Newton (média)", f"{resultado['iteracoes'].mean():.1f}"),
+        ("|VPL na TIR| relativo máximo", f"{residuo.max():.2e}"),
+        ("VPL 50 taxas laço escalar (estimado)", f"{vpl_escalar:8.3f} s"),
+        ("VPL 50 taxas matriz", f"{vpl_lote:8.3f} s | {vpl_escalar / vpl_lote:6.1f}x"),
+    ])
+
+
+@benchmark
+def bench_comparison() -> None:
+    """Comparação de 500 produtos em 10 prazos, líquida de IR: laço escalar x uma passada vetorizada"""
+    import numpy as np
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    rng = np.random.default_rng(5)
+    opcoes = [
+        {"nome": f"Produto {i}", "taxa": float(taxa), "isento": bool(isento)}
+        for i, (taxa, isento) in enumerate(zip(rng.uniform(0.05, 0.16, 500), rng.random(500) < 0.2))
+    ]
+    prazos = [0.5, 1, 2, 3, 4, 5, 7, 10, 15, 20]
+
+    def laco():
+        linhas = []
+        for prazo in prazos:
+            for opcao in opcoes:
+                montante = calc.juros_compostos(10_000, opcao["taxa"], prazo)
+                ir = calc.calcular_imposto_renda_investimento(montante - 10_000, int(prazo * 365))
+                liquido = montante - (0 if opcao["isento"] else ir["imposto"])
+                linhas.append((prazo, opcao["nome"], liquido))
+        return sorted(linhas, key=lambda linha: (linha[0], -linha[2]))
+
+    escalar = min(measure(laco, repeat=3))
+    lote = min(measure(lambda: calc.comparar_investimentos_lote(10_000, prazos, opcoes), repeat=5))
+
+    esperado = [nome for _, nome, _ in laco()]
+    obtido = calc.comparar_investimentos_lote(10_000, prazos, opcoes)["investimento"].tolist()
+
+    # Ordenar o texto "R$ ..." (comportamento antigo) não é ordem numérica
+    textos = [f"R$ {v:,.2f}" for v in (9_500.0, 10_200.0, 100_000.0)]
+    report(f"comparison ({len(opcoes)} produtos x {len(prazos)} prazos)", [
+        ("laço escalar + sort", _ms(escalar)),
+        ("lote vetorizado", f"{_ms(lote)} | {escalar / lote:6.1f}x"),
+        ("mesma ordem por prazo", "sim" if esperado == obtido else "NÃO"),
+        ("ordem de texto 'R$' (antigo)", " > ".join(sorted(textos, reverse=True))),
+    ])
+
+
+def _valores_numericos(resultado) -> List[float]:
+    """Achata o retorno de um método da calculadora (escalar, dict, array ou DataFrame) em floats"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(resultado, pd.DataFrame):
+        colunas = [col for col in resultado.columns if not isinstance(resultado[col].iloc[0], str)]
+        return [float(v) for v in resultado[colunas].to_numpy().ravel()]
+    if isinstance(resultado, dict):
+        return [float(v) for v in resultado.values()]
+    if isinstance(resultado, np.ndarray):
+        return [float(v) for v in resultado.ravel()]
+    return [float(resultado)]
+
+
+@benchmark
+def bench_precision() -> None:
+    """Precisão exata (Decimal) x float: concordância em entradas aleatórias e custo nos lotes"""
+    from data_handler import FinancialCalculator
+
+    rapida = FinancialCalculator()
+    exata = FinancialCalculator(precisao="exata")
+
+    # Regressão: a comparação no modo exato misturava Decimal e float
+    exata.comparar_investimentos(10000, 3, [{"nome": "CDB", "taxa": 0.11}])
+
+    # Propriedade: para qualquer entrada, os dois modos diferem no máximo 1 centavo
+    # (ou 1e-12 relativo, em montantes muito grandes). Falha o benchmark (assert)
+    # em qualquer método com modo exato.
+    n, m = 2_000, 300
+    c = _cenarios_calculadora(n, seed=13)
+    produtos = [
+        {"nome": "CDB", "taxa": float(c["taxa"][0])},
+        {"nome": "LCI", "taxa": float(c["taxa"][1]), "isento": True},
+        {"nome": "Tesouro", "taxa": float(c["taxa"][2])},
+    ]
+    casos = {
+        "juros_compostos": (n, lambda calc, k: calc.juros_compostos(
+            c["principal"][k], c["taxa"][k], int(c["anos"][k]), c["aporte"][k])),
+        "calcular_financiamento": (n, lambda calc, k: calc.calcular_financiamento(
+            c["principal"][k], c["taxa_mensal"][k], int(c["meses"][k]), "SAC" if k % 2 else "PRICE")),
+        "calcular_poupanca_objetivo": (n, lambda calc, k: calc.calcular_poupanca_objetivo(
+            c["principal"][k], c["taxa"][k], int(c["anos"][k]))),
+        "calcular_imposto_renda_investimento": (n, lambda calc, k: calc.calcular_imposto_renda_investimento(
+            c["principal"][k] * c["taxa"][k], int(c["dias"][k]))),
+        "comparar_investimentos": (m, lambda calc, k: calc.comparar_investimentos(
+            c["principal"][k], int(c["anos"][k]), produtos)),
+        "juros_compostos_lote": (1, lambda calc, k: calc.juros_compostos_lote(
+            c["principal"][:m], c["taxa"][:m], c["anos"][:m], c["aporte"][:m])),
+        "calcular_financiamento_lote": (1, lambda calc, k: calc.calcular_financiamento_lote(
+            c["principal"][:m], c["taxa_mensal"][:m], c["meses"][:m])),
+        "calcular_poupanca_objetivo_lote": (1, lambda calc, k: calc.calcular_poupanca_objetivo_lote(
+            c["principal"][:m], c["taxa"][:m], c["anos"][:m])),
+        "calcular_imposto_renda_investimento_lote": (1, lambda calc, k: calc.calcular_imposto_renda_investimento_lote(
+            c["principal"][:m] * c["taxa"][:m], c["dias"][:m])),
+        "comparar_investimentos_lote": (1, lambda calc, k: calc.comparar_investimentos_lote(
+            10_000, c["anos"][:20], produtos)),
+    }
+    linhas, falhas = [], []
+    for nome, (repeticoes, caso) in casos.items():
+        comparados, centavos, pior = 0, 0, 0.0
+        for k in range(repeticoes):
+            valores_float, valores_exatos = _valores_numericos(caso(rapida, k)), _valores_numericos(caso(exata, k))
+            assert len(valores_float) == len(valores_exatos), f"{nome}: formatos diferentes entre as precisões"
+            for v_float, v_exato in zip(valores_float, valores_exatos):
+                diferenca = abs(v_exato - v_float)
+                pior = max(pior, diferenca)
+                centavos += diferenca >= 0.005
+                comparados += 1
+                if diferenca > max(0.01, 1e-12 * abs(v_float)) + 1e-9:
+                    falhas.append(f"{nome}[{k}]: float {v_float!r} x exata {v_exato!r}")
+        linhas.append((nome, f"{comparados} valores | {centavos} difs. de centavo | pior {pior:.4f}"))
+
+    # No modo float, bruto - imposto pode não fechar com o líquido arredondado
+    rendimentos = c["principal"] * c["taxa"] / 7
+    fecha = {}
+    for precisao, calc in (("float", rapida), ("exata", exata)):
+        resultados = [calc.calcular_imposto_renda_investimento(rendimentos[k], int(c["dias"][k])) for k in range(n)]
+        fecha[precisao] = sum(round(r["rendimento_bruto"] - r["imposto"], 2) == r["rendimento_liquido"] for r in resultados)
+    linhas.append(("IR: bruto - imposto = líquido", f"float {fecha['float']}/{n} | exata {fecha['exata']}/{n}"))
+    report("precision (float x Decimal)", linhas)
+
+    assert not falhas, f"{len(falhas)} divergências acima de 1 centavo, p.ex. " + "; ".join(falhas[:3])
+    assert fecha["exata"] == n, "modo exato: bruto - imposto deve fechar com o líquido"
+
+    # Custo do modo exato nos lotes
+    m = 10_000
+    c = _cenarios_calculadora(m, seed=14)
+    lotes = {
+        "juros_compostos_lote": lambda calc: calc.juros_compostos_lote(c["principal"], c["taxa"], c["anos"], c["aporte"]),
+        "calcular_financiamento_lote": lambda calc: calc.calcular_financiamento_lote(c["principal"], c["taxa_mensal"], c["meses"]),
+        "calcular_poupanca_objetivo_lote": lambda calc: calc.calcular_poupanca_objetivo_lote(c["principal"], c["taxa"], c["anos"]),
+        "calcular_imposto_renda_investimento_lote": lambda calc: calc.calcular_imposto_renda_investimento_lote(
+            c["principal"] * c["taxa"], c["dias"]),
+    }
+    linhas = []
+    for nome, lote in lotes.items():
+        t_float = min(measure(lambda: lote(rapida), repeat=5))
+        t_exato = min(measure(lambda: lote(exata), repeat=2))
+        linhas.append((f"{nome} ({m})", f"float {_ms(t_float)} | exata {_ms(t_exato)} | {t_exato / t_float:6.0f}x"))
+    report("precision: custo do modo exato", linhas)
+
+
+@benchmark
+def bench_calc_cache() -> None:
+    """Cache de cálculos: tráfego com cenários repetidos entre usuários (distribuição de Zipf)"""
+    import numpy as np
+    from data_handler import CalculoCache, FinancialCalculator
+
+    rng = np.random.default_rng(21)
+    n, distintos = 20_000, 2_000
+    c = _cenarios_calculadora(distintos, seed=21)
+    # Poucos cenários (como os valores padrão da barra lateral) concentram a maior parte dos pedidos
+    escolhas = np.minimum(rng.zipf(1.3, n) - 1, distintos - 1)
+    pedidos = [
+        ("gerar_tabela_amortizacao", (float(c["principal"][k]), float(c["taxa_mensal"][k]), int(c["meses"][k])))
+        if k % 3 == 0 else
+        ("juros_compostos", (float(c["principal"][k]), float(c["taxa"][k]), int(c["anos"][k]), float(c["aporte"][k])))
+        for k in escolhas
+    ]
+
+    def rodar(calc):
+        for metodo, args in pedidos:
+            getattr(calc, metodo)(*args)
+
+    sem_cache = min(measure(lambda: rodar(FinancialCalculator()), repeat=3))
+    cache = CalculoCache(max_entries=512)
+    com_cache = min(measure(lambda: (cache.clear(), rodar(FinancialCalculator(cache=cache))), repeat=3))
+
+    # Custo de uma falta: normalizar a chave + guardar
+    calc_miss = FinancialCalculator(cache=CalculoCache(max_entries=10))
+    args = [(1_000.0 + i, 0.1, 5) for i in range(5_000)]
+    falta = min(measure(lambda: [calc_miss.juros_compostos(*a) for a in args], repeat=3)) / len(args)
+    direto = min(measure(lambda: [FinancialCalculator().juros_compostos(*a) for a in args], repeat=3)) / len(args)
+
+    estatisticas = cache.exportar()
+    linhas = [
+        ("sem cache", _ms(sem_cache)),
+        ("com cache (512 entradas)", f"{_ms(com_cache)} | {sem_cache / com_cache:6.1f}x"),
+        ("custo extra por falta", f"{(falta - direto) * 1e6:8.2f} µs"),
+    ]
+    for metodo, contadores in estatisticas.items():
+        if metodo != "_total":
+            linhas.append((metodo, f"hits {contadores['hits']} | misses {contadores['misses']} | "
+                                   f"evictions {contadores['evictions']} | hit rate {contadores['hit_rate']:.1%}"))
+    report(f"calc_cache ({n} pedidos, {distintos} cenários distintos)", linhas)
+
+
+def _salvar_json_antigo(arquivo: str, user_id: str, mensagens: List[dict]) -> None:
+    """Implementação anterior do ConversationManager.save_conversation (arquivo JSON único)"""
+    import json
+
+    conversas = {}
+    if os.path.exists(arquivo):
+        with open(arquivo, "r", encoding="utf-8") as f:
+            conversas = json.load(f)
+    conversas[user_id] = {"messages": mensagens, "message_count": len(mensagens)}
+    with open(arquivo, "w", encoding="utf-8") as f:
+        json.dump(conversas, f, ensure_ascii=False, indent=2)
+
+
+@benchmark
+def bench_conversation_store() -> None:
+    """Log de conversas append-only: 100 mil usuários (10 milhões de mensagens com FINAI_BENCH_FULL=1)"""
+    from storage import ConversationLog
+
+    usuarios = 100_000
+    total = 10_000_000 if os.environ.get("FINAI_BENCH_FULL") else 500_000
+    alvo = 10_000_000
+    mensagem = {"role": "user", "content": "Quanto rende 10 mil no CDB a 110% do CDI em 2 anos? Vale a pena?"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Formato antigo: cada mensagem regrava o JSON de todos os usuários
+        arquivo, custos = os.path.join(tmp, "conversations.json"), []
+        for n in (1_000, 4_000):
+            _salvar_json_antigo(arquivo, "base", [mensagem] * n)
+            custos.append(min(measure(lambda: _salvar_json_antigo(arquivo, "u", [mensagem]), repeat=3)))
+        por_mensagem = (custos[1] - custos[0]) / 3_000
+
+        diretorio = os.path.join(tmp, "log")
+        log = ConversationLog(diretorio, fsync=False, auto_compact=False)
+        amostras_inicio, amostras_fim = [], []
+        inicio = time.perf_counter()
+        for i in range(total):
+            if i < 20_000 or i >= total - 20_000:
+                t0 = time.perf_counter()
+                log.append(f"user{i % usuarios:06d}", mensagem)
+                (amostras_inicio if i < 20_000 else amostras_fim).append(time.perf_counter() - t0)
+            else:
+                log.append(f"user{i % usuarios:06d}", mensagem)
+        carga = time.perf_counter() - inicio
+
+        ultimas = min(measure(lambda: log.load("user000123", limit=20), repeat=20))
+        completa = min(measure(lambda: log.load("user000123"), repeat=5))
+        log.close()
+
+        inicio = time.perf_counter()
+        log = ConversationLog(diretorio, fsync=False, auto_compact=False)
+        abertura = time.perf_counter() - inicio
+
+        duravel = ConversationLog(os.path.join(tmp, "fsync"), fsync=True, auto_compact=False)
+        com_fsync = measure(lambda: duravel.append("u", mensagem), repeat=200)
+        duravel.close()
+
+        # Metade dos usuários reescreve o histórico: bytes mortos para a compactação
+        for u in range(0, usuarios, 2):
+            log.replace(f"user{u:06d}", [mensagem])
+        tamanho = lambda: sum(os.path.getsize(os.path.join(diretorio, f)) for f in os.listdir(diretorio))
+        antes, mortos = tamanho(), log.dead_fraction()
+        inicio = time.perf_counter()
+        log.compact()
+        compactacao = time.perf_counter() - inicio
+        depois = tamanho()
+        log.close()
+
+    escala = alvo / total
+    report(f"conversation_store ({usuarios} usuários, {total} mensagens)", [
+        ("JSON antigo: 1 mensagem com 10M no arquivo (estimado)", f"{por_mensagem * alvo:8.1f} s"),
+        ("append p50 / p99 (primeiras 20 mil)", f"{percentile(amostras_inicio, 50) * 1e6:.1f} / {percentile(amostras_inicio, 99) * 1e6:.1f} µs"),
+        ("append p50 / p99 (últimas 20 mil)", f"{percentile(amostras_fim, 50) * 1e6:.1f} / {percentile(amostras_fim, 99) * 1e6:.1f} µs"),
+        ("append com fsync p50", _ms(percentile(com_fsync, 50))),
+        ("carga total", f"{carga:8.2f} s | {total / carga:,.0f} msg/s"),
+        ("últimas 20 mensagens de um usuário", _ms(ultimas)),
+        (f"conversa completa ({total // usuarios} mensagens)", _ms(completa)),
+        ("abrir (refazer índice)", f"{abertura:8.2f} s" + (f" | ~{abertura * escala:.0f} s com 10M" if escala > 1 else "")),
+        (f"compactação ({mortos:.0%} mortos)", f"{compactacao:8.2f} s | {antes / 1e6:.0f} MB -> {depois / 1e6:.0f} MB"),
+    ])
+
+
+@benchmark
+def bench_sqlite_store() -> None:
+    """Backend SQLite (WAL): inserção em lote, página das últimas mensagens e threads concorrentes"""
+    import threading
+    from storage import SQLiteConversationStore
+
+    usuarios = 20_000
+    total = 2_000_000 if os.environ.get("FINAI_BENCH_FULL") else 200_000
+    mensagem = {"role": "user", "content": "Quanto rende 10 mil no CDB a 110% do CDI em 2 anos? Vale a pena?"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteConversationStore(os.path.join(tmp, "conversations.db"))
+
+        unitario = measure(lambda: store.append("unitario", mensagem), repeat=500)
+
+        lote = 1_000
+        inicio = time.perf_counter()
+        for i in range(0, total, lote):
+            store.append_batch([(f"user{k % usuarios:06d}", mensagem) for k in range(i, i + lote)])
+        carga = time.perf_counter() - inicio
+
+        # Usuário com histórico longo: página das últimas 20 x histórico inteiro
+        store.append_many("longo", [mensagem] * 20_000)
+        pagina = measure(lambda: store.page("longo", 20), repeat=50)
+        anterior = store.page("longo", 20)[1]
+        pagina_anterior = measure(lambda: store.page("longo", 20, before=anterior), repeat=50)
+        completo = min(measure(lambda: store.load("longo"), repeat=3))
+
+        # 8 threads (sessões Streamlit) lendo a última página e gravando uma mensagem
+        threads, operacoes = 8, 500
+        latencias = []
+
+        def sessao(k):
+            for i in range(operacoes):
+                t0 = time.perf_counter()
+                store.page(f"user{(k * 997 + i) % usuarios:06d}", 20)
+                store.append(f"sessao{k}", mensagem)
+                latencias.append(time.perf_counter() - t0)
+
+        inicio = time.perf_counter()
+        trabalhadores = [threading.Thread(target=sessao, args=(k,)) for k in range(threads)]
+        for t in trabalhadores:
+            t.start()
+        for t in trabalhadores:
+            t.join()
+        concorrente = time.perf_counter() - inicio
+        corretos = all(store.count(f"sessao{k}") == operacoes for k in range(threads))
+        store.close()
+
+    report(f"sqlite_store ({usuarios} usuários, {total} mensagens)", [
+        ("append unitário p50 / p99", f"{_ms(percentile(unitario, 50))} / {_ms(percentile(unitario, 99))}"),
+        (f"inserção em lotes de {lote}", f"{carga:8.2f} s | {total / carga:,.0f} msg/s"),
+        ("últimas 20 (histórico de 20 mil) p50", _ms(percentile(pagina, 50))),
+        ("página anterior (cursor) p50", _ms(percentile(pagina_anterior, 50))),
+        ("histórico inteiro (20 mil)", _ms(completo)),
+        (f"{threads} threads: página + append p50 / p99",
+         f"{_ms(percentile(latencias, 50))} / {_ms(percentile(latencias, 99))}"),
+        ("throughput concorrente", f"{threads * operacoes / concorrente:,.0f} operações/s"),
+        ("nenhuma escrita perdida", "sim" if corretos else "NÃO"),
+    ])
+
+
+def _estresse_cas(diretorio: str, usuarios: int, incrementos: int, semente: int) -> int:
+    """Processo do estresse: incrementa contadores com leitura + compare-and-swap (repete em conflito)"""
+    import random
+    from storage import ProfileStore, VersionConflict
+
+    store, rng, conflitos = ProfileStore(diretorio, fsync=False), random.Random(semente), 0
+    for _ in range(incrementos):
+        user_id = f"hot{rng.randrange(usuarios)}"
+        while True:
+            dados, versao = store.get(user_id)
+            dados["contador"] = dados.get("contador", 0) + 1
+            try:
+                store.compare_and_swap(user_id, versao, dados)
+                break
+            except VersionConflict:
+                conflitos += 1
+    return conflitos
+
+
+def _estresse_campos(diretorio: str, processo: int, escritas: int) -> None:
+    """Processo do estresse: atualização parcial de um campo próprio no mesmo perfil"""
+    from storage import ProfileStore
+
+    store = ProfileStore(diretorio, fsync=False)
+    for i in range(escritas):
+        store.update("compartilhado", {f"processo_{processo}": i + 1})
+
+
+def _estresse_legado(arquivo: str, usuarios: int, incrementos: int, semente: int) -> None:
+    """Processo do estresse com o formato antigo: ler o JSON inteiro, alterar, regravar"""
+    import json
+    import random
+
+    rng = random.Random(semente)
+    for _ in range(incrementos):
+        user_id = f"hot{rng.randrange(usuarios)}"
+        try:
+            with open(arquivo, "r", encoding="utf-8") as f:
+                perfis = json.load(f)
+        except (FileNotFoundError, ValueError):
+            perfis = {}
+        perfil = perfis.get(user_id, {})
+        perfil["contador"] = perfil.get("contador", 0) + 1
+        perfis[user_id] = perfil
+        with open(arquivo, "w", encoding="utf-8") as f:
+            json.dump(perfis, f)
+
+
+@benchmark
+def bench_profile_store() -> None:
+    """Estresse multiprocesso dos perfis: nenhuma atualização perdida e throughput"""
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+    from storage import ProfileStore
+
+    processos, incrementos, usuarios = 8, 300, 4
+    with tempfile.TemporaryDirectory() as tmp:
+        diretorio = os.path.join(tmp, "profiles")
+        ProfileStore(diretorio)
+
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            inicio = time.perf_counter()
+            conflitos = sum(pool.map(
+                _estresse_cas, [diretorio] * processos, [usuarios] * processos,
+                [incrementos] * processos, range(processos)
+            ))
+            tempo_cas = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            list(pool.map(_estresse_campos, [diretorio] * processos, range(processos), [incrementos] * processos))
+            tempo_campos = time.perf_counter() - inicio
+
+            arquivo = os.path.join(tmp, "user_profile.json")
+            inicio = time.perf_counter()
+            list(pool.map(
+                _estresse_legado, [arquivo] * processos, [usuarios] * processos,
+                [incrementos] * processos, range(processos)
+            ))
+            tempo_legado = time.perf_counter() - inicio
+
+        store = ProfileStore(diretorio)
+        total_cas = sum(store.get(f"hot{u}")[0].get("contador", 0) for u in range(usuarios))
+        compartilhado, versao = store.get("compartilhado")
+        campos_ok = all(compartilhado.get(f"processo_{p}") == incrementos for p in range(processos))
+        try:
+            with open(arquivo, "r", encoding="utf-8") as f:
+                total_legado = sum(p.get("contador", 0) for p in json.load(f).values())
+        except ValueError:
+            total_legado = 0
+
+        duravel = measure(lambda: store.update("duravel", {"x": 1}), repeat=100)
+
+    esperado = processos * incrementos
+    report(f"profile_store ({processos} processos x {incrementos} escritas, {usuarios} perfis disputados)", [
+        ("CAS: contadores finais", f"{total_cas}/{esperado} ({'nenhuma perdida' if total_cas == esperado else 'PERDAS'})"),
+        ("CAS: conflitos (releituras)", conflitos),
+        ("CAS: throughput", f"{esperado / tempo_cas:,.0f} escritas/s"),
+        ("update parcial: campos de todos os processos", f"{'sim' if campos_ok else 'NÃO'} (versão {versao})"),
+        ("update parcial: throughput", f"{esperado / tempo_campos:,.0f} escritas/s"),
+        ("JSON antigo: contadores finais", f"{total_legado}/{esperado} ({esperado - total_legado} perdidas)"),
+        ("JSON antigo: throughput", f"{esperado / tempo_legado:,.0f} escritas/s"),
+        ("update com fsync p50", _ms(percentile(duravel, 50))),
+    ])
+    assert total_cas == esperado, f"CAS perdeu atualizações: {total_cas}/{esperado}"
+    assert campos_ok, "update parcial perdeu o campo de algum processo"
+    assert "last_updated" in compartilhado, "perfil gravado sem last_updated"
+
+
+@contextmanager
+def _app_com_historico(mensagens: int, janela: int):
+    """AppTest do app.py com um usuário que já tem `mensagens` salvas num diretório temporário"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    from storage import ConversationLog
+
+    with tempfile.TemporaryDirectory() as tmp, fake_gemini():
+        log = ConversationLog(os.path.join(tmp, "conversations"), fsync=False, auto_compact=False)
+        log.append_many("bench", [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"mensagem {i} " + "x" * 200}
+            for i in range(mensagens)
+        ])
+        log.close()
+
+        chaves = ("FINAI_DATA_DIR", "FINAI_CHAT_WINDOW", "GEMINI_API_KEY", "FINAI_MARKET_PROVIDER")
+        anteriores = {chave: os.environ.get(chave) for chave in chaves}
+        os.environ.update(FINAI_DATA_DIR=tmp, FINAI_CHAT_WINDOW=str(janela), GEMINI_API_KEY="bench", FINAI_MARKET_PROVIDER="synthetic")
+        # ConversationManager e calculadora ficam em st.cache_resource: cada cenário começa limpo
+        st.cache_resource.clear()
+        try:
+            at = AppTest.from_file("app.py", default_timeout=120)
+            at.session_state["user_id"] = "bench"
+            yield at
+        finally:
+            st.cache_resource.clear()
+            for chave, valor in anteriores.items():
+                if valor is None:
+                    os.environ.pop(chave, None)
+                else:
+                    os.environ[chave] = valor
+
+
+@benchmark
+def bench_chat_rerun() -> None:
+    """Tempo de rerun do app com histórico longo: janela de mensagens x conversa inteira"""
+    tamanhos = (100, 1_000, 10_000)
+    linhas = []
+    for janela, rotulo in ((20, "janela 20"), (0, "conversa inteira")):
+        for n in tamanhos:
+            if not janela and n > 1_000 and not os.environ.get("FINAI_BENCH_FULL"):
+                continue  # renderizar 10 mil mensagens leva ~1 min por rerun
+            with _app_com_historico(n, janela) as at:
+                inicio = time.perf_counter()
+                at.run()
+                primeira = time.perf_counter() - inicio
+                tempos = measure(at.run, repeat=5)
+                renderizadas = len(at.chat_message)
+                extra = ""
+                if janela:
+                    # Uma página anterior: só mais `janela` mensagens lidas e renderizadas
+                    botao = next(b for b in at.button if "ANTERIORES" in b.label)
+                    inicio = time.perf_counter()
+                    botao.click().run()
+                    extra = f" | +página {_ms(time.perf_counter() - inicio).strip()} ({len(at.chat_message)} msgs)"
+            linhas.append((
+                f"{rotulo}, {n} msgs salvas",
+                f"1º {_ms(primeira).strip()} | rerun p50 {_ms(percentile(tempos, 50)).strip()} "
+                f"| {renderizadas} renderizadas{extra}",
+            ))
+
+    # Persistência: a troca nova vai para o store e a janela continua do mesmo tamanho
+    with _app_com_historico(40, 20) as at:
+        from utils import ConversationManager
+        at.run()
+        at.chat_input[0].set_value("Olá, FinAI").run()
+        salvas = ConversationManager(os.environ["FINAI_DATA_DIR"]).load_conversation("bench")
+        persistiu = len(salvas) == 42 and salvas[-2]["content"] == "Olá, FinAI"
+        linhas.append(("troca nova salva no store / janela", f"{'sim' if persistiu else 'NÃO'} / {len(at.chat_message)} msgs"))
+    report("chat_rerun (AppTest, FakeGenAI)", linhas)
+
+
+@benchmark
+def bench_pdf_report() -> None:
+    """PDF da conversa: documento refeito a cada pedido x cache incremental por versão"""
+    import re
+    from reports import ConversationPDF, PDFReportCache, find_unicode_font
+
+    def conversa(n: int, inicio: int = 0) -> List[dict]:
+        return [
+            {"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"Mensagem {i} — ação, “aspas” e 📊 " + "rendimento líquido " * 20}
+            for i in range(inicio, inicio + n)
+        ]
+
+    def sem_data(pdf: bytes) -> bytes:
+        # Data de criação e /ID (derivado dela) mudam a cada segundo
+        return re.sub(rb"/CreationDate \(D:[^)]*\)|/ID \[<[0-9A-F]+><[0-9A-F]+>\]", b"", pdf)
+
+    linhas = [("fonte", find_unicode_font() or "Helvetica (texto aproximado em latin-1)")]
+    for n in (100, 1_000):
+        mensagens = conversa(n)
+
+        def completo(msgs=mensagens):
+            documento = ConversationPDF()
+            documento.add_messages(msgs)
+            return documento.output()
+
+        refeito = measure(completo, repeat=2)
+
+        cache = PDFReportCache()
+        primeiro = measure(lambda: cache.build("bench", mensagens), repeat=1)
+        mesma_versao = measure(lambda: cache.build("bench", iter(mensagens)), repeat=5)
+
+        # Conversa cresce uma troca por vez: só as mensagens novas são diagramadas
+        incrementos = []
+        for k in range(5):
+            mensagens = mensagens + conversa(2, n + 2 * k)
+            incrementos += measure(lambda: cache.build("bench", mensagens), repeat=1)
+        igual = sem_data(cache.build("bench", mensagens)) == sem_data(completo(mensagens))
+
+        linhas += [
+            (f"{n} msgs: refeito a cada pedido", _ms(percentile(refeito, 50))),
+            (f"{n} msgs: cache, primeira geração", _ms(primeiro[0])),
+            (f"{n} msgs: cache, mesma versão", _ms(percentile(mesma_versao, 50))),
+            (f"{n} msgs: cache, +2 mensagens", f"{_ms(percentile(incrementos, 50))} ({percentile(refeito, 50) / percentile(incrementos, 50):.0f}x)"),
+            (f"{n} msgs: incremental == refeito", "sim" if igual else "NÃO"),
+        ]
+    linhas.append(("mensagens diagramadas (último cache)", cache.stats["messages_laid_out"]))
+    report("pdf_report", linhas)
+
+
+@benchmark
+def bench_app_fragments() -> None:
+    """Clique na calculadora: script inteiro (antes) x só o fragmento da calculadora (agora)"""
+    cliques = 15
+    with _app_com_historico(1_000, 20) as at:
+        at.run()
+        for k in range(cliques):
+            at.sidebar.number_input[0].set_value(1_000.0 + k)
+            next(b for b in at.sidebar.button if b.label == "CALCULAR").click().run()
+        tempos = {}
+        for secao, segundos in at.session_state["rerun_timings"]:
+            tempos.setdefault(secao, []).append(segundos)
+        erro = at.exception
+
+    # AppTest sempre reexecuta o script inteiro; o harness do app separa o tempo
+    # de cada fragmento, que é o que um clique custa no servidor com st.fragment
+    script = percentile(tempos["script"][1:], 50)
+    fragmento = percentile(tempos["calculadora"][1:], 50)
+    linhas = [(f"seção {secao} (p50)", _ms(percentile(valores[1:] or valores, 50))) for secao, valores in sorted(tempos.items())]
+    linhas += [
+        ("clique antes: script + st.rerun() (2 execuções)", _ms(2 * script)),
+        ("clique agora: fragmento da calculadora", f"{_ms(fragmento)} ({2 * script / fragmento:.0f}x menor)"),
+        ("exceções no app", "nenhuma" if not erro else str(erro)),
+    ]
+    report(f"app_fragments ({cliques} cliques em CALCULAR, 1000 mensagens salvas, janela 20)", linhas)
+
+
+def _pedidos_relatorio(n: int, seed: int = 0) -> List[dict]:
+    """Pedidos de relatório variados (objetivo, investimento, comparação, financiamento)"""
+    import random
+
+    rng = random.Random(seed)
+    pedidos = []
+    for k in range(n):
+        tipo = ("objetivo", "investimento", "comparacao", "financiamento")[k % 4]
+        if tipo == "objetivo":
+            parametros = {"objetivo": rng.randrange(50, 2_000) * 1_000, "taxa": rng.uniform(0.06, 0.14), "prazo": rng.randint(3, 30)}
+        elif tipo == "investimento":
+            parametros = {"principal": rng.randrange(0, 200) * 1_000, "aporte_mensal": rng.randrange(1, 50) * 100,
+                          "taxa": rng.uniform(0.06, 0.14), "prazo": rng.randint(1, 35)}
+        elif tipo == "comparacao":
+            cdi = rng.uniform(0.09, 0.13)
+            parametros = {"valor_inicial": rng.randrange(1, 500) * 1_000, "prazo": rng.randint(1, 10), "opcoes": [
+                {"nome": "Poupança", "taxa": 0.0617}, {"nome": "CDB 110% CDI", "taxa": cdi * 1.1},
+                {"nome": "Tesouro Selic", "taxa": cdi + 0.001}, {"nome": "LCI 92% CDI", "taxa": cdi * 0.92},
+            ]}
+        else:
+            parametros = {"valor": rng.randrange(50, 1_500) * 1_000, "taxa_mensal": rng.uniform(0.006, 0.012),
+                          "prazo_meses": rng.choice((60, 120, 240, 360, 420)), "sistema": rng.choice(("PRICE", "SAC"))}
+        pedidos.append({"id": f"cliente-{k:05d}", "cliente": f"Cliente {k}", "tipo": tipo, "parametros": parametros})
+    return pedidos
+
+
+@benchmark
+def bench_report_batch() -> None:
+    """Relatórios de simulação em PDF: documento base em cache e geração em lote no pool de processos"""
+    from reports import find_unicode_font, generate_reports, render_client_report
+
+    n = 4_000 if os.environ.get("FINAI_BENCH_FULL") else 400
+    pedidos = _pedidos_relatorio(n)
+    amostra = pedidos[:40]
+    cpus = os.cpu_count() or 1
+    linhas = [("fonte", find_unicode_font() or "Helvetica")]
+
+    for rotulo, template in (("do zero", False), ("documento base em cache", True)):
+        tempos = [measure(lambda p=p: render_client_report(p, use_template=template), repeat=1)[0] for p in amostra]
+        linhas.append((f"1 relatório, {rotulo} (p50)", _ms(percentile(tempos, 50))))
+
+    base = None
+    for workers in sorted({1, 2, 4, cpus}):
+        with tempfile.TemporaryDirectory() as tmp:
+            inicio = time.perf_counter()
+            resultado = generate_reports(pedidos, tmp, workers=workers)
+            tempo = time.perf_counter() - inicio
+            arquivos = os.listdir(tmp)
+            validos = sum(open(os.path.join(tmp, a), "rb").read(5) == b"%PDF-" for a in arquivos)
+        base = base or tempo
+        linhas.append((
+            f"lote, {workers} worker(s)",
+            f"{tempo:7.2f} s | {n / tempo:6.1f} relatórios/s | {base / tempo:4.2f}x | "
+            f"{validos}/{resultado['relatorios']} PDFs válidos | {resultado['bytes'] / n / 1024:.0f} KiB/relatório",
+        ))
+    linhas.append(("CPUs disponíveis", str(cpus)))
+    report(f"report_batch ({n} relatórios: objetivo, investimento, comparação, financiamento)", linhas)
+
+
+@benchmark
+def bench_market_data() -> None:
+    """Séries de mercado: carga inicial, leitura em cache, revalidação em segundo plano e atualização incremental"""
+    from datetime import date, timedelta
+    from market_data import SERIES, MarketDataService, SyntheticProvider
+
+    latencia = 0.2
+    agora = [1_000_000.0]
+    with tempfile.TemporaryDirectory() as tmp:
+        provedor = SyntheticProvider(today=date(2024, 6, 28), latency=latencia)
+        servico = MarketDataService(provedor, tmp, clock=lambda: agora[0])
+
+        inicio = time.perf_counter()
+        servico.get("cdi")
+        carga = time.perf_counter() - inicio
+        pontos_iniciais = len(servico.get("cdi"))
+        leitura = min(measure(lambda: servico.get("cdi"), repeat=1000))
+        painel = min(measure(lambda: servico.snapshot(), repeat=20))
+        servico.wait()
+
+        # Vence o TTL e avança 5 dias úteis: a leitura devolve o cache e atualiza por trás
+        agora[0] += servico.ttl["cdi"] + 1
+        provedor.today = date(2024, 7, 5)
+        antes = provedor.points_served
+        inicio = time.perf_counter()
+        servico.get("cdi")
+        vencida = time.perf_counter() - inicio
+        servico.wait()
+        novos = provedor.points_served - antes
+        incremental = servico.get("cdi")
+        completa = SyntheticProvider(today=provedor.today).fetch("cdi")
+        igual = len(incremental) == len(completa) and all(
+            d.date() == dc and v == vc for (d, v), (dc, vc) in zip(incremental.items(), completa)
+        )
+
+        # Outro processo com o mesmo diretório: lê do disco, sem chamar o provedor
+        outro = SyntheticProvider(today=provedor.today, latency=latencia)
+        inicio = time.perf_counter()
+        MarketDataService(outro, tmp, clock=lambda: agora[0]).get("cdi")
+        do_disco = time.perf_counter() - inicio
+
+        # Provedor fora do ar: o cache vencido continua servindo, sem repetir a chamada a cada leitura
+        agora[0] += servico.ttl["cdi"] + 1
+        provedor.fail = True
+        chamadas = provedor.calls
+        for _ in range(100):
+            servico.get("cdi")
+            servico.wait()
+        falhas = provedor.calls - chamadas
+
+    report(f"market_data (provedor sintético com {latencia * 1000:.0f} ms de latência)", [
+        ("antes: consulta ao provedor por leitura", _ms(latencia)),
+        (f"carga inicial do CDI ({pontos_iniciais} pontos, bloqueante)", _ms(carga)),
+        ("leitura em cache (TTL válido)", f"{leitura * 1e6:.1f} µs"),
+        (f"snapshot do painel ({len(SERIES)} séries)", _ms(painel)),
+        ("leitura com TTL vencido (revalida em segundo plano)", _ms(vencida)),
+        ("pontos pedidos na atualização incremental", f"{novos} (histórico: {len(incremental)})"),
+        ("incremental == histórico completo", "sim" if igual else "NÃO"),
+        ("outro processo: leitura do cache em disco", f"{_ms(do_disco)} ({outro.calls} chamadas ao provedor)"),
+        ("provedor fora do ar: chamadas em 100 leituras", f"{falhas} (erro: {servico.errors().get('cdi')})"),
+    ])
+
+
+@benchmark
+def bench_rate_history() -> None:
+    """Histórico de 30 anos de CDI: JSON + pandas (antes) x arrays colunares em memory map"""
+    import json
+    from datetime import date
+    import numpy as np
+    import pandas as pd
+    from data_handler import FinancialCalculator
+    from market_data import SyntheticProvider
+    from timeseries import TimeSeriesStore
+
+    provedor = SyntheticProvider(start=date(1994, 7, 1), today=date(2024, 12, 31))
+    pontos = provedor.fetch("cdi")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Antes: série em JSON, lida e convertida a cada início
+        arquivo = os.path.join(tmp, "cdi.json")
+        with open(arquivo, "w", encoding="utf-8") as f:
+            json.dump([[d.isoformat(), v] for d, v in pontos], f)
+
+        def carregar_json():
+            with open(arquivo, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            return pd.Series([v for _, v in dados], index=pd.DatetimeIndex([d for d, _ in dados]))
+
+        serie_json = carregar_json()
+        carga_json = min(measure(carregar_json, repeat=5))
+
+        def acumulado_pandas(inicio, fim):
+            trecho = serie_json[(serie_json.index >= inicio) & (serie_json.index < fim)]
+            return float(np.prod(np.power(1 + trecho.to_numpy() / 100, 1 / 252)))
+
+        store = TimeSeriesStore(os.path.join(tmp, "history"))
+        inicio = time.perf_counter()
+        store.update_from(provedor, ["cdi", "selic", "ipca"])
+        gravacao = time.perf_counter() - inicio
+        carga_mmap = min(measure(lambda: TimeSeriesStore(store.root).open("cdi"), repeat=20))
+        cdi = store.open("cdi")
+
+        rng = np.random.default_rng(0)
+        n = 100_000
+        dias = cdi.dates.astype("int64")
+        inicios = rng.integers(dias[0], dias[-1] - 30, n).astype("datetime64[D]")
+        fins = inicios + rng.integers(1, 365 * 10, n).astype("timedelta64[D]")
+        fins = np.minimum(fins, cdi.limit)
+
+        consultas = 200
+        tempo_pandas = min(measure(lambda: [acumulado_pandas(pd.Timestamp(a), pd.Timestamp(b)) for a, b in zip(inicios[:consultas], fins[:consultas])], repeat=3)) / consultas
+        tempo_escalar = min(measure(lambda: [cdi.accumulated(a, b) for a, b in zip(inicios[:consultas], fins[:consultas])], repeat=3)) / consultas
+        tempo_lote = min(measure(lambda: cdi.accumulated_many(inicios, fins), repeat=5))
+        tempo_intervalo = min(measure(lambda: cdi.range("2010-01-01", "2010-12-31"), repeat=1000))
+
+        vetorizado = cdi.accumulated_many(inicios[:consultas], fins[:consultas])
+        referencia = np.array([acumulado_pandas(pd.Timestamp(a), pd.Timestamp(b)) for a, b in zip(inicios[:consultas], fins[:consultas])])
+        erro = float(np.max(np.abs(vetorizado / referencia - 1)))
+
+        # Cinco dias novos: só os novos fatores são calculados
+        provedor.today = date(2025, 1, 8)
+        inicio = time.perf_counter()
+        novos = store.update_from(provedor, ["cdi"])["cdi"]
+        incremental = time.perf_counter() - inicio
+
+        calc = FinancialCalculator(historico=store)
+        tempo_calc = min(measure(lambda: calc.juros_compostos_historico(10_000, "2005-03-15", "2024-03-15", aporte_mensal=500), repeat=50))
+
+    report(f"rate_history (CDI diário de {cdi.first} a {cdi.last}: {len(cdi)} pontos)", [
+        ("antes: carregar JSON + pandas", _ms(carga_json)),
+        ("agora: abrir série colunar (memory map)", f"{_ms(carga_mmap)} ({carga_json / carga_mmap:.0f}x)"),
+        ("gravação inicial (CDI, SELIC, IPCA)", _ms(gravacao)),
+        ("antes: CDI acumulado (filtro + produto)", f"{tempo_pandas * 1e6:.1f} µs"),
+        ("agora: CDI acumulado (2 buscas + divisão)", f"{tempo_escalar * 1e6:.1f} µs ({tempo_pandas / tempo_escalar:.0f}x)"),
+        (f"{n:,} janelas vetorizadas", f"{_ms(tempo_lote)} ({tempo_lote / n * 1e9:.0f} ns/janela)"),
+        ("busca por intervalo (1 ano)", f"{tempo_intervalo * 1e6:.1f} µs"),
+        ("diferença máxima para o produto direto", f"{erro:.1e}"),
+        (f"atualização incremental (+{novos} pontos)", _ms(incremental)),
+        ("juros_compostos_historico (19 anos, aportes mensais)", f"{tempo_calc * 1e6:.0f} µs"),
+    ])
+
+
+def _backtest_laco(serie_cdi, serie_selic, inicio, fim, produto, meses):
+    """Uma janela, dia a dia (referência do benchmark de backtest)"""
+    import numpy as np
+    from data_handler import _somar_meses
+
+    tipo = produto["tipo"]
+    if tipo == "poupanca":
+        fator = 1.0
+        for j in range(meses):
+            selic = serie_selic.value_at(_somar_meses(inicio, j)) / 100
+            fator *= 1.005 if selic > 0.085 else (1 + 0.7 * selic) ** (1 / 12)
+        return fator
+    serie = serie_cdi if tipo == "cdb" else serie_selic
+    percentual = produto.get("percentual", 1.0)
+    fator = 1.0
+    for data, taxa in zip(serie.dates, serie.values):
+        if inicio <= data < fim:
+            fator *= 1 + percentual * ((1 + taxa / 100) ** (1 / 252) - 1)
+    return fator
+
+
+@benchmark
+def bench_backtest() -> None:
+    """Backtest de CDB, Tesouro Selic, IPCA+ e poupança: todas as datas de início de 20 anos"""
+    from datetime import date
+    import numpy as np
+    from data_handler import FinancialCalculator, _aliquota_ir, _somar_meses
+    from market_data import SyntheticProvider
+    from timeseries import TimeSeriesStore
+
+    produtos = [
+        {"nome": "CDB 110% CDI", "tipo": "cdb", "percentual": 1.1},
+        {"nome": "LCI 92% CDI", "tipo": "cdb", "percentual": 0.92, "isento": True},
+        {"nome": "Tesouro Selic", "tipo": "tesouro_selic", "custodia": 0.002},
+        {"nome": "Tesouro IPCA+ 5,5%", "tipo": "ipca_mais", "taxa": 0.055},
+        {"nome": "Poupança", "tipo": "poupanca"},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TimeSeriesStore(tmp)
+        store.update_from(SyntheticProvider(start=date(1994, 7, 1), today=date(2024, 12, 31)), ["cdi", "selic", "ipca"])
+        calc = FinancialCalculator(historico=store)
+        cdi, selic = store.open("cdi"), store.open("selic")
+
+        linhas = []
+        for prazo in (1, 2, 5):
+            executar = lambda: calc.comparar_investimentos_historico(10_000, prazo, produtos, data_inicio="2000-01-01")
+            resultado = executar()
+            tempo = min(measure(executar, repeat=3))
+            linhas.append((f"{prazo} ano(s): {resultado['janelas']} janelas x {len(produtos)} produtos", f"{_ms(tempo)} ({tempo / resultado['janelas'] / len(produtos) * 1e6:.2f} µs/janela)"))
+
+        # Antes: laço Python por data de início, dia a dia (amostra extrapolada)
+        prazo, amostra = 2, 40
+        resultado = calc.comparar_investimentos_historico(10_000, prazo, produtos, data_inicio="2000-01-01")
+        inicios = resultado["montante_liquido"].index.to_numpy().astype("datetime64[D]")
+        sorteadas = inicios[np.random.default_rng(0).choice(len(inicios), amostra, replace=False)]
+        simples = [p for p in produtos if p["tipo"] != "ipca_mais"]
+        inicio = time.perf_counter()
+        diferenca = 0.0
+        for data in sorteadas:
+            fim = _somar_meses(data, prazo * 12)
+            aliquota = float(_aliquota_ir(np.array([(fim - data).astype(int)]))[0])
+            for produto in simples:
+                fator = _backtest_laco(cdi, selic, data, fim, produto, prazo * 12)
+                if produto["tipo"] == "tesouro_selic":
+                    fator /= 1.002 ** ((fim - data).astype(int) / 365)
+                bruto = 10_000 * fator
+                isento = produto.get("isento", produto["tipo"] == "poupanca")
+                liquido = bruto - (0 if isento else round(max(bruto - 10_000, 0) * aliquota, 2))
+                diferenca = max(diferenca, abs(liquido - resultado["montante_liquido"].loc[data, produto["nome"]]))
+        laco = (time.perf_counter() - inicio) / amostra / len(simples)
+        vetorizado = min(measure(lambda: calc.comparar_investimentos_historico(10_000, prazo, produtos, data_inicio="2000-01-01"), repeat=3))
+        total_laco = laco * resultado["janelas"] * len(produtos)
+
+    linhas += [
+        (f"antes: laço por data (extrapolado, {prazo} anos)", f"{total_laco:.1f} s ({laco * 1e3:.2f} ms/janela)"),
+        (f"agora: varredura vetorizada ({prazo} anos)", f"{_ms(vetorizado)} ({total_laco / vetorizado:,.0f}x)"),
+        (f"maior diferença para o laço ({amostra} datas, R$)", f"{diferenca:.2f}"),
+        ("melhor produto em 2 anos (mediana % a.a.)", f"{resultado['resumo'].iloc[0]['investimento']} ({resultado['resumo'].iloc[0]['rentabilidade_mediana']:.2f}%)"),
+    ]
+    report("backtest (histórico sintético 1994-2024, inícios diários a partir de 2000)", linhas)
+
+
+@benchmark
+def bench_metrics() -> None:
+    """Custo da instrumentação por medição (ligada/desligada) e endpoint de métricas"""
+    import json
+    import urllib.request
+    import metrics
+    from data_handler import FinancialCalculator
+
+    n = 200_000
+    h = metrics.histogram("finai_bench_seconds", "Medições do benchmark de métricas")
+    contador = metrics.counter("finai_bench_total", "Contador do benchmark de métricas")
+
+    def vazio():
+        for _ in range(n):
+            pass
+
+    def spans():
+        for _ in range(n):
+            with h.time():
+                pass
+
+    def incrementos():
+        for _ in range(n):
+            contador.inc()
+
+    @metrics.timed(h)
+    def funcao():
+        return None
+
+    def chamadas():
+        for _ in range(n):
+            funcao()
+
+    calc = FinancialCalculator()
+    juros = lambda: [calc.juros_compostos(1000.0, 0.1, 5) for _ in range(20_000)]
+
+    base = min(measure(vazio, repeat=3))
+    tempos = {}
+    for ligado in (True, False):
+        metrics.set_enabled(ligado)
+        tempos[ligado] = {
+            "span": (min(measure(spans, repeat=3)) - base) / n,
+            "contador": (min(measure(incrementos, repeat=3)) - base) / n,
+            "decorador": (min(measure(chamadas, repeat=3)) - base) / n,
+            "juros": min(measure(juros, repeat=3)) / 20_000,
+        }
+    metrics.set_enabled(True)
+
+    # Erros do modelo agora são contados por tipo (antes só viravam texto)
+    with fake_gemini(list_latency=0.0) as fake:
+        import ai_core
+        engine = ai_core.get_engine()
+        engine.generate_response("Qual o futuro da economia?", [])
+        fake.fail_with = TimeoutError("tempo esgotado")
+        # Falhas simuladas: sem o traceback do logger.exception na saída
+        logging.getLogger("ai_core").disabled = True
+        try:
+            engine.generate_response("E da inflação em 2030?", [])
+            list(engine.generate_response_stream("E dos juros em 2031?", []))
+        finally:
+            logging.getLogger("ai_core").disabled = False
+
+    servidor = metrics.start_http_server(port=0)
+    try:
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(url + "/metrics") as resposta:
+            texto = resposta.read().decode("utf-8")
+        coleta = time.perf_counter() - inicio
+        with urllib.request.urlopen(url + "/metrics.json") as resposta:
+            dados = json.load(resposta)
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+    erros = {s["labels"]["mode"]: s["value"] for s in dados["finai_llm_errors_total"]["series"]}
+    calc_p50 = next(s["p50"] for s in dados["finai_calc_seconds"]["series"] if s["labels"]["metodo"] == "juros_compostos")
+
+    ligado, desligado = tempos[True], tempos[False]
+    report(f"metrics ({n:,} medições)", [
+        ("span `with h.time()` ligado", f"{ligado['span'] * 1e6:.2f} µs"),
+        ("span desligado", f"{desligado['span'] * 1e6:.2f} µs"),
+        ("counter.inc() ligado / desligado", f"{ligado['contador'] * 1e6:.2f} / {desligado['contador'] * 1e6:.2f} µs"),
+        ("@metrics.timed ligado / desligado", f"{ligado['decorador'] * 1e6:.2f} / {desligado['decorador'] * 1e6:.2f} µs"),
+        ("juros_compostos ligado / desligado", f"{ligado['juros'] * 1e6:.2f} / {desligado['juros'] * 1e6:.2f} µs"),
+        ("coleta /metrics (HTTP local)", f"{_ms(coleta)} ({len(texto.splitlines())} linhas)"),
+        ("finai_calc_seconds juros_compostos p50", f"{calc_p50 * 1e6:.1f} µs"),
+        ("erros do modelo contados (sync/stream)", f"{erros.get('sync', 0):.0f} / {erros.get('stream', 0):.0f}"),
+    ])
+
+
+@benchmark
+def bench_monte_carlo() -> None:
+    """Monte Carlo de CDI/IPCA: escala por número de workers e reprodutibilidade"""
+    import numpy as np
+    from data_handler import FinancialCalculator
+
+    calc = FinancialCalculator()
+    n = 1_000_000 if os.environ.get("FINAI_BENCH_FULL") else 200_000
+    anos = 20
+    cpus = os.cpu_count() or 1
+    linhas = []
+
+    resultados = {}
+    base = None
+    for workers in sorted({1, 2, 4, cpus}):
+        inicio = time.perf_counter()
+        resultados[workers] = calc.simular_monte_carlo(
+            10_000, 500, anos, n_trajetorias=n, objetivo=400_000, workers=workers
+        )
+        tempo = time.perf_counter() - inicio
+        base = base or tempo
+        linhas.append((f"{workers} worker(s)", f"{tempo:8.3f} s | {base / tempo:5.2f}x | {n / tempo:,.0f} trajetórias/s"))
+
+    referencia = resultados[1]
+    iguais = all(r["nominal"].equals(referencia["nominal"]) for r in resultados.values())
+    final = referencia["nominal"].iloc[-1]
+    linhas += [
+        ("CPUs disponíveis", str(cpus)),
+        ("mesmo resultado com qualquer nº de workers", "sim" if iguais else "NÃO"),
+        ("saldo final p5 / p50 / p95", f"{final.iloc[0]:,.0f} / {final.iloc[2]:,.0f} / {final.iloc[4]:,.0f}"),
+        ("P(saldo final >= R$ 400 mil)", f"{referencia['prob_objetivo']:.1%}"),
+    ]
+    report(f"monte_carlo ({n} trajetórias x {anos * 12} meses)", linhas)
+
+
+def main(argv: List[str]) -> int:
+    nomes = argv or list(BENCHMARKS)
+    for nome in nomes:
+        if nome not in BENCHMARKS:
+            print(f"Benchmark desconhecido: {nome}. Disponíveis: {', '.join(BENCHMARKS)}")
+            return 1
+        try:
+            BENCHMARKS[nome]()
+        except AssertionError as erro:
+            print(f"FALHA em {nome}: {erro}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
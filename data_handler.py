@@ -3,17 +3,289 @@ FinAI Companion - Calculadora Financeira
 Módulo com cálculos financeiros essenciais
 """
 
+import copy
+import functools
+import inspect
+import json
 import math
-from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP, Context, localcontext
+from typing import Dict, Iterator, List, Tuple, Union
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+import metrics
+from market_data import FALLBACK as MARKET_FALLBACK
+
+# Escalar ou array (listas, tuplas, np.ndarray, pd.Series)
+ArrayLike = Union[float, int, List[float], np.ndarray, pd.Series]
+
+# Duração de cada método da calculadora (com ou sem acerto no CalculoCache)
+CALC_SECONDS = metrics.histogram("finai_calc_seconds", "Duração dos cálculos da FinancialCalculator", ("metodo",), metrics.FAST_BUCKETS)
+
+class _NaoCacheavel(Exception):
+    """Argumento sem forma normalizada (arrays, objetos): a chamada ignora o cache"""
+
+
+def _normalizar_argumento(valor):
+    # Caminho rápido para os tipos mais comuns (roda a cada chamada com cache)
+    tipo = type(valor)
+    if tipo is float:
+        # Arredonda ruído de ponto flutuante: 0.1 + 0.2 e 0.3 caem na mesma chave
+        return round(valor, 12)
+    if tipo is int:
+        return float(valor)
+    if valor is None or tipo is str or tipo is bool:
+        return valor
+    if isinstance(valor, Decimal):
+        return valor.normalize()
+    if isinstance(valor, (bool, np.bool_)):
+        return bool(valor)
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return round(float(valor), 12)
+    if isinstance(valor, str):
+        return str(valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((str(k), _normalizar_argumento(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(_normalizar_argumento(v) for v in valor)
+    raise _NaoCacheavel(type(valor).__name__)
+
+
+def _copiar_resultado(resultado):
+    # Quem recebe o resultado pode alterá-lo sem corromper o cache
+    if isinstance(resultado, dict):
+        return dict(resultado)
+    if isinstance(resultado, pd.DataFrame):
+        return resultado.copy()
+    if isinstance(resultado, TabelaAmortizacao):
+        # Cópia rasa: os arrays são somente leitura e continuam compartilhados
+        return copy.copy(resultado)
+    return resultado
+
+
+class CalculoCache:
+    """
+    Cache de resultados dos métodos puros da FinancialCalculator (LRU, tamanho limitado)
+
+    Opcional: só é usado quando passado ao construtor da calculadora. Uma mesma
+    instância pode ser compartilhada entre calculadoras (e entre usuários), já
+    que a chave inclui o método, o modo de precisão e os argumentos normalizados.
+
+    Uso:
+        >>> cache = CalculoCache(max_entries=1024)
+        >>> calc = FinancialCalculator(cache=cache)
+        >>> calc.calcular_financiamento(200000, 0.009, 120)
+        >>> cache.exportar_json()
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: Máximo de resultados guardados (os menos usados saem primeiro)
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chave -> resultado
+        self._lock = threading.Lock()
+        self.stats = {}  # método -> {"hits", "misses", "evictions", "bypass"}
+
+    @staticmethod
+    def chave(metodo: str, precisao: str, valores: Tuple) -> Tuple:
+        """
+        Chave normalizada de uma chamada (também usada no st.cache_data do app)
+
+        Args:
+            valores: Argumentos na ordem da assinatura, com os padrões já aplicados
+
+        Raises:
+            _NaoCacheavel: se algum argumento não puder ser normalizado
+        """
+        return (metodo, precisao, tuple(map(_normalizar_argumento, valores)))
+
+    def _contador(self, metodo: str) -> Dict[str, int]:
+        if metodo not in self.stats:
+            self.stats[metodo] = {"hits": 0, "misses": 0, "evictions": 0, "bypass": 0}
+        return self.stats[metodo]
+
+    def obter_ou_calcular(self, chave: Tuple, calcular):
+        """Retorna o resultado guardado para a chave ou calcula, guarda e retorna"""
+        metodo = chave[0]
+        with self._lock:
+            if chave in self._entries:
+                self._entries.move_to_end(chave)
+                self._contador(metodo)["hits"] += 1
+                return _copiar_resultado(self._entries[chave])
+            self._contador(metodo)["misses"] += 1
+
+        # Fora do lock: cálculos de chaves diferentes não se bloqueiam
+        resultado = calcular()
+
+        with self._lock:
+            self._entries[chave] = resultado
+            self._entries.move_to_end(chave)
+            while len(self._entries) > self.max_entries:
+                chave_removida, _ = self._entries.popitem(last=False)
+                self._contador(chave_removida[0])["evictions"] += 1
+        return _copiar_resultado(resultado)
+
+    def registrar_bypass(self, metodo: str) -> None:
+        with self._lock:
+            self._contador(metodo)["bypass"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self, metodo: str = None) -> float:
+        contadores = [self.stats.get(metodo)] if metodo else list(self.stats.values())
+        hits = sum(c["hits"] for c in contadores if c)
+        total = hits + sum(c["misses"] for c in contadores if c)
+        return hits / total if total else 0.0
+
+    def exportar(self) -> Dict[str, Dict[str, float]]:
+        """Contadores por método, com a taxa de acerto, mais o total"""
+        with self._lock:
+            stats = {metodo: dict(c) for metodo, c in self.stats.items()}
+        for metodo, c in stats.items():
+            c["hit_rate"] = round(self.hit_rate(metodo), 4)
+        stats["_total"] = {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.hit_rate(), 4),
+        }
+        return stats
+
+    def exportar_json(self, caminho: str = None) -> str:
+        """Exporta os contadores em JSON (e grava em `caminho`, se informado)"""
+        conteudo = json.dumps(self.exportar(), indent=2, ensure_ascii=False)
+        if caminho:
+            with open(caminho, "w", encoding="utf-8") as f:
+                f.write(conteudo)
+        return conteudo
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _parametros(metodo) -> List[Tuple[str, any]]:
+    """(nome, padrão) de cada parâmetro do método, sem o self"""
+    return [
+        (p.name, p.default) for p in list(inspect.signature(metodo).parameters.values())[1:]
+    ]
+
+
+def _chave_da_chamada(calc, nome: str, parametros: List[Tuple[str, any]], args, kwargs):
+    """
+    Chave do CalculoCache: argumentos na ordem da assinatura, com os padrões aplicados
+
+    Feito à mão (e não com Signature.bind) porque roda a cada chamada. Retorna
+    None se a chamada não for cacheável ou for inválida (o método levanta o erro).
+    """
+    if len(args) > len(parametros) or (kwargs and any(k not in dict(parametros) for k in kwargs)):
+        return None
+    valores = list(args)
+    for nome_parametro, padrao in parametros[len(args):]:
+        valor = kwargs.get(nome_parametro, padrao)
+        if valor is inspect.Parameter.empty:
+            return None
+        valores.append(valor)
+    try:
+        return CalculoCache.chave(nome, calc.precisao, valores)
+    except _NaoCacheavel:
+        return None
+
+
+def _memoizavel(metodo):
+    """
+    Memoiza um método puro da FinancialCalculator quando a instância tem cache
+
+    Sem cache (padrão) a chamada vai direto ao método, sem custo extra além de um if.
+    A duração de cada chamada vai para finai_calc_seconds (metrics).
+    """
+    parametros = _parametros(metodo)
+
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        cache = self.cache
+        if cache is None:
+            return metodo(self, *args, **kwargs)
+
+        chave = _chave_da_chamada(self, metodo.__name__, parametros, args, kwargs)
+        if chave is None:
+            cache.registrar_bypass(metodo.__name__)
+            return metodo(self, *args, **kwargs)
+
+        return cache.obter_ou_calcular(chave, lambda: metodo(self, *args, **kwargs))
+
+    wrapper = metrics.timed(CALC_SECONDS, metodo=metodo.__name__)(wrapper)
+    wrapper.parametros = parametros
+    return wrapper
+
 
 class FinancialCalculator:
     """
     Classe com métodos para cálculos financeiros comuns
     Todas as fórmulas são comentadas e validadas
+
+    Precisão:
+    - "float" (padrão): aritmética de ponto flutuante com round(x, 2), rápida
+      e suficiente para simulações e gráficos
+    - "exata": Decimal com arredondamento ao centavo ROUND_HALF_UP (como os
+      bancos), para valores que precisam bater com extratos. Afeta
+      juros_compostos, calcular_financiamento, calcular_poupanca_objetivo,
+      calcular_imposto_renda_investimento e suas versões em lote, que passam
+      a retornar Decimal (arrays de dtype object nos lotes)
+
+    Cache (opcional): com `cache=CalculoCache(...)`, os métodos puros marcados
+    com @_memoizavel reaproveitam resultados de chamadas com os mesmos argumentos
+
+    Mercado (opcional): com `mercado=MarketDataService(...)`, as taxas padrão
+    (ex.: CDI e IPCA do Monte Carlo) são as atuais, não as de referência
+
+    Histórico (opcional): com `historico=TimeSeriesStore(...)`, os métodos
+    *_historico usam as taxas realizadas entre duas datas
     """
+
+    PRECISOES = ("float", "exata")
+    RELATORIOS = ("objetivo", "investimento", "comparacao", "financiamento")
+    PRODUTOS_HISTORICOS = ("cdb", "tesouro_selic", "ipca_mais", "prefixado", "poupanca")
+
+    def __init__(self, precisao: str = "float", cache: CalculoCache = None, mercado=None, historico=None):
+        if precisao not in self.PRECISOES:
+            raise ValueError("Precisão deve ser 'float' ou 'exata'")
+        self.precisao = precisao
+        self.cache = cache
+        self.mercado = mercado
+        self.historico = historico
+
+    def taxa_atual(self, indicador: str) -> float:
+        """
+        Taxa anual atual em decimal ("selic", "cdi" ou "ipca" em 12 meses)
+
+        Com serviço de mercado, usa o último valor em cache sem esperar o
+        provedor; sem ele, os mesmos valores de referência que o serviço usa
+        com o provedor fora do ar (market_data.FALLBACK).
+        """
+        if self.mercado is not None:
+            return self.mercado.current_rates(block=False)[indicador]
+        referencia = {
+            "selic": MARKET_FALLBACK["selic"],
+            "cdi": MARKET_FALLBACK["cdi"],
+            "ipca": MARKET_FALLBACK["ipca_12m"],
+        }
+        return referencia[indicador] / 100
+
+    def chave_cache(self, metodo: str, *args, **kwargs) -> Tuple:
+        """
+        Chave normalizada que o CalculoCache usaria para esta chamada
+
+        Permite que caches externos (ex.: st.cache_data no app) usem exatamente
+        as mesmas chaves. Retorna None se os argumentos não forem cacheáveis.
+        """
+        return _chave_da_chamada(self, metodo, getattr(type(self), metodo).parametros, args, kwargs)
     
+    @_memoizavel
     def juros_compostos(
         self, 
         principal: float, 
@@ -41,6 +313,9 @@ class FinancialCalculator:
             >>> calc.juros_compostos(1000, 0.10, 5)
             1610.51
         """
+        if self.precisao == "exata":
+            return _juros_compostos_exato(principal, taxa, tempo, aporte_mensal)
+
         # Montante do principal
         montante_principal = principal * math.pow(1 + taxa, tempo)
         
@@ -56,6 +331,66 @@ class FinancialCalculator:
         
         return round(montante_principal + montante_aportes, 2)
     
+    def serie_historica(self, indicador: str):
+        """Série do histórico de taxas (timeseries.SeriesArrays)"""
+        if self.historico is None:
+            raise ValueError("Histórico de taxas não configurado (historico=TimeSeriesStore(...))")
+        return self.historico.open(indicador)
+
+    def taxa_acumulada(self, indicador: str, data_inicio, data_fim, percentual: float = 1.0) -> float:
+        """
+        Taxa realizada entre a aplicação e o resgate (decimal, ex: 0.45 para 45%)
+
+        Args:
+            indicador: "cdi", "selic" ou "ipca"
+            data_inicio: Data da aplicação
+            data_fim: Data do resgate
+            percentual: Percentual do indicador (1.1 = 110% do CDI)
+        """
+        return self.serie_historica(indicador).accumulated(data_inicio, data_fim, percentual) - 1
+
+    @metrics.timed(CALC_SECONDS, metodo="juros_compostos_historico")
+    def juros_compostos_historico(
+        self,
+        principal: float,
+        data_inicio,
+        data_fim,
+        indicador: str = "cdi",
+        percentual: float = 1.0,
+        aporte_mensal: float = 0
+    ) -> float:
+        """
+        juros_compostos com as taxas realizadas no período, em vez de uma taxa fixa
+
+        O principal rende de data_inicio a data_fim; cada aporte mensal entra
+        no mesmo dia dos meses seguintes e rende do seu dia até data_fim.
+        Cada consulta ao histórico é uma busca binária e uma divisão de
+        fatores acumulados, sem percorrer os dias do período.
+
+        Args:
+            principal: Valor inicial investido
+            data_inicio: Data da aplicação
+            data_fim: Data do resgate
+            indicador: "cdi", "selic" ou "ipca"
+            percentual: Percentual do indicador (1.1 = 110% do CDI)
+            aporte_mensal: Valor de aporte mensal (opcional)
+
+        Returns:
+            Montante final
+        """
+        serie = self.serie_historica(indicador)
+        montante = principal * serie.accumulated(data_inicio, data_fim, percentual)
+        if aporte_mensal > 0:
+            inicio = np.datetime64(data_inicio, "D")
+            fim = np.datetime64(data_fim, "D")
+            meses = (fim.astype("datetime64[M]") - inicio.astype("datetime64[M]")).astype(int)
+            datas = _somar_meses(inicio, np.arange(1, meses + 1))
+            datas = datas[datas < fim]
+            if len(datas):
+                montante += aporte_mensal * float(serie.accumulated_many(datas, np.full(len(datas), fim), percentual).sum())
+        return round(float(montante), 2)
+
+    @_memoizavel
     def calcular_financiamento(
         self, 
         valor_financiado: float, 
@@ -82,6 +417,9 @@ class FinancialCalculator:
             >>> calc.calcular_financiamento(200000, 0.008, 360)
             1467.53
         """
+        if self.precisao == "exata":
+            return _financiamento_exato(valor_financiado, taxa_mensal, prazo_meses, sistema)
+
         if sistema == "PRICE":
             # Sistema PRICE - Parcelas fixas
             if taxa_mensal == 0:
@@ -106,6 +444,62 @@ class FinancialCalculator:
         else:
             raise ValueError("Sistema deve ser 'PRICE' ou 'SAC'")
     
+    @_memoizavel
+    def gerar_tabela_amortizacao(
+        self,
+        valor_financiado: float,
+        taxa_mensal: float,
+        prazo_meses: int,
+        sistema: str = "PRICE",
+        amortizacoes_extras: Dict[int, float] = None,
+        periodo_recalculo: int = 12
+    ) -> "TabelaAmortizacao":
+        """
+        Gera a tabela de amortização completa (PRICE, SAC ou SACRE)
+
+        - PRICE: parcela fixa
+        - SAC: amortização constante, parcelas decrescentes
+        - SACRE: parcela recalculada a cada `periodo_recalculo` meses como
+          saldo / meses restantes + juros do mês, e mantida fixa no período
+
+        Na PRICE e na SAC amortizações extras reduzem o prazo (mantêm a parcela
+        e a amortização mensal, respectivamente); na SACRE a parcela é
+        recalculada após cada extra, reduzindo a parcela.
+
+        Args:
+            valor_financiado: Valor total a financiar
+            taxa_mensal: Taxa de juros mensal (decimal)
+            prazo_meses: Número de parcelas
+            sistema: "PRICE", "SAC" ou "SACRE"
+            amortizacoes_extras: {mês: valor} pagos além da parcela daquele mês
+            periodo_recalculo: Meses entre recálculos da parcela SACRE
+
+        Returns:
+            TabelaAmortizacao (arrays NumPy, linhas geradas sob demanda)
+
+        Exemplo:
+            >>> tabela = calc.gerar_tabela_amortizacao(300000, 0.009, 420, "SAC")
+            >>> tabela.pagina(1, tamanho=12)
+        """
+        sistema = sistema.upper()
+        if sistema not in ("PRICE", "SAC", "SACRE"):
+            raise ValueError("Sistema deve ser 'PRICE', 'SAC' ou 'SACRE'")
+
+        n = int(prazo_meses)
+        i = float(taxa_mensal)
+        extras = np.zeros(n)
+        for mes, valor in (amortizacoes_extras or {}).items():
+            if 1 <= int(mes) <= n:
+                extras[int(mes) - 1] += valor
+
+        if sistema == "SACRE" and not extras.any():
+            saldo_pos_parcela = _saldos_sacre(valor_financiado, i, n, periodo_recalculo)
+        else:
+            saldo_pos_parcela = _saldos_por_segmento(valor_financiado, i, n, sistema, extras, periodo_recalculo)
+
+        return TabelaAmortizacao.a_partir_dos_saldos(sistema, valor_financiado, i, saldo_pos_parcela, extras)
+
+    @_memoizavel
     def calcular_poupanca_objetivo(
         self, 
         objetivo: float, 
@@ -125,6 +519,9 @@ class FinancialCalculator:
         Returns:
             Dicionário com aporte mensal, total investido e rendimento
         """
+        if self.precisao == "exata":
+            return _poupanca_objetivo_exato(objetivo, taxa_anual, prazo_anos)
+
         taxa_mensal = math.pow(1 + taxa_anual, 1/12) - 1
         meses = prazo_anos * 12
         
@@ -146,6 +543,7 @@ class FinancialCalculator:
             "valor_final": round(objetivo, 2)
         }
     
+    @_memoizavel
     def calcular_roi(
         self, 
         valor_investido: float, 
@@ -173,6 +571,7 @@ class FinancialCalculator:
             "valor_final": round(valor_retornado, 2)
         }
     
+    @_memoizavel
     def simular_investimento_tempo(
         self,
         principal: float,
@@ -192,33 +591,75 @@ class FinancialCalculator:
         Returns:
             DataFrame com evolução mês a mês
         """
-        taxa_mensal = math.pow(1 + taxa_anual, 1/12) - 1
-        meses = anos * 12
-        
-        dados = []
-        saldo = principal
-        total_investido = principal
-        
-        for mes in range(1, meses + 1):
-            # Adicionar aporte
-            saldo += aporte_mensal
-            total_investido += aporte_mensal
-            
-            # Aplicar rendimento
-            rendimento_mes = saldo * taxa_mensal
-            saldo += rendimento_mes
-            
-            # Registrar dados do mês
-            dados.append({
-                "mes": mes,
-                "ano": mes // 12 + 1,
-                "saldo": round(saldo, 2),
-                "total_investido": round(total_investido, 2),
-                "rendimento_acumulado": round(saldo - total_investido, 2),
-                "rendimento_mes": round(rendimento_mes, 2)
-            })
-        
-        return pd.DataFrame(dados)
+        # Cálculo colunar (fórmula fechada) - ver simular_investimentos_lote
+        simulacao = self.simular_investimentos_lote(principal, aporte_mensal, taxa_anual, anos)
+        return simulacao.drop(columns="cenario")
+
+    @metrics.timed(CALC_SECONDS, metodo="simular_investimentos_lote")
+    def simular_investimentos_lote(
+        self,
+        principal: ArrayLike,
+        aporte_mensal: ArrayLike,
+        taxa_anual: ArrayLike,
+        anos: ArrayLike
+    ) -> pd.DataFrame:
+        """
+        Simula a evolução mês a mês de vários investimentos de uma só vez
+
+        Cada cenário (principal, aporte, taxa, anos) ocupa um bloco de linhas.
+        Em vez de iterar mês a mês, cada coluna é calculada pela fórmula fechada
+        do saldo após m meses (aporte no início do mês, rendimento no fim):
+
+            S(m) = P * (1 + i)^m + A * (1 + i) * [((1 + i)^m - 1) / i]
+
+        e gravada direto em colunas pré-alocadas.
+
+        Args:
+            principal: Valor inicial de cada cenário
+            aporte_mensal: Aporte mensal de cada cenário
+            taxa_anual: Taxa de retorno anual de cada cenário
+            anos: Período de simulação de cada cenário
+
+        Returns:
+            DataFrame com cenario, mes, ano, saldo, total_investido,
+            rendimento_acumulado e rendimento_mes
+        """
+        principal, aporte_mensal, taxa_anual, anos = (
+            np.ravel(v) for v in _como_arrays(principal, aporte_mensal, taxa_anual, anos)
+        )
+        meses_por_cenario = (anos * 12).astype(np.int64)
+        total_linhas = int(meses_por_cenario.sum())
+
+        # Índices: a qual cenário pertence cada linha e qual é o mês dentro dele
+        cenario = np.repeat(np.arange(len(principal)), meses_por_cenario)
+        inicio_bloco = np.cumsum(meses_por_cenario) - meses_por_cenario
+        mes = np.arange(1, total_linhas + 1) - np.repeat(inicio_bloco, meses_por_cenario)
+
+        taxa_mensal = (np.power(1 + taxa_anual, 1 / 12) - 1)[cenario]
+        p = principal[cenario]
+        a = aporte_mensal[cenario]
+
+        colunas = {nome: np.empty(total_linhas) for nome in
+                   ("saldo", "total_investido", "rendimento_acumulado", "rendimento_mes")}
+
+        # Saldo no fim do mês anterior, S(m - 1); o mês corrente rende sobre S(m - 1) + aporte
+        fator = np.power(1 + taxa_mensal, mes - 1)
+        saldo_anterior = p * fator + a * (1 + taxa_mensal) * _fator_acumulacao(taxa_mensal, mes - 1)
+        np.multiply(saldo_anterior + a, taxa_mensal, out=colunas["rendimento_mes"])
+        np.add(saldo_anterior + a, colunas["rendimento_mes"], out=colunas["saldo"])
+
+        np.add(p, a * mes, out=colunas["total_investido"])
+        np.subtract(colunas["saldo"], colunas["total_investido"], out=colunas["rendimento_acumulado"])
+
+        for valores in colunas.values():
+            np.round(valores, 2, out=valores)
+
+        return pd.DataFrame({
+            "cenario": cenario,
+            "mes": mes,
+            "ano": mes // 12 + 1,
+            **colunas
+        })
     
     def comparar_investimentos(
         self,
@@ -235,7 +676,8 @@ class FinancialCalculator:
             opcoes: Lista de dicionários com nome e taxa de cada opção
             
         Returns:
-            DataFrame comparativo
+            DataFrame comparativo com colunas numéricas (Taxa Anual e ROI em %),
+            ordenado pelo montante final. Para exibir, use utils.format_dataframe.
             
         Exemplo:
             >>> calc.comparar_investimentos(
@@ -248,29 +690,204 @@ class FinancialCalculator:
             ...     ]
             ... )
         """
-        resultados = []
-        
-        for opcao in opcoes:
-            montante = self.juros_compostos(
-                valor_inicial, 
-                opcao["taxa"], 
-                prazo_anos
-            )
-            
-            rendimento = montante - valor_inicial
-            roi = (rendimento / valor_inicial) * 100
-            
-            resultados.append({
-                "Investimento": opcao["nome"],
-                "Taxa Anual": f"{opcao['taxa']*100:.2f}%",
-                "Montante Final": f"R$ {montante:,.2f}",
-                "Rendimento": f"R$ {rendimento:,.2f}",
-                "ROI": f"{roi:.2f}%"
-            })
-        
-        df = pd.DataFrame(resultados)
-        return df.sort_values("Montante Final", ascending=False)
+        comparacao = self.comparar_investimentos_lote(valor_inicial, [prazo_anos], opcoes, liquido_ir=False)
+
+        return pd.DataFrame({
+            "Investimento": comparacao["investimento"],
+            "Taxa Anual": comparacao["taxa_anual"] * 100,
+            "Montante Final": comparacao["montante_bruto"],
+            "Rendimento": comparacao["rendimento_bruto"],
+            "ROI": comparacao["roi"]
+        }).reset_index(drop=True)
+
+    @metrics.timed(CALC_SECONDS, metodo="comparar_investimentos_lote")
+    def comparar_investimentos_lote(
+        self,
+        valor_inicial: float,
+        prazos_anos: ArrayLike,
+        opcoes: List[Dict[str, any]],
+        aporte_mensal: float = 0,
+        liquido_ir: bool = True
+    ) -> pd.DataFrame:
+        """
+        Compara muitos produtos em vários prazos de uma só vez
+
+        Montantes de todos os pares (produto, prazo) saem de uma única operação
+        com broadcasting (produtos x prazos); o IR segue a tabela regressiva de
+        calcular_imposto_renda_investimento, exceto para opções com "isento": True
+        (poupança, LCI, LCA...). Todas as colunas são numéricas: ordenação e
+        agregações funcionam direto, e a formatação fica para a exibição.
+
+        Args:
+            valor_inicial: Valor a investir
+            prazos_anos: Prazos de comparação (anos)
+            opcoes: Lista de dicionários com nome, taxa e, opcionalmente, isento
+            aporte_mensal: Aporte mensal (opcional)
+            liquido_ir: Se True, ordena e calcula o ROI pelo valor líquido de IR
+
+        Returns:
+            DataFrame com uma linha por (prazo, investimento): investimento,
+            prazo_anos, taxa_anual, montante_bruto, rendimento_bruto, aliquota_ir,
+            imposto, montante_liquido, rendimento_liquido, roi (%) e posicao
+            (1 = melhor no prazo), ordenado por prazo e posição
+        """
+        nomes = np.array([opcao["nome"] for opcao in opcoes], dtype=object)
+        taxas = np.array([opcao["taxa"] for opcao in opcoes], dtype=np.float64)
+        isentos = np.array([bool(opcao.get("isento", False)) for opcao in opcoes])
+        prazos = np.ravel(np.asarray(prazos_anos, dtype=np.float64))
+
+        # Matriz produtos x prazos. Na precisão "exata" os montantes chegam em
+        # Decimal (já arredondados ao centavo): convertidos uma vez para float,
+        # o resto da comparação (IR, ROI, ranking) é o mesmo nas duas precisões
+        montante = np.asarray(
+            self.juros_compostos_lote(valor_inicial, taxas[:, None], prazos[None, :], aporte_mensal), dtype=np.float64
+        )
+        investido = valor_inicial + aporte_mensal * prazos * 12
+        rendimento = montante - investido
+
+        aliquota = np.where(isentos[:, None], 0.0, _aliquota_ir(prazos * 365)[None, :])
+        imposto = np.round(np.maximum(rendimento, 0) * aliquota, 2)
+        liquido = montante - imposto
+
+        criterio = liquido if liquido_ir else montante
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roi = (criterio - investido) / investido * 100
+
+        # Posição dentro de cada prazo (coluna), do maior para o menor
+        ordem = np.argsort(-criterio, axis=0, kind="stable")
+        posicao = np.empty_like(ordem)
+        np.put_along_axis(posicao, ordem, np.arange(1, len(opcoes) + 1)[:, None], axis=0)
+
+        n_produtos, n_prazos = montante.shape
+        df = pd.DataFrame({
+            "investimento": np.tile(nomes, n_prazos),
+            "prazo_anos": np.repeat(prazos, n_produtos),
+            "taxa_anual": np.tile(taxas, n_prazos),
+            "montante_bruto": montante.T.ravel(),
+            "rendimento_bruto": np.round(rendimento, 2).T.ravel(),
+            "aliquota_ir": aliquota.T.ravel() * 100,
+            "imposto": imposto.T.ravel(),
+            "montante_liquido": np.round(liquido, 2).T.ravel(),
+            "rendimento_liquido": np.round(liquido - investido, 2).T.ravel(),
+            "roi": np.round(roi, 2).T.ravel(),
+            "posicao": posicao.T.ravel()
+        })
+        return df.sort_values(["prazo_anos", "posicao"], kind="stable").reset_index(drop=True)
     
+    @metrics.timed(CALC_SECONDS, metodo="comparar_investimentos_historico")
+    def comparar_investimentos_historico(
+        self,
+        valor_inicial: float,
+        prazo_anos: float,
+        produtos: List[Dict[str, any]],
+        data_inicio=None,
+        data_fim=None,
+        passo: int = 1
+    ) -> Dict[str, any]:
+        """
+        Backtest: cada produto aplicado em todas as datas de início do histórico
+
+        Versão de comparar_investimentos com as taxas realizadas (ver
+        historico=TimeSeriesStore) em vez de uma taxa fixa. Cada dia útil do
+        histórico é uma aplicação de `valor_inicial` resgatada `prazo_anos`
+        depois; todas as janelas são calculadas de uma vez, com fatores
+        acumulados e buscas binárias vetorizadas.
+
+        Produtos ("tipo"):
+        - "cdb": rende "percentual" do CDI (1.1 = 110%)
+        - "tesouro_selic": Selic (meta publicada, ~0,10 p.p. acima da over) + "spread" anual
+        - "ipca_mais": IPCA pro rata + "taxa" real anual (base 252)
+        - "prefixado": "taxa" anual fixa (base 252), como em comparar_investimentos
+        - "poupanca": 0,5% a.m. com Selic acima de 8,5%, senão 70% da Selic;
+          rende só nos aniversários mensais (TR considerada zero); isenta de IR
+
+        O IR segue a tabela regressiva de calcular_imposto_renda_investimento
+        pelos dias corridos da janela, exceto com "isento": True (LCI, LCA...).
+        "custodia" (taxa anual, ex.: 0.002 da B3) é descontada pro rata.
+        IOF não é considerado (prazos acima de 30 dias).
+
+        Args:
+            valor_inicial: Valor aplicado em cada janela
+            prazo_anos: Prazo de cada aplicação (anos; arredondado a meses)
+            produtos: Lista de dicionários com nome, tipo e parâmetros do tipo
+            data_inicio: Primeira data de aplicação (padrão: início do histórico)
+            data_fim: Último resgate (padrão: fim do histórico)
+            passo: Intervalo entre datas de início, em dias úteis
+
+        Returns:
+            Dicionário com "montante_liquido" (DataFrame data de início x
+            produto), "rentabilidade_anual" (líquida, % a.a., mesmo formato),
+            "melhor" (produto vencedor por data), "resumo" (por produto:
+            rentabilidade líquida média, mínima, mediana e máxima em % a.a.,
+            vezes_melhor em %) e "janelas"
+        """
+        meses = int(round(prazo_anos * 12))
+        if meses < 1:
+            raise ValueError("Prazo deve ser de pelo menos um mês")
+        tipos = {produto["tipo"] for produto in produtos}
+        if not tipos <= set(self.PRODUTOS_HISTORICOS):
+            raise ValueError(f"Tipos de produto válidos: {', '.join(self.PRODUTOS_HISTORICOS)}")
+
+        # Datas de início: dias úteis do CDI (calendário base) cujo resgate está no histórico
+        calendario = self.serie_historica("cdi")
+        series = {"cdi": calendario}
+        if tipos & {"tesouro_selic", "poupanca"}:
+            series["selic"] = self.serie_historica("selic")
+        if "ipca_mais" in tipos:
+            series["ipca"] = self.serie_historica("ipca")
+        primeiro = max(serie.first for serie in series.values())
+        limite = min(serie.limit for serie in series.values())
+        if data_inicio is not None:
+            primeiro = max(primeiro, np.datetime64(data_inicio, "D"))
+        if data_fim is not None:
+            limite = min(limite, np.datetime64(data_fim, "D"))
+
+        inicios = calendario.dates[calendario.position(primeiro):][::passo]
+        fins = _somar_meses(inicios, meses)
+        validas = fins <= limite
+        inicios, fins = np.asarray(inicios[validas]), fins[validas]
+        if not len(inicios):
+            raise ValueError(f"Histórico sem janelas de {meses} meses entre {primeiro} e {limite}")
+
+        dias = (fins - inicios).astype(np.int64)
+        dias_uteis = calendario.position(fins) - calendario.position(inicios)
+
+        fatores = np.empty((len(inicios), len(produtos)))
+        for j, produto in enumerate(produtos):
+            fatores[:, j] = _fator_historico(produto, series, inicios, fins, dias_uteis, meses)
+            custodia = produto.get("custodia", 0.0)
+            if custodia:
+                fatores[:, j] /= np.power(1 + custodia, dias / 365)
+
+        montante = valor_inicial * fatores
+        rendimento = montante - valor_inicial
+        isentos = np.array([produto.get("isento", produto["tipo"] == "poupanca") for produto in produtos])
+        aliquota = np.where(isentos[None, :], 0.0, _aliquota_ir(dias)[:, None])
+        imposto = np.round(np.maximum(rendimento, 0) * aliquota, 2)
+        liquido = montante - imposto
+        anual = (np.power(liquido / valor_inicial, 365 / dias[:, None]) - 1) * 100
+
+        nomes = [produto["nome"] for produto in produtos]
+        indice = pd.DatetimeIndex(inicios, name="data_inicio")
+        melhor = np.argmax(liquido, axis=1)
+        resumo = pd.DataFrame({
+            "investimento": nomes,
+            "rentabilidade_media": anual.mean(axis=0),
+            "rentabilidade_minima": anual.min(axis=0),
+            "rentabilidade_mediana": np.median(anual, axis=0),
+            "rentabilidade_maxima": anual.max(axis=0),
+            "vezes_melhor": np.bincount(melhor, minlength=len(produtos)) / len(inicios) * 100,
+        }).round(2).sort_values("rentabilidade_mediana", ascending=False, kind="stable").reset_index(drop=True)
+
+        return {
+            "montante_liquido": pd.DataFrame(np.round(liquido, 2), index=indice, columns=nomes),
+            "rentabilidade_anual": pd.DataFrame(np.round(anual, 4), index=indice, columns=nomes),
+            "melhor": pd.Series(np.array(nomes, dtype=object)[melhor], index=indice, name="melhor"),
+            "resumo": resumo,
+            "janelas": len(inicios),
+        }
+
+    @_memoizavel
     def calcular_imposto_renda_investimento(
         self,
         rendimento: float,
@@ -292,6 +909,9 @@ class FinancialCalculator:
         Returns:
             Dicionário com alíquota, imposto e valor líquido
         """
+        if self.precisao == "exata":
+            return _imposto_renda_exato(rendimento, dias_aplicacao)
+
         if dias_aplicacao <= 180:
             aliquota = 0.225
         elif dias_aplicacao <= 360:
@@ -311,6 +931,7 @@ class FinancialCalculator:
             "rendimento_liquido": round(liquido, 2)
         }
     
+    @_memoizavel
     def calcular_inflacao_real(
         self,
         retorno_nominal: float,
@@ -348,12 +969,215 @@ class FinancialCalculator:
         Returns:
             VPL calculado
         """
-        vpl = 0
-        for periodo, fluxo in enumerate(fluxos_caixa):
-            vpl += fluxo / math.pow(1 + taxa_desconto, periodo)
-        
-        return round(vpl, 2)
+        fluxos = np.asarray(fluxos_caixa, dtype=np.float64)
+        fatores_desconto = np.power(1 + taxa_desconto, -np.arange(len(fluxos), dtype=np.float64))
+        return round(float(fluxos @ fatores_desconto), 2)
+
+    def valor_presente_liquido_lote(
+        self,
+        fluxos_caixa: ArrayLike,
+        taxas_desconto: ArrayLike
+    ) -> np.ndarray:
+        """
+        VPL de muitas séries de fluxos para muitas taxas de uma só vez
+
+        Monta a matriz de fatores de desconto D[t, k] = (1 + taxa_k)^-t e
+        resolve tudo com um produto de matrizes: VPL = fluxos @ D.
+
+        Args:
+            fluxos_caixa: Matriz (séries x períodos) ou uma única série
+            taxas_desconto: Uma taxa ou vetor de taxas
+
+        Returns:
+            Matriz (séries x taxas) com os VPLs
+        """
+        fluxos = np.atleast_2d(np.asarray(fluxos_caixa, dtype=np.float64))
+        taxas = np.atleast_1d(np.asarray(taxas_desconto, dtype=np.float64))
+        periodos = np.arange(fluxos.shape[1], dtype=np.float64)
+
+        fatores_desconto = np.power(1 + taxas[None, :], -periodos[:, None])
+        return np.round(fluxos @ fatores_desconto, 2)
+
+    def valor_presente_liquido_datas(
+        self,
+        fluxos_caixa: List[float],
+        datas: List[datetime],
+        taxa_desconto: float
+    ) -> float:
+        """
+        VPL com datas (XNPV): cada fluxo é descontado por (dias desde o primeiro / 365)
+
+        Args:
+            fluxos_caixa: Valores dos fluxos
+            datas: Data de cada fluxo
+            taxa_desconto: Taxa anual de desconto
+
+        Returns:
+            VPL calculado
+        """
+        fluxos = np.asarray(fluxos_caixa, dtype=np.float64)
+        anos = _fracao_anos(datas)
+        return round(float(fluxos @ np.power(1 + taxa_desconto, -anos)), 2)
+
+    def calcular_tir(
+        self,
+        fluxos_caixa: List[float],
+        chute: float = 0.1,
+        tolerancia: float = 1e-10,
+        max_iteracoes: int = 50
+    ) -> Dict[str, any]:
+        """
+        Calcula a Taxa Interna de Retorno (TIR/IRR)
+
+        Newton-Raphson a partir do chute; se não convergir, procura um
+        intervalo com mudança de sinal do VPL e resolve por bissecção.
+
+        Args:
+            fluxos_caixa: Fluxos por período (primeiro normalmente negativo)
+            chute: Taxa inicial para o método de Newton
+            tolerancia: Passo mínimo para considerar convergência
+            max_iteracoes: Limite de iterações de Newton
+
+        Returns:
+            Dicionário com tir (decimal), tir_percentual, convergiu,
+            iteracoes e metodo ("newton", "bisseccao" ou "sem_solucao")
+
+        Exemplo:
+            >>> calc.calcular_tir([-1000, 300, 400, 500])["tir_percentual"]
+            8.9
+        """
+        resultado = self.calcular_tir_lote([fluxos_caixa], chute, tolerancia, max_iteracoes)
+        return _linha_tir(resultado.iloc[0])
+
+    @metrics.timed(CALC_SECONDS, metodo="calcular_tir_lote")
+    def calcular_tir_lote(
+        self,
+        fluxos_caixa: ArrayLike,
+        chute: float = 0.1,
+        tolerancia: float = 1e-10,
+        max_iteracoes: int = 50
+    ) -> pd.DataFrame:
+        """
+        TIR de muitas séries ao mesmo tempo (Newton vetorizado + bissecção para as que falharem)
+
+        Args:
+            fluxos_caixa: Matriz (séries x períodos)
+
+        Returns:
+            DataFrame com tir, convergiu, iteracoes e metodo por série
+        """
+        fluxos = np.atleast_2d(np.asarray(fluxos_caixa, dtype=np.float64))
+        periodos = np.arange(fluxos.shape[1], dtype=np.float64)
+        return _resolver_tir(fluxos, periodos, chute, tolerancia, max_iteracoes)
+
+    def calcular_tir_datas(
+        self,
+        fluxos_caixa: List[float],
+        datas: List[datetime],
+        chute: float = 0.1,
+        tolerancia: float = 1e-10,
+        max_iteracoes: int = 50
+    ) -> Dict[str, any]:
+        """
+        TIR com datas (XIRR), taxa anual com base 365 dias
+
+        Returns:
+            Mesmo formato de calcular_tir
+        """
+        fluxos = np.atleast_2d(np.asarray(fluxos_caixa, dtype=np.float64))
+        resultado = _resolver_tir(fluxos, _fracao_anos(datas), chute, tolerancia, max_iteracoes)
+        return _linha_tir(resultado.iloc[0])
     
+    @metrics.timed(CALC_SECONDS, metodo="simular_monte_carlo")
+    def simular_monte_carlo(
+        self,
+        principal: float,
+        aporte_mensal: float,
+        anos: int,
+        n_trajetorias: int = 100_000,
+        percentual_cdi: float = 1.0,
+        taxa_cdi: float = None,
+        ipca: float = None,
+        volatilidade_cdi: float = 0.02,
+        volatilidade_ipca: float = 0.01,
+        reversao: float = 0.5,
+        correlacao: float = 0.6,
+        percentis: Tuple[float, ...] = (5, 25, 50, 75, 95),
+        objetivo: float = None,
+        seed: int = 42,
+        workers: int = 1,
+        tamanho_bloco: int = 50_000
+    ) -> Dict[str, any]:
+        """
+        Projeção probabilística (Monte Carlo) de um investimento atrelado ao CDI
+
+        CDI e IPCA anuais seguem processos com reversão à média (Ornstein-Uhlenbeck),
+        correlacionados, em passos mensais. O saldo recebe o aporte no início do
+        mês e rende `percentual_cdi` do CDI do mês.
+
+        As trajetórias são divididas em blocos de tamanho fixo, cada um com sua
+        semente derivada de `seed` (SeedSequence.spawn): o resultado é o mesmo
+        para qualquer número de workers. Com workers > 1 os blocos rodam num
+        pool de processos que escreve direto num buffer de memória compartilhada.
+
+        Args:
+            principal: Valor inicial
+            aporte_mensal: Aporte mensal
+            anos: Horizonte da simulação
+            n_trajetorias: Número de cenários simulados
+            percentual_cdi: Rentabilidade em % do CDI (1.0 = 100% do CDI)
+            taxa_cdi: CDI anual inicial e de longo prazo (padrão: taxa_atual("cdi"))
+            ipca: IPCA anual inicial e de longo prazo (padrão: taxa_atual("ipca"))
+            volatilidade_cdi: Desvio padrão anual do CDI
+            volatilidade_ipca: Desvio padrão anual do IPCA
+            reversao: Velocidade de reversão à média (por ano)
+            correlacao: Correlação entre os choques de CDI e IPCA
+            percentis: Faixas a calcular
+            objetivo: Valor alvo (nominal) para calcular a probabilidade de atingir
+            seed: Semente para reprodutibilidade
+            workers: Processos usados (1 = no próprio processo)
+            tamanho_bloco: Trajetórias por bloco
+
+        Returns:
+            Dicionário com "nominal" e "real" (DataFrames ano x percentil),
+            "media_final", "prob_objetivo" e parâmetros usados
+        """
+        # Sem isto, anos=0 falhava no índice do último mês e n_trajetorias=0 ao
+        # criar o buffer de memória compartilhada (tamanho zero)
+        if anos < 1:
+            raise ValueError("Horizonte deve ser de pelo menos 1 ano")
+        if n_trajetorias < 1 or tamanho_bloco < 1:
+            raise ValueError("Número de trajetórias e tamanho do bloco devem ser pelo menos 1")
+
+        parametros = {
+            "principal": principal,
+            "aporte_mensal": aporte_mensal,
+            "meses": int(anos * 12),
+            "percentual_cdi": percentual_cdi,
+            "taxa_cdi": self.taxa_atual("cdi") if taxa_cdi is None else taxa_cdi,
+            "ipca": self.taxa_atual("ipca") if ipca is None else ipca,
+            "volatilidade_cdi": volatilidade_cdi,
+            "volatilidade_ipca": volatilidade_ipca,
+            "reversao": reversao,
+            "correlacao": correlacao,
+        }
+        resultados = _executar_monte_carlo(parametros, n_trajetorias, seed, workers, tamanho_bloco)
+
+        anos_idx = pd.Index(np.arange(1, int(anos) + 1), name="ano")
+        colunas = [f"p{p:g}" for p in percentis]
+        nominal = pd.DataFrame(np.percentile(resultados[0], percentis, axis=0).T, index=anos_idx, columns=colunas)
+        real = pd.DataFrame(np.percentile(resultados[1], percentis, axis=0).T, index=anos_idx, columns=colunas)
+        finais = resultados[0][:, -1]
+
+        return {
+            "nominal": nominal.round(2),
+            "real": real.round(2),
+            "media_final": round(float(finais.mean()), 2),
+            "prob_objetivo": float((finais >= objetivo).mean()) if objetivo is not None else None,
+            "n_trajetorias": n_trajetorias,
+            "parametros": parametros,
+        }
+
     def gerar_relatorio_simulacao(
         self,
         tipo: str,
@@ -363,19 +1187,18 @@ class FinancialCalculator:
         Gera relatório textual de simulação financeira
         
         Args:
-            tipo: Tipo de simulação ("aposentadoria", "objetivo", "comparacao")
+            tipo: Tipo de simulação (ver RELATORIOS e dados_relatorio)
             parametros: Dicionários com parâmetros da simulação
             
         Returns:
             Relatório formatado em texto
         """
+        if tipo not in self.RELATORIOS:
+            return "Tipo de relatório não implementado"
+
+        dados = self.dados_relatorio(tipo, parametros)
         if tipo == "objetivo":
-            resultado = self.calcular_poupanca_objetivo(
-                parametros["objetivo"],
-                parametros["taxa"],
-                parametros["prazo"]
-            )
-            
+            resultado = dados["resultado"]
             relatorio = f"""
 📊 SIMULAÇÃO: ATINGIR OBJETIVO FINANCEIRO
 
@@ -392,6 +1215,864 @@ class FinancialCalculator:
 💡 DICA: Configure débito automático para não esquecer os aportes!
 """
             return relatorio
-        
-        # Outros tipos de relatório podem ser adicionados aqui
-        return "Tipo de relatório não implementado"
+
+        linhas = [f"📊 SIMULAÇÃO: {dados['titulo'].upper()}", ""]
+        linhas += [f"• {rotulo}: {formatar_valor(valor, formato)}" for rotulo, valor, formato in dados["parametros"]]
+        linhas += ["", "💰 RESULTADO:"]
+        linhas += [f"   • {rotulo}: {formatar_valor(valor, formato)}" for rotulo, valor, formato in dados["resumo"]]
+        linhas += ["", f"💡 DICA: {dados['dica']}"]
+        return "\n" + "\n".join(linhas) + "\n"
+
+    @metrics.timed(CALC_SECONDS, metodo="dados_relatorio")
+    def dados_relatorio(self, tipo: str, parametros: Dict[str, any]) -> Dict[str, any]:
+        """
+        Calcula o conteúdo estruturado de um relatório (base do texto e do PDF)
+
+        Tipos e parâmetros:
+        - "objetivo": objetivo, taxa, prazo (anos)
+        - "investimento": principal, aporte_mensal, taxa, prazo (anos)
+        - "comparacao": valor_inicial, prazo (anos), opcoes (como em comparar_investimentos)
+        - "financiamento": valor, taxa_mensal, prazo_meses, sistema (opcional)
+
+        Returns:
+            Dicionário com titulo, parametros e resumo (listas de (rótulo, valor,
+            formato), formato em "moeda", "pct", "anos", "meses" ou "texto"),
+            tabela (DataFrame ou TabelaAmortizacao), colunas da tabela
+            ((coluna, rótulo, formato)), grafico ({"tipo": "linha" ou "barras",
+            "titulo", "x", "series": {rótulo: valores}}), dica e resultado bruto
+        """
+        if tipo == "objetivo":
+            resultado = self.calcular_poupanca_objetivo(parametros["objetivo"], parametros["taxa"], parametros["prazo"])
+            evolucao = self.simular_investimento_tempo(0, resultado["aporte_mensal"], parametros["taxa"], parametros["prazo"])
+            anual = evolucao.iloc[11::12]
+            return {
+                "tipo": tipo,
+                "titulo": "Atingir objetivo financeiro",
+                "parametros": [
+                    ("Objetivo", parametros["objetivo"], "moeda"),
+                    ("Prazo", parametros["prazo"], "anos"),
+                    ("Taxa anual", parametros["taxa"], "pct"),
+                ],
+                "resumo": [
+                    ("Aporte mensal necessário", resultado["aporte_mensal"], "moeda"),
+                    ("Total investido", resultado["total_investido"], "moeda"),
+                    ("Rendimento estimado", resultado["rendimento"], "moeda"),
+                    ("Valor final", resultado["valor_final"], "moeda"),
+                ],
+                "tabela": anual[["mes", "saldo", "total_investido", "rendimento_acumulado"]].assign(mes=anual["mes"] // 12),
+                "colunas": [("mes", "Ano", "texto"), ("saldo", "Saldo", "moeda"),
+                            ("total_investido", "Investido", "moeda"), ("rendimento_acumulado", "Rendimento", "moeda")],
+                "grafico": {"tipo": "linha", "titulo": "Evolução do saldo", "x": evolucao["mes"].to_numpy(),
+                            "series": {"Saldo": evolucao["saldo"].to_numpy(),
+                                       "Total investido": evolucao["total_investido"].to_numpy()}},
+                "dica": "Configure débito automático para não esquecer os aportes!",
+                "resultado": resultado,
+            }
+
+        if tipo == "investimento":
+            evolucao = self.simular_investimento_tempo(
+                parametros["principal"], parametros["aporte_mensal"], parametros["taxa"], parametros["prazo"]
+            )
+            final = evolucao.iloc[-1]
+            anual = evolucao.iloc[11::12]
+            return {
+                "tipo": tipo,
+                "titulo": "Evolução do investimento",
+                "parametros": [
+                    ("Valor inicial", parametros["principal"], "moeda"),
+                    ("Aporte mensal", parametros["aporte_mensal"], "moeda"),
+                    ("Taxa anual", parametros["taxa"], "pct"),
+                    ("Prazo", parametros["prazo"], "anos"),
+                ],
+                "resumo": [
+                    ("Saldo final", float(final["saldo"]), "moeda"),
+                    ("Total investido", float(final["total_investido"]), "moeda"),
+                    ("Rendimento", float(final["rendimento_acumulado"]), "moeda"),
+                ],
+                "tabela": anual[["mes", "saldo", "total_investido", "rendimento_acumulado"]].assign(mes=anual["mes"] // 12),
+                "colunas": [("mes", "Ano", "texto"), ("saldo", "Saldo", "moeda"),
+                            ("total_investido", "Investido", "moeda"), ("rendimento_acumulado", "Rendimento", "moeda")],
+                "grafico": {"tipo": "linha", "titulo": "Evolução do saldo", "x": evolucao["mes"].to_numpy(),
+                            "series": {"Saldo": evolucao["saldo"].to_numpy(),
+                                       "Total investido": evolucao["total_investido"].to_numpy()}},
+                "dica": "Aportes regulares pesam mais que a taxa nos primeiros anos.",
+                "resultado": evolucao,
+            }
+
+        if tipo == "comparacao":
+            comparacao = self.comparar_investimentos(parametros["valor_inicial"], parametros["prazo"], parametros["opcoes"])
+            melhor = comparacao.iloc[0]
+            return {
+                "tipo": tipo,
+                "titulo": "Comparação de investimentos",
+                "parametros": [
+                    ("Valor inicial", parametros["valor_inicial"], "moeda"),
+                    ("Prazo", parametros["prazo"], "anos"),
+                    ("Opções comparadas", str(len(comparacao)), "texto"),
+                ],
+                "resumo": [
+                    ("Melhor opção", melhor["Investimento"], "texto"),
+                    ("Montante final", float(melhor["Montante Final"]), "moeda"),
+                    ("Diferença para a pior", float(melhor["Montante Final"] - comparacao["Montante Final"].iloc[-1]), "moeda"),
+                ],
+                "tabela": comparacao.assign(**{"Taxa Anual": comparacao["Taxa Anual"] / 100, "ROI": comparacao["ROI"] / 100}),
+                "colunas": [("Investimento", "Investimento", "texto"), ("Taxa Anual", "Taxa anual", "pct"),
+                            ("Montante Final", "Montante final", "moeda"), ("Rendimento", "Rendimento", "moeda"),
+                            ("ROI", "ROI", "pct")],
+                "grafico": {"tipo": "barras", "titulo": "Montante final por opção",
+                            "x": comparacao["Investimento"].to_numpy(),
+                            "series": {"Montante final": comparacao["Montante Final"].to_numpy()}},
+                "dica": "Compare também liquidez, IR e garantia do FGC, não só a taxa.",
+                "resultado": comparacao,
+            }
+
+        if tipo == "financiamento":
+            tabela = self.gerar_tabela_amortizacao(
+                parametros["valor"], parametros["taxa_mensal"], parametros["prazo_meses"], parametros.get("sistema", "PRICE")
+            )
+            resumo = tabela.resumo()
+            return {
+                "tipo": tipo,
+                "titulo": f"Financiamento ({tabela.sistema})",
+                "parametros": [
+                    ("Valor financiado", parametros["valor"], "moeda"),
+                    ("Taxa mensal", parametros["taxa_mensal"], "pct"),
+                    ("Prazo", parametros["prazo_meses"], "meses"),
+                    ("Sistema", tabela.sistema, "texto"),
+                ],
+                "resumo": [
+                    ("Primeira parcela", resumo["primeira_parcela"], "moeda"),
+                    ("Última parcela", resumo["ultima_parcela"], "moeda"),
+                    ("Total pago", resumo["total_pago"], "moeda"),
+                    ("Total de juros", resumo["total_juros"], "moeda"),
+                ],
+                "tabela": tabela,
+                "colunas": [("mes", "Mês", "texto"), ("parcela", "Parcela", "moeda"), ("juros", "Juros", "moeda"),
+                            ("amortizacao", "Amortização", "moeda"), ("amortizacao_extra", "Extra", "moeda"),
+                            ("saldo_devedor", "Saldo", "moeda")],
+                "grafico": {"tipo": "linha", "titulo": "Saldo devedor e juros acumulados", "x": tabela.mes,
+                            "series": {"Saldo devedor": tabela.saldo_devedor,
+                                       "Juros acumulados": np.cumsum(tabela.juros)}},
+                "dica": "Amortizações extras no início do contrato economizam mais juros.",
+                "resultado": resumo,
+            }
+
+        raise ValueError(f"Tipo de relatório deve ser um de: {', '.join(self.RELATORIOS)}")
+
+    # ------------------------------------------------------------------
+    # Versões em lote (NumPy)
+    # Aceitam escalares ou arrays (com broadcasting) e reproduzem os
+    # métodos escalares acima, arredondados ao centavo.
+    # ------------------------------------------------------------------
+
+    def juros_compostos_lote(
+        self,
+        principal: ArrayLike,
+        taxa: ArrayLike,
+        tempo: ArrayLike,
+        aporte_mensal: ArrayLike = 0
+    ) -> np.ndarray:
+        """
+        Versão vetorizada de juros_compostos
+
+        Diferença: taxa 0 com aporte retorna aporte * meses (o escalar divide por zero)
+
+        Returns:
+            Array com os montantes finais
+        """
+        if self.precisao == "exata":
+            return _aplicar_exato(_juros_compostos_exato, principal, taxa, tempo, aporte_mensal)
+
+        principal, taxa, tempo, aporte_mensal = _como_arrays(principal, taxa, tempo, aporte_mensal)
+
+        montante_principal = principal * np.power(1 + taxa, tempo)
+
+        taxa_mensal = np.power(1 + taxa, 1 / 12) - 1
+        meses = tempo * 12
+        fator_aportes = _fator_acumulacao(taxa_mensal, meses)
+        montante_aportes = np.where(aporte_mensal > 0, aporte_mensal * fator_aportes, 0.0)
+
+        return np.round(montante_principal + montante_aportes, 2)
+
+    def calcular_financiamento_lote(
+        self,
+        valor_financiado: ArrayLike,
+        taxa_mensal: ArrayLike,
+        prazo_meses: ArrayLike,
+        sistema: Union[str, ArrayLike] = "PRICE"
+    ) -> np.ndarray:
+        """
+        Versão vetorizada de calcular_financiamento
+
+        Args:
+            sistema: "PRICE", "SAC" ou array com um sistema por cenário
+
+        Returns:
+            Array com a parcela (PRICE) ou primeira parcela (SAC)
+        """
+        valor_financiado, taxa_mensal, prazo_meses = _como_arrays(valor_financiado, taxa_mensal, prazo_meses)
+        sistema = np.asarray(sistema)
+        if not np.isin(sistema, ["PRICE", "SAC"]).all():
+            raise ValueError("Sistema deve ser 'PRICE' ou 'SAC'")
+        if self.precisao == "exata":
+            return _aplicar_exato(_financiamento_exato, valor_financiado, taxa_mensal, prazo_meses, sistema)
+
+        fator = np.power(1 + taxa_mensal, prazo_meses)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            parcela_price = valor_financiado * (taxa_mensal * fator) / (fator - 1)
+        parcela_price = np.where(taxa_mensal == 0, valor_financiado / prazo_meses, parcela_price)
+
+        parcela_sac = valor_financiado / prazo_meses + valor_financiado * taxa_mensal
+
+        return np.round(np.where(sistema == "SAC", parcela_sac, parcela_price), 2)
+
+    def calcular_poupanca_objetivo_lote(
+        self,
+        objetivo: ArrayLike,
+        taxa_anual: ArrayLike,
+        prazo_anos: ArrayLike
+    ) -> pd.DataFrame:
+        """
+        Versão vetorizada de calcular_poupanca_objetivo
+
+        Returns:
+            DataFrame com as colunas aporte_mensal, total_investido, rendimento e valor_final
+        """
+        if self.precisao == "exata":
+            linhas = _aplicar_exato(_poupanca_objetivo_exato, objetivo, taxa_anual, prazo_anos)
+            return pd.DataFrame(list(np.ravel(linhas)))
+
+        objetivo, taxa_anual, prazo_anos = _como_arrays(objetivo, taxa_anual, prazo_anos)
+
+        taxa_mensal = np.power(1 + taxa_anual, 1 / 12) - 1
+        meses = prazo_anos * 12
+        aporte_mensal = objetivo / _fator_acumulacao(taxa_mensal, meses)
+
+        total_investido = aporte_mensal * meses
+        return pd.DataFrame({
+            "aporte_mensal": np.round(aporte_mensal, 2),
+            "total_investido": np.round(total_investido, 2),
+            "rendimento": np.round(objetivo - total_investido, 2),
+            "valor_final": np.round(objetivo, 2)
+        })
+
+    def calcular_roi_lote(
+        self,
+        valor_investido: ArrayLike,
+        valor_retornado: ArrayLike
+    ) -> pd.DataFrame:
+        """
+        Versão vetorizada de calcular_roi
+
+        Returns:
+            DataFrame com as colunas roi_percentual, lucro_absoluto, valor_inicial e valor_final
+        """
+        valor_investido, valor_retornado = _como_arrays(valor_investido, valor_retornado)
+        lucro = valor_retornado - valor_investido
+
+        return pd.DataFrame({
+            "roi_percentual": np.round(lucro / valor_investido * 100, 2),
+            "lucro_absoluto": np.round(lucro, 2),
+            "valor_inicial": np.round(valor_investido, 2),
+            "valor_final": np.round(valor_retornado, 2)
+        })
+
+    def calcular_imposto_renda_investimento_lote(
+        self,
+        rendimento: ArrayLike,
+        dias_aplicacao: ArrayLike
+    ) -> pd.DataFrame:
+        """
+        Versão vetorizada de calcular_imposto_renda_investimento (tabela regressiva)
+
+        Returns:
+            DataFrame com as colunas aliquota, imposto, rendimento_bruto e rendimento_liquido
+        """
+        if self.precisao == "exata":
+            linhas = _aplicar_exato(_imposto_renda_exato, rendimento, dias_aplicacao)
+            return pd.DataFrame(list(np.ravel(linhas)))
+
+        rendimento, dias_aplicacao = _como_arrays(rendimento, dias_aplicacao)
+        aliquota = _aliquota_ir(dias_aplicacao)
+
+        imposto = rendimento * aliquota
+        return pd.DataFrame({
+            "aliquota": aliquota * 100,
+            "imposto": np.round(imposto, 2),
+            "rendimento_bruto": np.round(rendimento, 2),
+            "rendimento_liquido": np.round(rendimento - imposto, 2)
+        })
+
+    def calcular_inflacao_real_lote(
+        self,
+        retorno_nominal: ArrayLike,
+        inflacao: ArrayLike
+    ) -> np.ndarray:
+        """
+        Versão vetorizada de calcular_inflacao_real
+
+        Returns:
+            Array com o retorno real (percentual)
+        """
+        retorno_nominal, inflacao = _como_arrays(retorno_nominal, inflacao)
+        return np.round(((1 + retorno_nominal) / (1 + inflacao) - 1) * 100, 2)
+
+
+def formatar_valor(valor, formato: str) -> str:
+    """Formata um valor de relatório ("moeda", "pct", "anos", "meses" ou "texto")"""
+    if formato == "moeda":
+        return f"R$ {valor:,.2f}"
+    if formato == "pct":
+        return f"{valor * 100:.2f}%"
+    if formato == "anos":
+        return f"{valor:g} anos"
+    if formato == "meses":
+        return f"{valor:g} meses"
+    return str(valor)
+
+
+def _como_arrays(*valores: ArrayLike) -> List[np.ndarray]:
+    """Converte para float64 e aplica broadcasting entre os parâmetros"""
+    return np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in valores))
+
+
+def _fator_acumulacao(taxa: np.ndarray, periodos: np.ndarray) -> np.ndarray:
+    """Fator de valor futuro de uma série: ((1 + i)^n - 1) / i, com limite n quando i = 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fator = (np.power(1 + taxa, periodos) - 1) / taxa
+    return np.where(taxa == 0, periodos, fator)
+
+
+def _somar_meses(datas: np.ndarray, meses: np.ndarray) -> np.ndarray:
+    """Mesmo dia `meses` meses depois (ou o último dia, em meses mais curtos), com broadcasting"""
+    datas = np.asarray(datas, dtype="datetime64[D]")
+    mes = datas.astype("datetime64[M]")
+    dia = datas - mes.astype("datetime64[D]")
+    alvo = mes + np.asarray(meses).astype("timedelta64[M]")
+    return np.minimum(alvo.astype("datetime64[D]") + dia, (alvo + 1).astype("datetime64[D]") - 1)
+
+
+def _fator_historico(
+    produto: Dict[str, any],
+    series: Dict[str, any],
+    inicios: np.ndarray,
+    fins: np.ndarray,
+    dias_uteis: np.ndarray,
+    meses: int
+) -> np.ndarray:
+    """Fator bruto de cada janela [inicio, fim) para um produto do backtest"""
+    tipo = produto["tipo"]
+    if tipo == "cdb":
+        return series["cdi"].accumulated_many(inicios, fins, produto.get("percentual", 1.0))
+    if tipo == "tesouro_selic":
+        fator = series["selic"].accumulated_many(inicios, fins)
+        return fator * np.power(1 + produto.get("spread", 0.0), dias_uteis / 252)
+    if tipo == "ipca_mais":
+        ipca = series["ipca"]
+        fator = np.exp(ipca.log_factors_at(fins) - ipca.log_factors_at(inicios))
+        return fator * np.power(1 + produto["taxa"], dias_uteis / 252)
+    if tipo == "prefixado":
+        return np.power(1 + produto["taxa"], dias_uteis / 252)
+    # Poupança: taxa de cada mês definida pela Selic no aniversário que o inicia
+    aniversarios = _somar_meses(inicios[:, None], np.arange(meses)[None, :])
+    selic = series["selic"].values_at(aniversarios) / 100
+    taxa_mensal = np.where(selic > 0.085, 0.005, np.power(1 + 0.7 * selic, 1 / 12) - 1)
+    return np.prod(1 + taxa_mensal, axis=1)
+
+
+def _aliquota_ir(dias_aplicacao: np.ndarray) -> np.ndarray:
+    """Alíquota da tabela regressiva de IR para cada prazo (em dias)"""
+    return np.select(
+        [dias_aplicacao <= 180, dias_aplicacao <= 360, dias_aplicacao <= 720],
+        [0.225, 0.20, 0.175],
+        default=0.15
+    )
+
+
+# ----------------------------------------------------------------------
+# Precisão exata (Decimal, arredondamento bancário ao centavo)
+# ----------------------------------------------------------------------
+
+_CENTAVO = Decimal("0.01")
+_CONTEXTO_EXATO = Context(prec=34)
+_ALIQUOTAS_IR = ((180, Decimal("0.225")), (360, Decimal("0.20")), (720, Decimal("0.175")))
+
+
+def _dec(valor) -> Decimal:
+    """Converte pelo texto (0.009 -> Decimal("0.009")), não pela expansão binária do float"""
+    if isinstance(valor, Decimal):
+        return valor
+    if isinstance(valor, (int, np.integer)):
+        return Decimal(int(valor))
+    return Decimal(str(float(valor)))
+
+
+def _centavos(valor: Decimal) -> Decimal:
+    return valor.quantize(_CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def _aplicar_exato(funcao, *valores) -> np.ndarray:
+    """Aplica uma função exata elemento a elemento (com broadcasting); retorna array de objetos"""
+    return np.frompyfunc(funcao, len(valores), 1)(*(np.asarray(v, dtype=object) for v in valores))
+
+
+def _juros_compostos_exato(principal, taxa, tempo, aporte_mensal=0) -> Decimal:
+    with localcontext(_CONTEXTO_EXATO):
+        principal, taxa, tempo, aporte_mensal = map(_dec, (principal, taxa, tempo, aporte_mensal))
+        montante = principal * (1 + taxa) ** tempo
+
+        if aporte_mensal > 0:
+            taxa_mensal = (1 + taxa) ** (Decimal(1) / 12) - 1
+            meses = tempo * 12
+            if taxa_mensal == 0:
+                montante += aporte_mensal * meses
+            else:
+                montante += aporte_mensal * ((1 + taxa_mensal) ** meses - 1) / taxa_mensal
+
+        return _centavos(montante)
+
+
+def _financiamento_exato(valor_financiado, taxa_mensal, prazo_meses, sistema="PRICE") -> Decimal:
+    with localcontext(_CONTEXTO_EXATO):
+        valor, i, n = map(_dec, (valor_financiado, taxa_mensal, prazo_meses))
+
+        if sistema == "PRICE":
+            if i == 0:
+                return _centavos(valor / n)
+            fator = (1 + i) ** n
+            return _centavos(valor * i * fator / (fator - 1))
+
+        if sistema == "SAC":
+            return _centavos(valor / n + valor * i)
+
+        raise ValueError("Sistema deve ser 'PRICE' ou 'SAC'")
+
+
+def _poupanca_objetivo_exato(objetivo, taxa_anual, prazo_anos) -> Dict[str, Decimal]:
+    with localcontext(_CONTEXTO_EXATO):
+        objetivo, taxa_anual, prazo_anos = map(_dec, (objetivo, taxa_anual, prazo_anos))
+        taxa_mensal = (1 + taxa_anual) ** (Decimal(1) / 12) - 1
+        meses = prazo_anos * 12
+
+        if taxa_mensal == 0:
+            aporte_mensal = objetivo / meses
+        else:
+            aporte_mensal = objetivo / (((1 + taxa_mensal) ** meses - 1) / taxa_mensal)
+
+        total_investido = aporte_mensal * meses
+        return {
+            "aporte_mensal": _centavos(aporte_mensal),
+            "total_investido": _centavos(total_investido),
+            "rendimento": _centavos(objetivo - total_investido),
+            "valor_final": _centavos(objetivo)
+        }
+
+
+def _imposto_renda_exato(rendimento, dias_aplicacao) -> Dict[str, Decimal]:
+    with localcontext(_CONTEXTO_EXATO):
+        rendimento = _centavos(_dec(rendimento))
+        aliquota = next((a for limite, a in _ALIQUOTAS_IR if dias_aplicacao <= limite), Decimal("0.15"))
+
+        # Líquido = bruto - imposto já arredondado: as três parcelas fecham ao centavo
+        imposto = _centavos(rendimento * aliquota)
+        return {
+            "aliquota": (aliquota * 100).normalize(),
+            "imposto": imposto,
+            "rendimento_bruto": rendimento,
+            "rendimento_liquido": rendimento - imposto
+        }
+
+
+# Saldo abaixo deste valor (meio centavo) é considerado quitado
+_TOLERANCIA_QUITACAO = 0.005
+
+
+def _saldo_parcela_fixa(saldo_inicial: float, i: float, j: np.ndarray, parcela: float) -> np.ndarray:
+    """Saldo após j parcelas fixas: S * (1 + i)^j - PMT * [((1 + i)^j - 1) / i]"""
+    if i == 0:
+        return saldo_inicial - parcela * j
+    crescimento = np.power(1 + i, j)
+    return saldo_inicial * crescimento - parcela * (crescimento - 1) / i
+
+
+def _parcela_price(valor: float, i: float, n: int) -> float:
+    if i == 0:
+        return valor / n
+    fator = math.pow(1 + i, n)
+    return valor * i * fator / (fator - 1)
+
+
+def _saldos_sacre(valor: float, i: float, n: int, periodo: int) -> np.ndarray:
+    """
+    Saldos SACRE sem amortizações extras, sem laço por período
+
+    Em cada bloco a parcela é S_b * (1 / restantes + i), proporcional ao saldo
+    inicial do bloco; assim o saldo inicial de cada bloco é o valor financiado
+    vezes o produto acumulado dos fatores dos blocos anteriores.
+    """
+    inicio_blocos = np.arange(0, n, periodo)
+    restantes = n - inicio_blocos
+    tamanho_blocos = np.minimum(periodo, restantes)
+    coeficiente = 1 / restantes + i
+
+    fatores = np.power(1 + i, tamanho_blocos) - coeficiente * _fator_acumulacao(np.float64(i), tamanho_blocos)
+    saldo_blocos = valor * np.concatenate(([1.0], np.cumprod(fatores[:-1])))
+
+    bloco = np.arange(n) // periodo
+    j = np.arange(n) - inicio_blocos[bloco] + 1
+    return saldo_blocos[bloco] * np.power(1 + i, j) - saldo_blocos[bloco] * coeficiente[bloco] * _fator_acumulacao(np.float64(i), j)
+
+
+def _saldos_por_segmento(
+    valor: float,
+    i: float,
+    n: int,
+    sistema: str,
+    extras: np.ndarray,
+    periodo: int
+) -> np.ndarray:
+    """
+    Saldos após cada parcela, calculados por segmentos vetorizados
+
+    Os segmentos terminam nos meses com amortização extra (e nos recálculos da
+    SACRE); dentro de cada um o saldo segue fórmula fechada.
+    """
+    saldo_pos_parcela = np.zeros(n)
+    quebras = set(np.flatnonzero(extras) + 1)
+    if sistema == "SACRE":
+        quebras |= set(range(periodo, n, periodo))
+
+    parcela_price = _parcela_price(valor, i, n)
+    amortizacao_sac = valor / n
+
+    inicio, saldo = 0, float(valor)
+    for fim in sorted(quebras | {n}):
+        j = np.arange(1, fim - inicio + 1)
+        if sistema == "SAC":
+            segmento = saldo - amortizacao_sac * j
+        elif sistema == "PRICE":
+            segmento = _saldo_parcela_fixa(saldo, i, j, parcela_price)
+        else:
+            segmento = _saldo_parcela_fixa(saldo, i, j, saldo / (n - inicio) + saldo * i)
+
+        saldo_pos_parcela[inicio:fim] = segmento
+        saldo = segmento[-1] - extras[fim - 1]
+        if saldo <= _TOLERANCIA_QUITACAO:
+            break
+        inicio = fim
+
+    return saldo_pos_parcela
+
+
+class TabelaAmortizacao:
+    """
+    Tabela de amortização apoiada em arrays NumPy
+
+    Os valores ficam em arrays sem arredondamento; linhas e páginas são
+    montadas (e arredondadas ao centavo) só quando pedidas, para a interface
+    e o PDF percorrerem a tabela sem gerar tudo de uma vez.
+    """
+
+    COLUNAS = ("mes", "parcela", "juros", "amortizacao", "amortizacao_extra", "saldo_devedor")
+
+    def __init__(
+        self,
+        sistema: str,
+        valor_financiado: float,
+        taxa_mensal: float,
+        parcela: np.ndarray,
+        juros: np.ndarray,
+        amortizacao: np.ndarray,
+        amortizacao_extra: np.ndarray,
+        saldo_devedor: np.ndarray
+    ):
+        self.sistema = sistema
+        self.valor_financiado = valor_financiado
+        self.taxa_mensal = taxa_mensal
+        self.parcela = parcela
+        self.juros = juros
+        self.amortizacao = amortizacao
+        self.amortizacao_extra = amortizacao_extra
+        self.saldo_devedor = saldo_devedor
+        self.mes = np.arange(1, len(parcela) + 1)
+        # Somente leitura: a mesma tabela pode vir do CalculoCache para vários usuários
+        for coluna in self.COLUNAS:
+            getattr(self, coluna).setflags(write=False)
+
+    @classmethod
+    def a_partir_dos_saldos(
+        cls,
+        sistema: str,
+        valor: float,
+        i: float,
+        saldo_pos_parcela: np.ndarray,
+        extras: np.ndarray
+    ) -> "TabelaAmortizacao":
+        """Deriva juros, amortização e parcela dos saldos e corta a tabela na quitação"""
+        saldo_pos_parcela = saldo_pos_parcela.copy()
+        extras = extras.copy()
+        saldo_final = saldo_pos_parcela - extras
+
+        quitados = np.flatnonzero(saldo_final <= _TOLERANCIA_QUITACAO)
+        fim = int(quitados[0]) + 1 if quitados.size else len(saldo_final)
+        if quitados.size:
+            k = fim - 1
+            if saldo_pos_parcela[k] <= _TOLERANCIA_QUITACAO:
+                # A própria parcela quita: última parcela menor, sem extra
+                saldo_pos_parcela[k], extras[k] = 0.0, 0.0
+            else:
+                # O extra quita: limita o extra ao saldo restante
+                extras[k] = saldo_pos_parcela[k]
+            saldo_final[k] = 0.0
+
+        saldo_pos_parcela, extras, saldo_final = saldo_pos_parcela[:fim], extras[:fim], saldo_final[:fim]
+        saldo_anterior = np.concatenate(([valor], saldo_final[:-1]))
+        juros = saldo_anterior * i
+        amortizacao = saldo_anterior - saldo_pos_parcela
+
+        return cls(sistema, valor, i, juros + amortizacao, juros, amortizacao, extras, saldo_final)
+
+    def __len__(self) -> int:
+        return len(self.parcela)
+
+    def total_paginas(self, tamanho: int = 12) -> int:
+        return math.ceil(len(self) / tamanho)
+
+    def pagina(self, numero: int, tamanho: int = 12) -> pd.DataFrame:
+        """
+        Retorna uma página da tabela (numeração a partir de 1)
+
+        Args:
+            numero: Número da página
+            tamanho: Linhas por página
+        """
+        inicio = (numero - 1) * tamanho
+        fatia = slice(inicio, inicio + tamanho)
+        return pd.DataFrame({
+            coluna: getattr(self, coluna)[fatia] if coluna == "mes" else np.round(getattr(self, coluna)[fatia], 2)
+            for coluna in self.COLUNAS
+        })
+
+    def linhas(self, inicio: int = 0, fim: int = None) -> Iterator[Dict[str, float]]:
+        """Gera as linhas uma a uma (ex: para escrever no PDF sem montar a tabela inteira)"""
+        for k in range(inicio, len(self) if fim is None else min(fim, len(self))):
+            yield {
+                "mes": int(self.mes[k]),
+                "parcela": round(float(self.parcela[k]), 2),
+                "juros": round(float(self.juros[k]), 2),
+                "amortizacao": round(float(self.amortizacao[k]), 2),
+                "amortizacao_extra": round(float(self.amortizacao_extra[k]), 2),
+                "saldo_devedor": round(float(self.saldo_devedor[k]), 2),
+            }
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return self.pagina(1, tamanho=len(self))
+
+    def resumo(self) -> Dict[str, float]:
+        """Totais do financiamento"""
+        return {
+            "sistema": self.sistema,
+            "prazo_efetivo": len(self),
+            "primeira_parcela": round(float(self.parcela[0]), 2),
+            "ultima_parcela": round(float(self.parcela[-1]), 2),
+            "total_pago": round(float(self.parcela.sum() + self.amortizacao_extra.sum()), 2),
+            "total_juros": round(float(self.juros.sum()), 2),
+            "total_amortizacao_extra": round(float(self.amortizacao_extra.sum()), 2),
+        }
+
+
+# Taxas usadas para procurar mudança de sinal do VPL quando Newton falha
+_GRADE_TIR = np.array([-0.99, -0.9, -0.75, -0.5, -0.25, -0.1, 0.0, 0.05, 0.1, 0.2, 0.35, 0.5, 1.0, 2.0, 5.0, 10.0, 100.0])
+
+
+def _fracao_anos(datas: List[datetime]) -> np.ndarray:
+    """Anos (base 365) entre cada data e a primeira"""
+    dias = np.array([(pd.Timestamp(d) - pd.Timestamp(datas[0])).days for d in datas], dtype=np.float64)
+    return dias / 365.0
+
+
+def _vpl_e_derivada(fluxos: np.ndarray, tempos: np.ndarray, taxas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """VPL e dVPL/dtaxa de cada série na sua taxa"""
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        descontados = fluxos * np.power(1 + taxas[:, None], -tempos)
+        vpl = descontados.sum(axis=1)
+        derivada = -(tempos * descontados).sum(axis=1) / (1 + taxas)
+    return vpl, derivada
+
+
+def _resolver_tir(
+    fluxos: np.ndarray,
+    tempos: np.ndarray,
+    chute: float,
+    tolerancia: float,
+    max_iteracoes: int
+) -> pd.DataFrame:
+    """Newton vetorizado com recurso a bissecção nas séries que não convergirem"""
+    n = fluxos.shape[0]
+    taxas = np.full(n, chute)
+    convergiu = np.zeros(n, dtype=bool)
+    iteracoes = np.zeros(n, dtype=np.int64)
+    metodo = np.full(n, "sem_solucao", dtype=object)
+
+    # Sem fluxos positivos e negativos não existe TIR
+    tem_solucao = (fluxos.max(axis=1) > 0) & (fluxos.min(axis=1) < 0)
+    ativos = np.flatnonzero(tem_solucao)
+
+    for _ in range(max_iteracoes):
+        if ativos.size == 0:
+            break
+        vpl, derivada = _vpl_e_derivada(fluxos[ativos], tempos if tempos.ndim == 1 else tempos[ativos], taxas[ativos])
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            passo = vpl / derivada
+        nova = taxas[ativos] - passo
+        iteracoes[ativos] += 1
+
+        # Divergência (taxa <= -100% ou não finita): sai do Newton e vai para a bissecção
+        valida = np.isfinite(nova) & (nova > -1)
+        taxas[ativos[valida]] = nova[valida]
+        pronto = valida & (np.abs(passo) < tolerancia)
+        convergiu[ativos[pronto]] = True
+        metodo[ativos[pronto]] = "newton"
+        ativos = ativos[valida & ~pronto]
+
+    pendentes = np.flatnonzero(tem_solucao & ~convergiu)
+    if pendentes.size:
+        _bisseccao_tir(fluxos, tempos, pendentes, taxas, convergiu, iteracoes, metodo, tolerancia)
+
+    taxas[~convergiu] = np.nan
+    return pd.DataFrame({"tir": taxas, "convergiu": convergiu, "iteracoes": iteracoes, "metodo": metodo})
+
+
+def _bisseccao_tir(fluxos, tempos, indices, taxas, convergiu, iteracoes, metodo, tolerancia) -> None:
+    """Procura o primeiro intervalo da grade com mudança de sinal e resolve por bissecção (vetorizada)"""
+    f = fluxos[indices]
+    t = tempos if tempos.ndim == 1 else tempos[indices]
+    with np.errstate(over="ignore", invalid="ignore"):
+        vpl_grade = np.stack([_vpl_e_derivada(f, t, np.full(len(indices), r))[0] for r in _GRADE_TIR], axis=1)
+
+    troca = np.sign(vpl_grade[:, :-1]) * np.sign(vpl_grade[:, 1:]) <= 0
+    troca &= np.isfinite(vpl_grade[:, :-1]) & np.isfinite(vpl_grade[:, 1:])
+    com_intervalo = troca.any(axis=1)
+    if not com_intervalo.any():
+        return
+
+    indices, f = indices[com_intervalo], f[com_intervalo]
+    t = t if t.ndim == 1 else t[com_intervalo]
+    primeira = troca[com_intervalo].argmax(axis=1)
+    baixo, alto = _GRADE_TIR[primeira].copy(), _GRADE_TIR[primeira + 1].copy()
+    vpl_baixo = vpl_grade[com_intervalo, primeira]
+
+    passos = 0
+    while passos < 200 and np.max(alto - baixo) > tolerancia:
+        meio = (baixo + alto) / 2
+        vpl_meio = _vpl_e_derivada(f, t, meio)[0]
+        mesmo_sinal = np.sign(vpl_meio) == np.sign(vpl_baixo)
+        baixo = np.where(mesmo_sinal, meio, baixo)
+        vpl_baixo = np.where(mesmo_sinal, vpl_meio, vpl_baixo)
+        alto = np.where(mesmo_sinal, alto, meio)
+        passos += 1
+
+    taxas[indices] = (baixo + alto) / 2
+    convergiu[indices] = True
+    iteracoes[indices] += passos
+    metodo[indices] = "bisseccao"
+
+
+def _linha_tir(linha: pd.Series) -> Dict[str, any]:
+    tir = float(linha["tir"])
+    return {
+        "tir": tir,
+        "tir_percentual": round(tir * 100, 2) if linha["convergiu"] else None,
+        "convergiu": bool(linha["convergiu"]),
+        "iteracoes": int(linha["iteracoes"]),
+        "metodo": linha["metodo"],
+    }
+
+
+def _executar_monte_carlo(
+    parametros: Dict[str, float],
+    n_trajetorias: int,
+    seed: int,
+    workers: int,
+    tamanho_bloco: int
+) -> np.ndarray:
+    """
+    Roda os blocos de trajetórias e devolve o buffer (2 x trajetórias x anos) com
+    os saldos nominais e reais no fim de cada ano
+    """
+    anos = parametros["meses"] // 12
+    forma = (2, n_trajetorias, anos)
+    inicios = list(range(0, n_trajetorias, tamanho_bloco))
+    # Uma semente por bloco (não por worker): o resultado não depende de `workers`
+    sementes = np.random.SeedSequence(seed).spawn(len(inicios))
+    blocos = [(inicio, min(tamanho_bloco, n_trajetorias - inicio), semente) for inicio, semente in zip(inicios, sementes)]
+
+    if workers <= 1:
+        buffer = np.empty(forma, dtype=np.float32)
+        for inicio, tamanho, semente in blocos:
+            _simular_bloco_monte_carlo(parametros, semente, buffer[:, inicio:inicio + tamanho])
+        return buffer
+
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    memoria = shared_memory.SharedMemory(create=True, size=int(np.prod(forma)) * 4)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tarefas = [
+                pool.submit(_bloco_monte_carlo_compartilhado, memoria.name, forma, parametros, inicio, tamanho, semente)
+                for inicio, tamanho, semente in blocos
+            ]
+            for tarefa in tarefas:
+                tarefa.result()
+        return np.ndarray(forma, dtype=np.float32, buffer=memoria.buf).copy()
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+
+def _bloco_monte_carlo_compartilhado(nome, forma, parametros, inicio, tamanho, semente) -> None:
+    """Executado no processo filho: escreve o bloco direto na memória compartilhada"""
+    from multiprocessing import shared_memory
+
+    memoria = shared_memory.SharedMemory(name=nome)
+    try:
+        buffer = np.ndarray(forma, dtype=np.float32, buffer=memoria.buf)
+        _simular_bloco_monte_carlo(parametros, semente, buffer[:, inicio:inicio + tamanho])
+        del buffer
+    finally:
+        memoria.close()
+
+
+def _simular_bloco_monte_carlo(parametros: Dict[str, float], semente: np.random.SeedSequence, saida: np.ndarray) -> None:
+    """
+    Simula um bloco de trajetórias, vetorizado entre trajetórias, e grava em `saida`
+    (2 x tamanho x anos) os saldos nominal e real ao fim de cada ano
+    """
+    rng = np.random.default_rng(semente)
+    tamanho = saida.shape[1]
+    dt = 1 / 12
+    kappa = parametros["reversao"]
+    rho = parametros["correlacao"]
+
+    cdi = np.full(tamanho, parametros["taxa_cdi"])
+    ipca = np.full(tamanho, parametros["ipca"])
+    saldo = np.full(tamanho, float(parametros["principal"]))
+    inflacao_acumulada = np.ones(tamanho)
+
+    for mes in range(1, parametros["meses"] + 1):
+        z1 = rng.standard_normal(tamanho)
+        z2 = rho * z1 + math.sqrt(1 - rho ** 2) * rng.standard_normal(tamanho)
+
+        cdi += kappa * (parametros["taxa_cdi"] - cdi) * dt + parametros["volatilidade_cdi"] * math.sqrt(dt) * z1
+        ipca += kappa * (parametros["ipca"] - ipca) * dt + parametros["volatilidade_ipca"] * math.sqrt(dt) * z2
+        np.maximum(cdi, 0.0, out=cdi)
+
+        rendimento_mes = np.power(1 + cdi * parametros["percentual_cdi"], dt) - 1
+        saldo += parametros["aporte_mensal"]
+        saldo *= 1 + rendimento_mes
+        inflacao_acumulada *= np.power(1 + np.maximum(ipca, -0.5), dt)
+
+        if mes % 12 == 0:
+            saida[0, :, mes // 12 - 1] = saldo
+            saida[1, :, mes // 12 - 1] = saldo / inflacao_acumulada
@@ -0,0 +1,145 @@
+"""
+FinAI Companion - Gemini Simulado
+Imitação local da API google.generativeai para benchmarks sem rede
+"""
+
+import asyncio
+import time
+from typing import List
+
+
+class _FakeModelInfo:
+    def __init__(self, name: str):
+        self.name = name
+        self.supported_generation_methods = ["generateContent", "countTokens"]
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeChat:
+    """Sessão de chat simulada (equivalente a ChatSession)"""
+
+    def __init__(self, owner: "FakeGenAI", history=None):
+        self.owner = owner
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False):
+        self.owner.send_calls += 1
+        if self.owner.fail_with is not None:
+            raise self.owner.fail_with
+        text = self.owner.reply(content)
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [text]})
+
+        if stream:
+            return self._stream(text)
+
+        time.sleep(self.owner.response_latency + self.owner.token_latency * self.prompt_tokens())
+        return _FakeResponse(text)
+
+    def prompt_tokens(self) -> int:
+        """Tamanho aproximado do prompt (histórico inteiro), ~4 caracteres por token"""
+        return sum(len(str(part)) for content in self.history for part in content["parts"]) // 4
+
+    async def send_message_async(self, content):
+        """Chamada assíncrona: espera uma vaga no servidor simulado e a latência de resposta"""
+        self.owner.send_calls += 1
+        if self.owner.fail_with is not None:
+            raise self.owner.fail_with
+        text = self.owner.reply(content)
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [text]})
+
+        async with self.owner.server_slots():
+            await asyncio.sleep(self.owner.response_latency)
+        return _FakeResponse(text)
+
+    def _stream(self, text):
+        """Emite a resposta em trechos, com o tempo total dividido entre eles"""
+        chunk_size = self.owner.chunk_size
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        intervalo = self.owner.response_latency / len(chunks)
+        for chunk in chunks:
+            time.sleep(intervalo)
+            yield _FakeResponse(chunk)
+
+
+class FakeGenerativeModel:
+    """Modelo simulado (equivalente a genai.GenerativeModel)"""
+
+    def __init__(self, owner: "FakeGenAI", model_name: str, system_instruction: str = None):
+        self.owner = owner
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history=None):
+        return FakeChat(self.owner, history)
+
+
+class FakeGenAI:
+    """
+    Substituto do módulo google.generativeai
+
+    Uso:
+        >>> import ai_core
+        >>> ai_core.genai = FakeGenAI(list_latency=0.3)
+
+    Com `fail_with` (uma exceção), send_message passa a levantá-la, como uma
+    API fora do ar ou com cota esgotada.
+    """
+
+    def __init__(
+        self,
+        list_latency: float = 0.3,
+        response_latency: float = 0.0,
+        models: List[str] = None,
+        chunk_size: int = 8,
+        server_capacity: int = 8,
+        token_latency: float = 0.0
+    ):
+        """
+        Args:
+            list_latency: Tempo simulado de list_models (segundos)
+            response_latency: Tempo simulado de uma resposta completa
+            models: Nomes retornados por list_models
+            chunk_size: Caracteres por trecho no modo stream=True
+            server_capacity: Pedidos que o servidor simulado atende em paralelo
+                (os demais esperam, como num servidor real saturado)
+            token_latency: Tempo extra por token de prompt em send_message
+        """
+        self.list_latency = list_latency
+        self.response_latency = response_latency
+        self.models = models or ["models/gemini-pro", "models/gemini-1.5-flash"]
+        self.chunk_size = chunk_size
+        self.server_capacity = server_capacity
+        self.token_latency = token_latency
+        self._slots = None
+        self.fail_with = None
+
+        self.configure_calls = 0
+        self.list_calls = 0
+        self.send_calls = 0
+
+    def configure(self, api_key=None, **kwargs):
+        self.configure_calls += 1
+
+    def list_models(self):
+        self.list_calls += 1
+        time.sleep(self.list_latency)
+        return [_FakeModelInfo(name) for name in self.models]
+
+    def GenerativeModel(self, model_name: str, system_instruction: str = None):
+        return FakeGenerativeModel(self, model_name, system_instruction)
+
+    def server_slots(self) -> asyncio.Semaphore:
+        """Semáforo que limita o paralelismo do servidor simulado"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.server_capacity)
+        return self._slots
+
+    def reply(self, content) -> str:
+        """Texto determinístico usado como resposta do modelo"""
+        return f"Resposta simulada para: {content}. " + "Explicação detalhada do FinAI. " * 20
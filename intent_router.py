@@ -0,0 +1,205 @@
+"""
+FinAI Companion - Roteador de Intenções
+Reconhece perguntas numéricas e responde direto com a FinancialCalculator, sem chamar o LLM
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from data_handler import FinancialCalculator
+from utils import format_currency
+
+# Multiplicadores por extenso ("10 mil", "1,5 milhão", "50k")
+_MULTIPLICADORES = {"mil": 1e3, "k": 1e3, "milhao": 1e6, "milhoes": 1e6, "mi": 1e6}
+
+_NUMERO = r"\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?"
+# Prefixo "(Contexto: <último resultado>) " que o app põe antes da pergunta; o
+# resultado pode ter parênteses, ex. "PRIMEIRA PARCELA (SAC): R$ ..."
+_RE_CONTEXTO = re.compile(r"^\(contexto:(?:[^()]|\([^()]*\))*\)\s*")
+_RE_TAXA = re.compile(
+    rf"({_NUMERO})\s*%\s*(ao mes|a\.?\s?m\.?|mensa(?:l|is)|por mes|ao ano|a\.?\s?a\.?|anua(?:l|is)|por ano)?"
+)
+_RE_PRAZO = re.compile(rf"({_NUMERO})\s*(anos?|meses|mes)\b")
+_RE_APORTE = re.compile(
+    rf"(?:aportes?|depositos?)\s*(?:mensa(?:l|is)\s*)?(?:de\s*)?"
+    rf"(?:r\$\s*)?({_NUMERO})\s*(mil|k|milhao|milhoes|mi)?\b(?:\s*reais)?(?:\s*(?:por mes|ao mes|mensa(?:l|is)))?"
+    rf"|(?:r\$\s*)?({_NUMERO})\s*(mil|k|milhao|milhoes|mi)?\b(?:\s*reais)?\s*(?:por mes|ao mes|mensa(?:l|is))"
+)
+_RE_VALOR = re.compile(rf"(?:r\$\s*)?({_NUMERO})\s*(mil|k|milhao|milhoes|mi)?\b")
+
+# Perguntas com comparação/opinião continuam indo para o LLM
+_RE_COMPLEXA = re.compile(r"\bou\b|vale a pena|melhor|compar|diferenca|% do cdi|cdi|ipca|selic|inflacao")
+
+_INTENCOES = [
+    ("financiamento", re.compile(r"financ|parcela|emprestimo|prestacao")),
+    ("objetivo", re.compile(r"juntar|acumular|atingir|alcancar|chegar a|meta|objetivo|quanto (?:devo |preciso )?(?:guardar|poupar|investir) por mes")),
+    ("juros_compostos", re.compile(r"rend|juros compostos|quanto (?:vou ter|terei|fica|vira|teria)|aplic|invest")),
+]
+
+
+def _normalizar(texto: str) -> str:
+    # Minúsculas e sem acentos, mantendo pontuação numérica
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _pct(taxa: float) -> str:
+    return f"{taxa * 100:.2f}%".replace(".", ",")
+
+
+def _decimal(valor: float) -> str:
+    # Número sem zeros à direita, com vírgula decimal ("1,5")
+    return f"{valor:g}".replace(".", ",")
+
+
+def _numero(texto: str, multiplicador: Optional[str] = None) -> float:
+    """Converte número no formato brasileiro ("10.000,50", "0,9", "10 mil")"""
+    if "," in texto:
+        valor = float(texto.replace(".", "").replace(",", "."))
+    elif re.fullmatch(r"\d{1,3}(?:\.\d{3})+", texto):
+        valor = float(texto.replace(".", ""))
+    else:
+        valor = float(texto)
+    return valor * _MULTIPLICADORES.get(multiplicador or "", 1)
+
+
+class CalculatorRouter:
+    """
+    Extrai intenção e parâmetros com expressões regulares e chama a calculadora
+
+    Intenções reconhecidas:
+    - juros_compostos: "quanto rende 10 mil a 10% ao ano em 5 anos"
+    - financiamento: "parcela de um financiamento de 200 mil a 0,9% ao mês em 120 meses"
+    - objetivo: "quanto guardar por mês para juntar 100 mil em 10 anos a 8% ao ano"
+
+    Se algum parâmetro faltar, route() retorna None e a pergunta segue para o LLM.
+    """
+
+    def __init__(self, calculator: FinancialCalculator = None):
+        self.calculator = calculator or FinancialCalculator()
+        self.stats = {"requests": 0, "routed": 0, "extraction_failed": 0}
+
+    def extract(self, texto: str) -> Optional[Dict[str, Any]]:
+        """
+        Identifica intenção e parâmetros
+
+        Returns:
+            {"intent": ..., "params": {...}} ou None se não for uma pergunta de cálculo completa
+        """
+        texto = _RE_CONTEXTO.sub("", _normalizar(texto)).strip()
+        if _RE_COMPLEXA.search(texto):
+            return None
+
+        intencao = next((nome for nome, padrao in _INTENCOES if padrao.search(texto)), None)
+        if intencao is None:
+            return None
+
+        taxas, texto = self._extrair_taxas(texto)
+        prazos, texto = self._extrair_prazos(texto)
+        aportes, texto = self._extrair_aportes(texto)
+        valores = [_numero(m.group(1), m.group(2)) for m in _RE_VALOR.finditer(texto)]
+
+        if len(taxas) != 1 or len(prazos) != 1 or len(valores) != 1:
+            return None
+
+        taxa, unidade_taxa = taxas[0]
+        meses = prazos[0]
+
+        if intencao == "financiamento":
+            taxa_mensal = taxa if unidade_taxa != "ano" else (1 + taxa) ** (1 / 12) - 1
+            sistema = "SAC" if re.search(r"\bsac\b", texto) else "PRICE"
+            return {"intent": "financiamento", "params": {
+                "valor_financiado": valores[0], "taxa_mensal": taxa_mensal,
+                "prazo_meses": int(round(meses)), "sistema": sistema
+            }}
+
+        taxa_anual = taxa if unidade_taxa != "mes" else (1 + taxa) ** 12 - 1
+        if intencao == "objetivo":
+            if meses % 12:
+                return None
+            return {"intent": "objetivo", "params": {
+                "objetivo": valores[0], "taxa_anual": taxa_anual, "prazo_anos": int(meses // 12)
+            }}
+
+        return {"intent": "juros_compostos", "params": {
+            "principal": valores[0], "taxa": taxa_anual, "tempo": meses / 12,
+            "aporte_mensal": aportes[0] if aportes else 0
+        }}
+
+    def route(self, texto: str, calculator: FinancialCalculator = None) -> Optional[str]:
+        """Responde localmente quando possível; None indica que o LLM deve responder"""
+        self.stats["requests"] += 1
+        extracao = self.extract(texto)
+        if extracao is None:
+            self.stats["extraction_failed"] += 1
+            return None
+
+        try:
+            resposta = self._responder(calculator or self.calculator, extracao["intent"], extracao["params"])
+        except (ValueError, ZeroDivisionError, OverflowError):
+            self.stats["extraction_failed"] += 1
+            return None
+
+        self.stats["routed"] += 1
+        return resposta
+
+    def routed_fraction(self) -> float:
+        return self.stats["routed"] / self.stats["requests"] if self.stats["requests"] else 0.0
+
+    @staticmethod
+    def _extrair_taxas(texto: str) -> Tuple[List[Tuple[float, str]], str]:
+        taxas = []
+        for m in _RE_TAXA.finditer(texto):
+            unidade = m.group(2) or ""
+            if re.search(r"mes|mensa|a\.?\s?m", unidade):
+                unidade = "mes"
+            elif unidade:
+                unidade = "ano"
+            taxas.append((_numero(m.group(1)) / 100, unidade))
+        return taxas, _RE_TAXA.sub(" ", texto)
+
+    @staticmethod
+    def _extrair_prazos(texto: str) -> Tuple[List[float], str]:
+        prazos = [
+            _numero(m.group(1)) * (12 if m.group(2).startswith("ano") else 1)
+            for m in _RE_PRAZO.finditer(texto)
+        ]
+        return prazos, _RE_PRAZO.sub(" ", texto)
+
+    @staticmethod
+    def _extrair_aportes(texto: str) -> Tuple[List[float], str]:
+        aportes = []
+        for m in _RE_APORTE.finditer(texto):
+            numero, mult = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+            aportes.append(_numero(numero, mult))
+        return aportes, _RE_APORTE.sub(" ", texto)
+
+    @staticmethod
+    def _responder(calc: FinancialCalculator, intencao: str, p: Dict[str, Any]) -> str:
+        if intencao == "financiamento":
+            parcela = calc.calcular_financiamento(p["valor_financiado"], p["taxa_mensal"], p["prazo_meses"], p["sistema"])
+            rotulo = "Primeira parcela (SAC)" if p["sistema"] == "SAC" else "Parcela fixa (PRICE)"
+            return (
+                f"📊 Financiamento de **{format_currency(p['valor_financiado'])}** "
+                f"a **{_pct(p['taxa_mensal'])} ao mês** em **{p['prazo_meses']} meses**\n\n"
+                f"• {rotulo}: **{format_currency(parcela)}**"
+            )
+
+        if intencao == "objetivo":
+            r = calc.calcular_poupanca_objetivo(p["objetivo"], p["taxa_anual"], p["prazo_anos"])
+            return (
+                f"🎯 Para juntar **{format_currency(p['objetivo'])}** em **{p['prazo_anos']} anos** "
+                f"a **{_pct(p['taxa_anual'])} ao ano**:\n\n"
+                f"• Aporte mensal: **{format_currency(r['aporte_mensal'])}**\n"
+                f"• Total investido: **{format_currency(r['total_investido'])}**\n"
+                f"• Rendimento: **{format_currency(r['rendimento'])}**"
+            )
+
+        montante = calc.juros_compostos(p["principal"], p["taxa"], p["tempo"], p["aporte_mensal"])
+        aporte = f" com aportes de **{format_currency(p['aporte_mensal'])}/mês**" if p["aporte_mensal"] else ""
+        return (
+            f"📈 **{format_currency(p['principal'])}** a **{_pct(p['taxa'])} ao ano** "
+            f"por **{_decimal(p['tempo'])} anos**{aporte}:\n\n"
+            f"• Montante final: **{format_currency(montante)}**"
+        )
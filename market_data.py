@@ -0,0 +1,443 @@
+"""
+FinAI Companion - Dados de Mercado
+SELIC, CDI, IPCA e IBOVESPA para o painel e para a calculadora
+
+Os provedores são plugáveis (MarketDataProvider): Banco Central (SGS),
+arquivo JSON local e um provedor sintético determinístico para testes e
+benchmarks. O MarketDataService guarda cada série em memória (compartilhada
+pelas sessões do processo) e em disco (compartilhada entre processos), com
+validade (TTL) por série:
+- atualização incremental: o provedor só é consultado pelos pontos
+  posteriores ao último já salvo
+- stale-while-revalidate: uma série vencida é devolvida na hora e atualizada
+  numa thread em segundo plano; a interface nunca espera o provedor
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from storage import file_lock
+
+# Ponto de uma série: (data, valor como publicado)
+Point = Tuple[date, float]
+
+# selic/cdi: % a.a. | ipca: % no mês | ipca_12m: % em 12 meses | ibovespa: pontos
+SERIES = ("selic", "cdi", "ipca", "ipca_12m", "ibovespa")
+
+# Referência usada enquanto nenhum provedor respondeu (e em FINANCIAL_CONSTANTS)
+FALLBACK = {
+    "selic": 11.25,
+    "cdi": 11.15,
+    "ipca": 0.33,
+    "ipca_12m": 3.95,
+    "ibovespa": 134500.0,
+}
+
+# Validade de cada série em cache (segundos)
+DEFAULT_TTL = {
+    "selic": 6 * 3600,
+    "cdi": 6 * 3600,
+    "ipca": 24 * 3600,
+    "ipca_12m": 24 * 3600,
+    "ibovespa": 15 * 60,
+}
+
+# Espera mínima antes de tentar de novo um provedor que falhou
+RETRY_SECONDS = 60
+
+
+class MarketDataProvider:
+    """
+    Interface dos provedores de séries de mercado
+
+    fetch(series, since) devolve, em ordem de data, só os pontos posteriores
+    a `since` (todos os disponíveis se since for None).
+    """
+
+    name = "base"
+
+    def supports(self, series: str) -> bool:
+        return series in SERIES
+
+    def fetch(self, series: str, since: Optional[date] = None) -> List[Point]:
+        raise NotImplementedError
+
+
+class BCBProvider(MarketDataProvider):
+    """Séries do Sistema Gerenciador de Séries Temporais (SGS) do Banco Central"""
+
+    name = "bcb"
+    URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=json&dataInicial={inicio}&dataFinal={fim}"
+    # Meta Selic, CDI anualizado (base 252), IPCA mensal e IPCA em 12 meses
+    CODES = {"selic": 432, "cdi": 4389, "ipca": 433, "ipca_12m": 13522}
+
+    def __init__(self, timeout: float = 10.0, history_days: int = 730):
+        self.timeout = timeout
+        self.history_days = history_days
+
+    def supports(self, series: str) -> bool:
+        return series in self.CODES
+
+    def fetch(self, series: str, since: Optional[date] = None) -> List[Point]:
+        hoje = date.today()
+        inicio = since + timedelta(days=1) if since else hoje - timedelta(days=self.history_days)
+        if inicio > hoje:
+            return []
+        url = self.URL.format(
+            codigo=self.CODES[series], inicio=inicio.strftime("%d/%m/%Y"), fim=hoje.strftime("%d/%m/%Y")
+        )
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resposta:
+                dados = json.load(resposta)
+        except urllib.error.HTTPError as e:
+            # O SGS responde 404 quando não há pontos no intervalo
+            if e.code == 404:
+                return []
+            raise
+        pontos = [(datetime.strptime(d["data"], "%d/%m/%Y").date(), float(d["valor"])) for d in dados]
+        return [p for p in pontos if since is None or p[0] > since]
+
+
+class FileProvider(MarketDataProvider):
+    """Séries num JSON local: {"selic": [["2024-01-02", 11.75], ...], ...}"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, series: str, since: Optional[date] = None) -> List[Point]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        pontos = sorted((date.fromisoformat(d), float(v)) for d, v in dados.get(series, []))
+        return [p for p in pontos if since is None or p[0] > since]
+
+
+@functools.lru_cache(maxsize=32)
+def synthetic_history(series: str, start: date, end: date, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Histórico sintético determinístico de uma série entre start e end
+
+    Os sorteios são feitos dia a dia a partir de `start`: estender `end` só
+    acrescenta pontos, sem alterar os anteriores (como uma fonte real).
+
+    Returns:
+        (datas datetime64[D], valores) em ordem
+    """
+    dias = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    uteis = dias[np.is_busday(dias)]
+    if series in ("ipca", "ipca_12m"):
+        # Um ponto por mês, no primeiro dia (como o IBGE/SGS publica)
+        meses = np.arange(np.datetime64(start, "M"), np.datetime64(end, "M") + 1)
+        rng = np.random.default_rng([seed, 2])
+        choques = rng.standard_normal(len(meses) + 11)
+        # Inflação mensal com persistência (AR(1)) em torno de 0,38%
+        mensal = np.empty(len(choques))
+        nivel = 0.38
+        for i, choque in enumerate(choques):
+            nivel = 0.38 + 0.7 * (nivel - 0.38) + 0.12 * choque
+            mensal[i] = nivel
+        datas = meses.astype("datetime64[D]")
+        if series == "ipca":
+            return datas, np.round(mensal[11:], 2)
+        acumulado = np.exp(np.convolve(np.log1p(mensal / 100), np.ones(12), mode="valid")) - 1
+        return datas, np.round(acumulado * 100, 2)
+
+    # Um gerador por sequência de sorteios: o prefixo não depende de `end`
+    fluxo = 0 if series in ("selic", "cdi") else 1
+    sorteios = np.random.default_rng([seed, fluxo, 0]).random(len(uteis))
+    choques = np.random.default_rng([seed, fluxo, 1]).standard_normal(len(uteis))
+    if series in ("selic", "cdi"):
+        # Meta Selic muda em reuniões (~ a cada 32 dias úteis), em passos de 0,25/0,50
+        valores = np.empty(len(uteis))
+        meta = 17.0
+        for i in range(len(uteis)):
+            if i % 32 == 0 and i:
+                alvo = 10.0 - meta
+                passo = 0.25 * np.round(np.clip(alvo / 4 + 2 * choques[i], -2, 2))
+                meta = float(np.clip(meta + passo, 2.0, 26.0))
+            valores[i] = meta
+        if series == "cdi":
+            valores = valores - 0.10
+        return uteis, np.round(valores, 2)
+    # Ibovespa: passeio aleatório geométrico (retorno ~10% a.a., volatilidade ~25% a.a.)
+    retornos = 0.10 / 252 + 0.25 / np.sqrt(252) * choques
+    retornos[sorteios < 0.002] -= 0.05  # quedas bruscas ocasionais
+    return uteis, np.round(17000.0 * np.exp(np.cumsum(retornos)), 0)
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Séries sintéticas determinísticas (mesma semente, mesmos valores)
+
+    Para testes e benchmarks: `today` fixa a data "de hoje", `latency` simula
+    o tempo de resposta e `fail = True` simula o provedor fora do ar.
+    Conta chamadas (calls) e pontos entregues (points_served).
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed: int = 0, start: date = date(2000, 1, 3), today: date = None, latency: float = 0.0):
+        self.seed = seed
+        self.start = start
+        self.today = today
+        self.latency = latency
+        self.fail = False
+        self.calls = 0
+        self.points_served = 0
+
+    def fetch(self, series: str, since: Optional[date] = None) -> List[Point]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("provedor indisponível (simulado)")
+        datas, valores = synthetic_history(series, self.start, self.today or date.today(), self.seed)
+        inicio = 0 if since is None else int(np.searchsorted(datas, np.datetime64(since, "D"), side="right"))
+        pontos = list(zip(datas[inicio:].tolist(), valores[inicio:].tolist()))
+        self.points_served += len(pontos)
+        return pontos
+
+
+class _Entry:
+    """Estado em memória de uma série"""
+
+    __slots__ = ("data", "fetched_at", "refreshing", "retry_at", "error", "lock")
+
+    def __init__(self):
+        self.data = pd.Series(dtype=float)
+        self.fetched_at = 0.0
+        self.refreshing = False
+        self.retry_at = 0.0
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class MarketDataService:
+    """
+    Séries de mercado com cache em memória + disco e atualização incremental
+
+    get(series) nunca espera o provedor quando já há dados (mesmo vencidos):
+    devolve o que tem e agenda a atualização em segundo plano. Só a primeira
+    carga de uma série sem nada em cache bloqueia (ou, com block=False, volta
+    vazia e carrega em segundo plano).
+
+    As séries devolvidas (pd.Series indexada por data) são compartilhadas:
+    não devem ser modificadas por quem as recebe.
+    """
+
+    def __init__(
+        self,
+        provider: MarketDataProvider,
+        cache_dir: str = "./data/market",
+        ttl: Dict[str, float] = None,
+        clock=time.time,
+        background: bool = True,
+    ):
+        self.provider = provider
+        self.cache_dir = cache_dir
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.clock = clock
+        self.background = background
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "points_fetched": 0, "errors": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, series: str, ext: str = ".json") -> str:
+        return os.path.join(self.cache_dir, f"{self.provider.name}-{series}{ext}")
+
+    def _load_disk(self, series: str) -> Optional[Tuple[pd.Series, float]]:
+        try:
+            with open(self._path(series), "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return None
+        datas = pd.DatetimeIndex([d for d, _ in dados["points"]])
+        return pd.Series([v for _, v in dados["points"]], index=datas, dtype=float, name=series), dados["fetched_at"]
+
+    def _save_disk(self, series: str, entry: _Entry) -> None:
+        pontos = [[d.strftime("%Y-%m-%d"), v] for d, v in zip(entry.data.index, entry.data.tolist())]
+        tmp = self._path(series, ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"series": series, "fetched_at": entry.fetched_at, "points": pontos}, f)
+        os.replace(tmp, self._path(series))
+
+    def _entry(self, series: str) -> _Entry:
+        entry = self._entries.get(series)
+        if entry is not None:
+            return entry
+        if series not in SERIES:
+            raise KeyError(f"Série desconhecida: {series}")
+        with self._lock:
+            if series not in self._entries:
+                entry = _Entry()
+                disco = self._load_disk(series)
+                if disco is not None:
+                    entry.data, entry.fetched_at = disco
+                self._entries[series] = entry
+            return self._entries[series]
+
+    def _is_fresh(self, series: str, entry: _Entry) -> bool:
+        return self.clock() - entry.fetched_at < self.ttl[series]
+
+    def _refresh(self, series: str, entry: _Entry, force: bool = False) -> None:
+        with entry.lock:
+            # Outro processo pode ter atualizado o arquivo enquanto esperávamos
+            with file_lock(self._path(series, ".lock")):
+                disco = self._load_disk(series)
+                if disco is not None and disco[1] > entry.fetched_at:
+                    entry.data, entry.fetched_at = disco
+                if not force and self._is_fresh(series, entry) and len(entry.data):
+                    return
+                since = entry.data.index[-1].date() if len(entry.data) else None
+                try:
+                    novos = self.provider.fetch(series, since)
+                except Exception as e:
+                    entry.error = str(e)
+                    entry.retry_at = self.clock() + min(self.ttl[series], RETRY_SECONDS)
+                    self.stats["errors"] += 1
+                    return
+                if novos:
+                    adicionais = pd.Series(
+                        [v for _, v in novos], index=pd.DatetimeIndex([d for d, _ in novos]), dtype=float, name=series
+                    )
+                    # Nova Series (não altera a que os leitores já receberam)
+                    entry.data = pd.concat([entry.data, adicionais]) if len(entry.data) else adicionais
+                entry.fetched_at = self.clock()
+                entry.error = None
+                self.stats["refreshes"] += 1
+                self.stats["points_fetched"] += len(novos)
+                self._save_disk(series, entry)
+
+    def _refresh_in_background(self, series: str, entry: _Entry) -> None:
+        try:
+            self._refresh(series, entry)
+        finally:
+            entry.refreshing = False
+
+    def _schedule(self, series: str, entry: _Entry) -> None:
+        with self._lock:
+            if entry.refreshing or self.clock() < entry.retry_at:
+                return
+            entry.refreshing = True
+        if not self.background:
+            self._refresh_in_background(series, entry)
+            return
+        thread = threading.Thread(target=self._refresh_in_background, args=(series, entry), daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+
+    def get(self, series: str, block: bool = True) -> pd.Series:
+        """
+        Série inteira em cache (pd.Series indexada por data)
+
+        Args:
+            series: Nome da série (ver SERIES)
+            block: Se não houver nada em cache, espera a primeira carga;
+                com False devolve a série vazia e carrega em segundo plano
+        """
+        entry = self._entry(series)
+        if self.provider.supports(series):
+            if not len(entry.data):
+                self.stats["misses"] += 1
+                if block and self.clock() >= entry.retry_at:
+                    self._refresh(series, entry)
+                else:
+                    self._schedule(series, entry)
+            elif self._is_fresh(series, entry):
+                self.stats["hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                self._schedule(series, entry)
+        return entry.data
+
+    def latest(self, series: str, block: bool = True) -> Tuple[Optional[date], float]:
+        """Último ponto da série: (data, valor), ou (None, FALLBACK) sem dados"""
+        dados = self.get(series, block)
+        if not len(dados):
+            return None, FALLBACK[series]
+        return dados.index[-1].date(), float(dados.iloc[-1])
+
+    def current_rates(self, block: bool = True) -> Dict[str, float]:
+        """Taxas anuais atuais em decimal: selic, cdi e ipca (acumulado em 12 meses)"""
+        return {
+            "selic": self.latest("selic", block)[1] / 100,
+            "cdi": self.latest("cdi", block)[1] / 100,
+            "ipca": self.latest("ipca_12m", block)[1] / 100,
+        }
+
+    def snapshot(self, block: bool = False) -> Dict[str, Dict]:
+        """
+        Último valor e variação de cada série, para o painel
+
+        A variação de taxas é em pontos percentuais contra o último valor
+        diferente (ex.: última decisão do Copom); a do Ibovespa é percentual
+        contra o pregão anterior. "stale" indica que o valor veio do cache
+        vencido ou do FALLBACK; "supported" é False nas séries que o provedor
+        não oferece (ficam sempre no FALLBACK, como valor de referência).
+        """
+        resumo = {}
+        for series in SERIES:
+            dados = self.get(series, block)
+            entry = self._entries[series]
+            suportada = self.provider.supports(series)
+            if not len(dados):
+                resumo[series] = {"valor": FALLBACK[series], "data": None, "variacao": None, "stale": True, "supported": suportada}
+                continue
+            valor = float(dados.iloc[-1])
+            if series == "ibovespa":
+                variacao = (valor / float(dados.iloc[-2]) - 1) * 100 if len(dados) > 1 else None
+            else:
+                diferentes = dados[dados != valor]
+                variacao = valor - float(diferentes.iloc[-1]) if len(diferentes) else 0.0
+            resumo[series] = {
+                "valor": valor,
+                "data": dados.index[-1].date(),
+                "variacao": variacao,
+                "stale": not self._is_fresh(series, entry),
+                "supported": suportada,
+            }
+        return resumo
+
+    def refresh(self, series: str = None) -> None:
+        """Atualiza já (bloqueando) uma série ou todas as suportadas"""
+        for nome in ([series] if series else SERIES):
+            if self.provider.supports(nome):
+                self._refresh(nome, self._entry(nome), force=True)
+
+    def errors(self) -> Dict[str, str]:
+        """Último erro do provedor por série (só as que falharam)"""
+        return {nome: e.error for nome, e in self._entries.items() if e.error}
+
+    def wait(self, timeout: float = None) -> None:
+        """Espera as atualizações em segundo plano (testes e benchmarks)"""
+        for thread in list(self._threads):
+            thread.join(timeout)
+
+
+def make_provider(kind: str = None) -> MarketDataProvider:
+    """
+    Provedor escolhido por FINAI_MARKET_PROVIDER: "bcb" (padrão), "synthetic"
+    ou "file:<caminho.json>"
+    """
+    kind = kind or os.getenv("FINAI_MARKET_PROVIDER", "bcb")
+    if kind == "bcb":
+        return BCBProvider()
+    if kind == "synthetic":
+        return SyntheticProvider()
+    if kind.startswith("file:"):
+        return FileProvider(kind[len("file:"):])
+    raise ValueError(f"Provedor de mercado desconhecido: {kind}")
+
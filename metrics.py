@@ -0,0 +1,333 @@
+"""
+FinAI Companion - Métricas
+Contadores e histogramas de latência dos caminhos quentes (modelo, calculadora,
+armazenamento, PDFs, reruns do app)
+
+Custo baixo por medição (um perf_counter, uma busca binária nos limites do
+histograma e um lock), e quase nenhum com as métricas desligadas
+(FINAI_METRICS=0 ou set_enabled(False)). Exportação em formato texto do
+Prometheus ou JSON, inclusive por um endpoint HTTP local (start_http_server).
+"""
+
+import bisect
+import functools
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+ENABLED = os.getenv("FINAI_METRICS", "1") != "0"
+
+# Limites dos histogramas de latência (segundos)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Para operações de microssegundos (cálculos, buscas em cache, armazenamento)
+FAST_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def set_enabled(flag: bool) -> None:
+    """Liga/desliga todas as medições (as já registradas são mantidas)"""
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def enabled() -> bool:
+    return ENABLED
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if ENABLED:
+            with self._lock:
+                self.value += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0.0
+
+
+class _Timer:
+    """Mede o bloco `with` e registra no histograma ao sair (inclusive com exceção)"""
+
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "_HistogramValue"):
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._histogram.observe(perf_counter() - self._start)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        if ENABLED:
+            i = bisect.bisect_left(self.bounds, value)
+            with self._lock:
+                self.counts[i] += 1
+                self.sum += value
+                self.count += 1
+
+    def time(self):
+        return _Timer(self) if ENABLED else _NOOP
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa do quantil q (0 a 1) por interpolação dentro do bucket"""
+        if not self.count:
+            return None
+        alvo = q * self.count
+        acumulado = 0
+        for i, n in enumerate(self.counts):
+            if acumulado + n >= alvo and n:
+                inferior = self.bounds[i - 1] if i else 0.0
+                superior = self.bounds[i] if i < len(self.bounds) else inferior
+                return inferior + (superior - inferior) * (alvo - acumulado) / n
+            acumulado += n
+        return self.bounds[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """Série da métrica para estes rótulos (guarde o retorno em caminhos quentes)"""
+        chave = tuple(str(labels[nome]) for nome in self.labelnames)
+        filho = self._children.get(chave)
+        if filho is None:
+            with self._lock:
+                filho = self._children.setdefault(chave, self._new_child())
+        return filho
+
+    def samples(self):
+        return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Registry:
+    """Métricas do processo, por nome (criar de novo devolve a mesma)"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Métrica {name} já registrada com outro tipo ou rótulos")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def reset(self) -> None:
+        """Zera os valores (métricas e séries continuam registradas)"""
+        for metric in self.metrics():
+            for _, filho in metric.samples():
+                filho.reset()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+
+def timed(metric: Histogram, **labels):
+    """
+    Decorador: registra a duração de cada chamada em `metric`
+
+    A série dos rótulos é resolvida uma vez, na decoração; desligado, o custo
+    é o de um if.
+    """
+    filho = metric.labels(**labels)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            inicio = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                filho.observe(perf_counter() - inicio)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labelnames, valores, extra: Tuple[str, str] = None) -> str:
+    pares = list(zip(labelnames, valores)) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    escapados = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pares)
+    return "{" + ",".join(f'{nome}="{valor}"' for (nome, _), valor in zip(pares, escapados)) + "}"
+
+
+def _format_number(valor: float) -> str:
+    return "+Inf" if valor == float("inf") else repr(float(valor))
+
+
+def render_prometheus(registry: Registry = REGISTRY) -> str:
+    """Todas as métricas no formato texto de exposição do Prometheus (0.0.4)"""
+    linhas = []
+    for metric in registry.metrics():
+        linhas.append(f"# HELP {metric.name} {metric.help}")
+        linhas.append(f"# TYPE {metric.name} {metric.kind}")
+        for valores, filho in metric.samples():
+            if metric.kind == "counter":
+                linhas.append(f"{metric.name}{_format_labels(metric.labelnames, valores)} {_format_number(filho.value)}")
+                continue
+            with filho._lock:
+                counts, soma, total = list(filho.counts), filho.sum, filho.count
+            acumulado = 0
+            for limite, n in zip(filho.bounds + (float("inf"),), counts):
+                acumulado += n
+                rotulos = _format_labels(metric.labelnames, valores, ("le", _format_number(limite)))
+                linhas.append(f"{metric.name}_bucket{rotulos} {acumulado}")
+            rotulos = _format_labels(metric.labelnames, valores)
+            linhas.append(f"{metric.name}_sum{rotulos} {_format_number(soma)}")
+            linhas.append(f"{metric.name}_count{rotulos} {total}")
+    return "\n".join(linhas) + "\n"
+
+
+def to_json(registry: Registry = REGISTRY) -> Dict[str, Dict]:
+    """Métricas como dicionário (histogramas com count, sum, p50, p95 e p99)"""
+    saida = {}
+    for metric in registry.metrics():
+        series = []
+        for valores, filho in metric.samples():
+            item = {"labels": dict(zip(metric.labelnames, valores))}
+            if metric.kind == "counter":
+                item["value"] = filho.value
+            else:
+                item.update(
+                    count=filho.count, sum=filho.sum,
+                    p50=filho.quantile(0.5), p95=filho.quantile(0.95), p99=filho.quantile(0.99),
+                )
+            series.append(item)
+        saida[metric.name] = {"type": metric.kind, "help": metric.help, "series": series}
+    return saida
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        caminho = self.path.split("?", 1)[0]
+        if caminho == "/metrics":
+            corpo, tipo = render_prometheus(self.registry).encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif caminho == "/metrics.json":
+            corpo, tipo = json.dumps(to_json(self.registry), ensure_ascii=False).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        # Sem uma linha no console a cada coleta
+        pass
+
+
+def start_http_server(port: int = None, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serve /metrics (Prometheus) e /metrics.json numa thread em segundo plano
+
+    Por padrão só na interface local; port=0 escolhe uma porta livre
+    (server.server_address[1]).
+    """
+    port = int(os.getenv("FINAI_METRICS_PORT", "9464")) if port is None else port
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="finai-metrics").start()
+    return server
@@ -0,0 +1,640 @@
+"""
+FinAI Companion - Relatórios PDF
+Exportação da conversa (e da tabela de amortização) e relatórios de simulação em PDF
+
+O documento de cada conversa fica em cache já diagramado: quando chegam
+mensagens novas só elas são acrescentadas ao layout, e os bytes finais são
+reaproveitados enquanto a versão da conversa (hash encadeado das mensagens)
+não muda.
+
+Relatórios de simulação partem de um documento base em cache por processo
+(fonte já carregada) e podem ser gerados em lote num pool de processos.
+"""
+
+import copy
+import functools
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fontTools import subset as ftsubset
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fontes TrueType com acentos, travessões e aspas curvas (embutidas no PDF).
+# A primeira acompanha o repositório (assets/fonts, licença em LICENSE-DejaVu.txt)
+FONT_CANDIDATES = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "fonts", "DejaVuSans.ttf"),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+)
+
+# Tempo de geração por tipo de PDF e resultado do cache da conversa
+PDF_SECONDS = metrics.histogram("finai_pdf_seconds", "Geração de PDFs", ("kind",))
+PDF_BUILDS = metrics.counter("finai_pdf_builds_total", "PDFs da conversa por resultado do cache", ("result",))
+
+# Sem fonte Unicode: equivalentes latin-1 em vez de descartar o caractere
+_LATIN1_FALLBACK = str.maketrans({
+    "\u2014": "-", "\u2013": "-", "\u2012": "-", "\u2212": "-",
+    "\u2018": "'", "\u2019": "'", "\u201a": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"',
+    "\u2022": "-", "\u2026": "...", "\u00a0": " ", "\u2192": "->",
+})
+
+_SCHEDULE_WIDTHS = (15, 35, 35, 35, 35, 35)
+_SCHEDULE_TITLES = ("MES", "PARCELA", "JUROS", "AMORTIZACAO", "EXTRA", "SALDO")
+
+
+_warned_latin1 = False
+
+
+def find_unicode_font() -> Optional[str]:
+    """Caminho da primeira fonte TTF disponível (variável FINAI_PDF_FONT tem prioridade)"""
+    global _warned_latin1
+    preferida = os.getenv("FINAI_PDF_FONT")
+    for caminho in ((preferida,) if preferida else ()) + FONT_CANDIDATES:
+        if os.path.isfile(caminho):
+            return caminho
+    if not _warned_latin1:
+        _warned_latin1 = True
+        logger.warning(
+            "Nenhuma fonte TTF encontrada (assets/fonts/DejaVuSans.ttf ausente?): os PDFs usarão "
+            "Helvetica em latin-1 e caracteres fora dele (€, emojis, ...) serão aproximados ou descartados"
+        )
+    return None
+
+
+@functools.lru_cache(maxsize=8)
+def _font_codepoints(font_path: str) -> frozenset:
+    # Caracteres com glifo na fonte (tabela cmap)
+    return frozenset(ttLib.TTFont(font_path, lazy=True).getBestCmap())
+
+
+def strip_missing_glyphs(text: str, font_path: str) -> str:
+    """
+    Remove os caracteres sem glifo na fonte
+
+    O projeto não embute fonte de emojis: os 📊/🎯/📈 das respostas da
+    calculadora (e qualquer outro caractere fora da fonte) saem do PDF de
+    propósito, em vez de virarem glifos vazios e avisos do FPDF.
+    """
+    cobertos = _font_codepoints(font_path)
+    if all(ord(c) in cobertos or c in "\n\r\t" for c in text):
+        return text
+    return "".join(c for c in text if ord(c) in cobertos or c in "\n\r\t")
+
+
+def to_latin1(text: str) -> str:
+    """Aproxima o texto em latin-1 (fonte Helvetica): acentos ficam, travessão vira hífen"""
+    text = text.translate(_LATIN1_FALLBACK)
+    try:
+        text.encode("latin-1")
+        return text
+    except UnicodeEncodeError:
+        pass
+    saida = []
+    for c in text:
+        if ord(c) < 256:
+            saida.append(c)
+        else:
+            # "ő" -> "o"; emojis e símbolos sem equivalente somem
+            base = unicodedata.normalize("NFKD", c)
+            saida.append("".join(b for b in base if ord(b) < 256 and not unicodedata.combining(b)))
+    return "".join(saida)
+
+
+def _message_bytes(message: Dict[str, Any]) -> bytes:
+    return f"{message['role']}\x00{message['content']}\x01".encode("utf-8")
+
+
+def conversation_version(messages: Iterable[Dict[str, Any]]) -> str:
+    """Hash encadeado das mensagens: muda com qualquer mensagem nova ou editada"""
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(_message_bytes(message))
+    return digest.hexdigest()
+
+
+class ConversationPDF:
+    """
+    Documento PDF de uma conversa, diagramado de forma incremental
+
+    add_messages acrescenta ao layout já existente; output() gera os bytes a
+    partir de uma cópia, então o documento continua aberto para as próximas
+    mensagens.
+
+    Args:
+        font_path: Fonte TTF embutida (None procura uma com find_unicode_font;
+            "" força Helvetica com o texto aproximado em latin-1)
+    """
+
+    def __init__(self, font_path: Optional[str] = None):
+        self.pdf = FPDF()
+        self.font_path = font_path if font_path is not None else find_unicode_font()
+        if self.font_path:
+            self.pdf.add_font("FinAI", fname=self.font_path)
+            self.family = "FinAI"
+        else:
+            self.family = "Helvetica"
+        self.count = 0
+        self.version = conversation_version(())
+        self.pdf.add_page()
+        self.pdf.set_font(self.family, size=16)
+        self.pdf.cell(0, 10, text="FinAI CORE - Relatório de Consultoria", align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.pdf.ln(10)
+
+    def text(self, value: str) -> str:
+        return strip_missing_glyphs(value, self.font_path) if self.font_path else to_latin1(value)
+
+    def add_messages(self, messages: Iterable[Dict[str, Any]]) -> None:
+        self.pdf.set_font(self.family, size=12)
+        for msg in messages:
+            role = "USUÁRIO" if msg["role"] == "user" else "FINAI"
+            self.pdf.multi_cell(0, 10, text=self.text(f"{role}: {msg['content']}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self.pdf.ln(5)
+            self.count += 1
+
+    def output(self, tabela=None) -> bytes:
+        # FPDF.output fecha o documento: gera a partir de uma cópia
+        pdf = _copy_document(self.pdf)
+        _detach_fonts(pdf)
+        if tabela is not None:
+            add_schedule_pages(pdf, tabela, self.family, self.text)
+        return bytes(pdf.output())
+
+
+def _copy_document(pdf: FPDF) -> FPDF:
+    """
+    deepcopy do documento sem copiar as tabelas de métricas das fontes
+
+    cw e glyph_ids de uma fonte TTF (milhares de entradas) só são lidos depois
+    do add_font: compartilhá-los entre as cópias tira a maior parte do custo.
+    """
+    memo = {}
+    for font in pdf.fonts.values():
+        for tabela in (getattr(font, "cw", None), getattr(font, "glyph_ids", None)):
+            if tabela is not None:
+                memo[id(tabela)] = tabela
+    return copy.deepcopy(pdf, memo)
+
+
+def _detach_fonts(pdf: FPDF) -> None:
+    """
+    Dá à cópia fontes TrueType próprias
+
+    O deepcopy do FPDF compartilha o TTFont com o original, e o output()
+    recorta (subset) a fonte no lugar: sem isto a segunda geração do mesmo
+    documento falharia.
+    """
+    for font in pdf.fonts.values():
+        if getattr(font, "ttffile", None) and hasattr(font, "ttfont"):
+            font.ttfont = ttLib.TTFont(
+                io.BytesIO(_font_bytes(str(font.ttffile))), recalcTimestamp=False,
+                fontNumber=font.collection_font_number, lazy=True
+            )
+            font.ttfont.flavor = None
+
+
+@functools.lru_cache(maxsize=8)
+def _font_bytes(path: str) -> bytes:
+    # Arquivo da fonte lido uma vez por processo (cada cópia abre um TTFont em memória)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def add_schedule_pages(pdf: FPDF, tabela, family: str = "Helvetica", text=to_latin1) -> None:
+    """Páginas da tabela de amortização, com as linhas geradas sob demanda pela tabela"""
+    pdf.add_page()
+    pdf.set_font(family, size=12)
+    pdf.cell(0, 10, text=text(f"Tabela de Amortização - {tabela.sistema}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font(family, size=8)
+    for largura, titulo in zip(_SCHEDULE_WIDTHS, _SCHEDULE_TITLES):
+        pdf.cell(largura, 6, text=titulo, border=1, align="C")
+    pdf.ln()
+    for linha in tabela.linhas():
+        valores = (linha["mes"], linha["parcela"], linha["juros"], linha["amortizacao"], linha["amortizacao_extra"], linha["saldo_devedor"])
+        for largura, valor in zip(_SCHEDULE_WIDTHS, valores):
+            pdf.cell(largura, 5, text=f"{valor:,.2f}" if isinstance(valor, float) else str(valor), border=1, align="R")
+        pdf.ln()
+
+
+class _Entry:
+    __slots__ = ("document", "version", "tabela", "data", "lock")
+
+    def __init__(self):
+        self.document: Optional[ConversationPDF] = None
+        self.version = None
+        self.tabela = None
+        self.data: Optional[bytes] = None
+        self.lock = threading.Lock()
+
+
+class PDFReportCache:
+    """
+    Cache de relatórios PDF por conversa (LRU)
+
+    build() recebe a conversa inteira, na ordem cronológica:
+    - mesma versão e mesma tabela: devolve os bytes já gerados
+    - conversa só cresceu: diagrama apenas as mensagens novas
+    - histórico diferente (editado/apagado): refaz o documento
+    """
+
+    def __init__(self, max_entries: int = 32, font_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.font_path = font_path
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "incremental": 0, "rebuilds": 0, "messages_laid_out": 0}
+
+    def _entry(self, key: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.pop(key, None) or _Entry()
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    @metrics.timed(PDF_SECONDS, kind="conversa")
+    def build(self, key: str, messages: Iterable[Dict[str, Any]], tabela=None) -> bytes:
+        """
+        Gera (ou reaproveita) o PDF da conversa `key`
+
+        Args:
+            key: Identificador da conversa (ex.: user_id)
+            messages: Mensagens em ordem cronológica (lista ou iterador)
+            tabela: TabelaAmortizacao anexada ao final (opcional)
+        """
+        entry = self._entry(key)
+        with entry.lock:
+            document = entry.document
+            digest = hashlib.sha1()
+            prefix_ok = document is not None and document.count == 0
+            lidas: List[Dict[str, Any]] = []
+            for message in messages:
+                lidas.append(message)
+                digest.update(_message_bytes(message))
+                if document is not None and len(lidas) == document.count:
+                    prefix_ok = digest.hexdigest() == document.version
+            version = digest.hexdigest()
+
+            if entry.data is not None and version == entry.version and tabela is entry.tabela:
+                self.stats["hits"] += 1
+                PDF_BUILDS.labels(result="hit").inc()
+                return entry.data
+
+            if prefix_ok and len(lidas) >= document.count:
+                novas = lidas[document.count:]
+                self.stats["incremental"] += 1
+                PDF_BUILDS.labels(result="incremental").inc()
+            else:
+                document = ConversationPDF(self.font_path)
+                novas = lidas
+                self.stats["rebuilds"] += 1
+                PDF_BUILDS.labels(result="rebuild").inc()
+            document.add_messages(novas)
+            document.version = version
+            self.stats["messages_laid_out"] += len(novas)
+
+            entry.document, entry.version, entry.tabela = document, version, tabela
+            entry.data = document.output(tabela)
+            return entry.data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# ----------------------------------------------------------------------
+# Relatórios de simulação (FinancialCalculator.dados_relatorio)
+# Tabelas e gráficos desenhados direto no PDF (vetoriais, sem imagens)
+# ----------------------------------------------------------------------
+
+_CORES = ((0, 150, 170), (0, 170, 100), (230, 120, 0), (120, 90, 200), (200, 60, 80), (90, 90, 90))
+_MAX_PONTOS = 240
+
+# Caracteres dos relatórios de simulação: latim com acentos, pontuação, moedas e setas
+_REPORT_UNICODES = (
+    list(range(0x20, 0x300)) + list(range(0x2000, 0x2070)) + list(range(0x20A0, 0x20D0))
+    + list(range(0x2100, 0x2160)) + list(range(0x2190, 0x2200)) + [0x2212]
+)
+
+_TEMPLATES: Dict[str, FPDF] = {}
+_TEMPLATES_LOCK = threading.Lock()
+_CALCULATOR = None
+
+
+def _new_report_document(font_path: str) -> FPDF:
+    """Documento com fonte carregada e cabeçalho: a parte comum a todo relatório"""
+    pdf = FPDF()
+    family = "Helvetica"
+    if font_path:
+        pdf.add_font("FinAI", fname=font_path)
+        family = "FinAI"
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+    pdf.set_font(family, size=16)
+    pdf.set_text_color(0, 110, 130)
+    pdf.cell(0, 10, text="FinAI CORE - Relatório de Simulação", align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_draw_color(*_CORES[0])
+    pdf.set_line_width(0.5)
+    pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + pdf.epw, pdf.get_y())
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(4)
+    return pdf
+
+
+def _report_font(font_path: str) -> str:
+    """
+    Versão reduzida da fonte (só _REPORT_UNICODES), gerada uma vez e guardada
+    no diretório temporário para todos os processos
+
+    Com algumas centenas de glifos em vez de milhares, o recorte que o FPDF
+    faz da fonte a cada output() fica bem mais barato.
+    """
+    info = os.stat(font_path)
+    chave = hashlib.sha1(f"{os.path.abspath(font_path)}:{info.st_size}:{info.st_mtime_ns}".encode()).hexdigest()[:16]
+    destino = os.path.join(tempfile.gettempdir(), "finai_fonts", f"{chave}.ttf")
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fonte = ttLib.TTFont(font_path)
+        opcoes = ftsubset.Options(notdef_outline=True, recommended_glyphs=True)
+        opcoes.drop_tables += ["FFTM"]
+        subsetter = ftsubset.Subsetter(opcoes)
+        subsetter.populate(unicodes=_REPORT_UNICODES)
+        subsetter.subset(fonte)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        fonte.save(temporario)
+        os.replace(temporario, destino)
+    return destino
+
+
+def report_template(font_path: str) -> FPDF:
+    """
+    Documento base compartilhado no processo, por fonte
+
+    Cada relatório começa de uma cópia dele: a fonte (já reduzida por
+    _report_font) é lida e medida uma vez só, não a cada relatório.
+    """
+    with _TEMPLATES_LOCK:
+        template = _TEMPLATES.get(font_path)
+        if template is None:
+            template = _TEMPLATES[font_path] = _new_report_document(_report_font(font_path) if font_path else font_path)
+        return template
+
+
+def _compact(valor: float) -> str:
+    """Rótulo curto para eixos ("1.2 mi", "350 mil")"""
+    if abs(valor) >= 1e6:
+        return f"{valor / 1e6:.1f} mi"
+    if abs(valor) >= 1e3:
+        return f"{valor / 1e3:.0f} mil"
+    return f"{valor:.0f}"
+
+
+def _section(pdf: FPDF, titulo: str, family: str, text) -> None:
+    pdf.ln(2)
+    pdf.set_font(family, size=12)
+    pdf.set_text_color(0, 110, 130)
+    pdf.cell(0, 8, text=text(titulo), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_text_color(0, 0, 0)
+
+
+def _key_values(pdf: FPDF, itens, family: str, text) -> None:
+    from data_handler import formatar_valor
+
+    pdf.set_font(family, size=10)
+    for rotulo, valor, formato in itens:
+        pdf.cell(70, 6, text=text(rotulo))
+        pdf.cell(0, 6, text=text(formatar_valor(valor, formato)), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def _draw_chart(pdf: FPDF, grafico: Dict[str, Any], family: str, text, altura: float = 70) -> None:
+    """Gráfico de linhas ou barras desenhado com as primitivas do FPDF"""
+    if pdf.will_page_break(altura + 16):
+        pdf.add_page()
+    _section(pdf, grafico["titulo"], family, text)
+
+    series = {rotulo: np.asarray(valores, dtype=np.float64) for rotulo, valores in grafico["series"].items()}
+    todos = np.concatenate(list(series.values()))
+    vmin, vmax = min(0.0, float(todos.min())), float(todos.max())
+    if vmax <= vmin:
+        vmax = vmin + 1
+
+    x0, y0 = pdf.l_margin + 20, pdf.get_y() + 2
+    largura, h = pdf.epw - 22, altura - 18
+
+    def py(valor):
+        return y0 + h - (valor - vmin) / (vmax - vmin) * h
+
+    # Grade horizontal com rótulos do eixo y
+    pdf.set_font(family, size=7)
+    pdf.set_line_width(0.1)
+    pdf.set_draw_color(200, 200, 200)
+    for k in range(5):
+        valor = vmin + (vmax - vmin) * k / 4
+        pdf.line(x0, py(valor), x0 + largura, py(valor))
+        pdf.set_xy(pdf.l_margin, py(valor) - 2)
+        pdf.cell(19, 4, text=_compact(valor), align="R")
+
+    x = grafico["x"]
+    if grafico["tipo"] == "barras":
+        n = len(x)
+        passo = largura / n
+        for k, rotulo in enumerate(x):
+            for s, valores in enumerate(series.values()):
+                largura_barra = passo * 0.6 / len(series)
+                bx = x0 + k * passo + passo * 0.2 + s * largura_barra
+                pdf.set_fill_color(*_CORES[s % len(_CORES)])
+                pdf.rect(bx, py(valores[k]), largura_barra, py(vmin) - py(valores[k]), style="F")
+            pdf.set_xy(x0 + k * passo, y0 + h + 1)
+            pdf.cell(passo, 4, text=text(str(rotulo))[:22], align="C")
+    else:
+        n = len(x)
+        indices = np.unique(np.linspace(0, n - 1, min(n, _MAX_PONTOS)).astype(np.int64))
+        px = x0 + indices / max(n - 1, 1) * largura
+        pdf.set_line_width(0.6)
+        for s, valores in enumerate(series.values()):
+            pdf.set_draw_color(*_CORES[s % len(_CORES)])
+            pdf.polyline(list(zip(px.tolist(), py(valores[indices]).tolist())))
+        for k in (0, n // 2, n - 1):
+            pdf.set_xy(x0 + k / max(n - 1, 1) * largura - 10, y0 + h + 1)
+            pdf.cell(20, 4, text=str(x[k]), align="C")
+
+    # Legenda
+    pdf.set_xy(x0, y0 + h + 6)
+    for s, rotulo in enumerate(series):
+        pdf.set_fill_color(*_CORES[s % len(_CORES)])
+        pdf.rect(pdf.get_x(), pdf.get_y() + 1, 3, 3, style="F")
+        pdf.set_x(pdf.get_x() + 4)
+        pdf.cell(pdf.get_string_width(text(rotulo)) + 6, 5, text=text(rotulo))
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_line_width(0.2)
+    pdf.set_xy(pdf.l_margin, y0 + altura - 6)
+
+
+def _draw_table(pdf: FPDF, tabela, colunas, family: str, text) -> None:
+    """Tabela com cabeçalho repetido a cada página; linhas geradas sob demanda"""
+    from data_handler import formatar_valor
+
+    larguras = [pdf.epw / len(colunas)] * len(colunas)
+    if colunas[0][2] == "texto" and len(colunas) > 4:
+        # Primeira coluna (mês/ano) mais estreita
+        larguras = [15] + [(pdf.epw - 15) / (len(colunas) - 1)] * (len(colunas) - 1)
+
+    def cabecalho():
+        pdf.set_font(family, size=8)
+        pdf.set_fill_color(230, 245, 248)
+        for largura, (_, rotulo, _) in zip(larguras, colunas):
+            pdf.cell(largura, 6, text=text(rotulo), border=1, align="C", fill=True)
+        pdf.ln()
+
+    if hasattr(tabela, "linhas"):
+        linhas = tabela.linhas()
+    else:
+        nomes = [coluna for coluna, _, _ in colunas]
+        linhas = (dict(zip(nomes, valores)) for valores in tabela[nomes].itertuples(index=False, name=None))
+
+    cabecalho()
+    for linha in linhas:
+        if pdf.will_page_break(5):
+            pdf.add_page()
+            cabecalho()
+        for largura, (coluna, _, formato) in zip(larguras, colunas):
+            valor = linha[coluna]
+            conteudo = text(formatar_valor(valor, formato)) if formato != "texto" else text(str(valor))
+            pdf.cell(largura, 5, text=conteudo, border=1, align="L" if formato == "texto" and not isinstance(valor, (int, np.integer)) else "R")
+        pdf.ln()
+
+
+@metrics.timed(PDF_SECONDS, kind="simulacao")
+def render_simulation_report(
+    dados: Dict[str, Any], font_path: Optional[str] = None, use_template: bool = True, cliente: str = None
+) -> bytes:
+    """
+    PDF de um relatório de simulação: parâmetros, resultado, gráfico e tabela
+
+    Args:
+        dados: Saída de FinancialCalculator.dados_relatorio
+        font_path: Fonte TTF (None procura com find_unicode_font; "" = Helvetica)
+        use_template: Parte da cópia do documento base em cache, com a fonte
+            reduzida às faixas latinas (False monta do zero com a fonte inteira)
+        cliente: Nome/identificador impresso no cabeçalho
+    """
+    font_path = (find_unicode_font() or "") if font_path is None else font_path
+    pdf = _copy_document(report_template(font_path)) if use_template else _new_report_document(font_path)
+    family = "FinAI" if font_path else "Helvetica"
+    # O documento base usa a fonte reduzida: o filtro segue a fonte carregada
+    fonte = (_report_font(font_path) if use_template else font_path) if font_path else ""
+
+    def text(valor: str) -> str:
+        return strip_missing_glyphs(valor, fonte) if fonte else to_latin1(valor)
+
+    pdf.set_font(family, size=14)
+    pdf.cell(0, 8, text=text(dados["titulo"]), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    if cliente:
+        pdf.set_font(family, size=9)
+        pdf.cell(0, 5, text=text(f"Cliente: {cliente}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    _section(pdf, "Parâmetros", family, text)
+    _key_values(pdf, dados["parametros"], family, text)
+    _section(pdf, "Resultado", family, text)
+    _key_values(pdf, dados["resumo"], family, text)
+    if dados.get("grafico"):
+        _draw_chart(pdf, dados["grafico"], family, text)
+    if dados.get("tabela") is not None:
+        _section(pdf, "Tabela", family, text)
+        _draw_table(pdf, dados["tabela"], dados["colunas"], family, text)
+    if dados.get("dica"):
+        pdf.ln(3)
+        pdf.set_font(family, size=9)
+        pdf.multi_cell(0, 5, text=text(f"Dica: {dados['dica']}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    if use_template:
+        _detach_fonts(pdf)
+    return bytes(pdf.output())
+
+
+def _worker_calculator():
+    # Uma calculadora por processo do pool
+    global _CALCULATOR
+    if _CALCULATOR is None:
+        from data_handler import FinancialCalculator
+        _CALCULATOR = FinancialCalculator()
+    return _CALCULATOR
+
+
+def render_client_report(pedido: Dict[str, Any], calculator=None, font_path: Optional[str] = None,
+                         use_template: bool = True) -> bytes:
+    """PDF de um pedido {"id", "tipo", "parametros", "cliente" (opcional)}"""
+    dados = (calculator or _worker_calculator()).dados_relatorio(pedido["tipo"], pedido["parametros"])
+    return render_simulation_report(dados, font_path, use_template, pedido.get("cliente"))
+
+
+def _render_chunk(pedidos: List[Dict[str, Any]], output_dir: str, font_path: str, use_template: bool) -> Tuple[int, int]:
+    total = 0
+    for pedido in pedidos:
+        data = render_client_report(pedido, font_path=font_path, use_template=use_template)
+        with open(os.path.join(output_dir, f"{os.path.basename(str(pedido['id']))}.pdf"), "wb") as f:
+            f.write(data)
+        total += len(data)
+    return len(pedidos), total
+
+
+def generate_reports(
+    pedidos: Iterable[Dict[str, Any]],
+    output_dir: str,
+    workers: int = 1,
+    chunk_size: int = 25,
+    font_path: Optional[str] = None,
+    use_template: bool = True
+) -> Dict[str, int]:
+    """
+    Gera em lote os relatórios de muitos clientes, um arquivo <id>.pdf por pedido
+
+    Os pedidos vão em blocos de `chunk_size` para um pool de processos; cada
+    processo mantém seu documento base e sua calculadora entre os blocos.
+
+    Args:
+        pedidos: Dicionários {"id", "tipo", "parametros", "cliente" (opcional)}
+        output_dir: Diretório de saída
+        workers: Processos usados (1 = no próprio processo)
+        chunk_size: Pedidos por tarefa enviada ao pool
+        font_path: Fonte TTF (None procura com find_unicode_font; "" = Helvetica)
+        use_template: Usa o documento base em cache
+
+    Returns:
+        {"relatorios": quantidade gerada, "bytes": tamanho total}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    font_path = (find_unicode_font() or "") if font_path is None else font_path
+    pedidos = list(pedidos)
+    blocos = [pedidos[i:i + chunk_size] for i in range(0, len(pedidos), chunk_size)]
+
+    if workers <= 1:
+        resultados = [_render_chunk(bloco, output_dir, font_path, use_template) for bloco in blocos]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(
+                _render_chunk, blocos, [output_dir] * len(blocos), [font_path] * len(blocos), [use_template] * len(blocos)
+            ))
+
+    return {"relatorios": sum(n for n, _ in resultados), "bytes": sum(b for _, b in resultados)}
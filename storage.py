@@ -0,0 +1,848 @@
+"""
+FinAI Companion - Armazenamento de Conversas
+Backends do ConversationManager: log append-only em segmentos (padrão) e SQLite,
+e o armazenamento de perfis com versão por registro
+
+Os dois expõem a mesma interface: append, append_many, replace, delete,
+load(user_id, limit, before), page, iter_messages, last_message, count,
+users e close. Cada mensagem tem um timestamp (ts) estritamente crescente
+por usuário, usado como cursor da paginação.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Ponteiro para um registro: (segmento, offset, tamanho em bytes)
+Pointer = Tuple[int, int, int]
+
+_NONE = (-1, -1, -1)
+
+# Abaixo disso não vale a pena compactar, mesmo com muitos bytes mortos
+_MIN_COMPACT_BYTES = 1024 * 1024
+
+# Menor passo entre timestamps de mensagens do mesmo usuário
+_TS_STEP = 1e-6
+
+
+def _next_ts(last_ts: float) -> float:
+    return round(max(time.time(), last_ts + _TS_STEP), 6)
+
+
+def _sequence_ts(n: int, last_ts: float = 0.0) -> List[float]:
+    # Timestamps crescentes para um lote de n mensagens gravadas de uma vez
+    start = _next_ts(last_ts)
+    return [round(start + i * _TS_STEP, 6) for i in range(n)]
+
+
+def _page(records: Iterator[Tuple[float, Any]], limit: int) -> Tuple[List[Any], Optional[float]]:
+    # Recebe (ts, mensagem) do mais novo para o mais antigo
+    page, cursor, page_ts = [], None, None
+    for ts, message in records:
+        if len(page) == limit:
+            cursor = page_ts
+            break
+        page.append(message)
+        page_ts = ts
+    page.reverse()
+    return page, cursor
+
+
+class ConversationLog:
+    """
+    Conversas de todos os usuários em segmentos append-only (estilo Bitcask)
+
+    Cada mensagem é uma linha no segmento ativo:
+
+        M <tab> user_id <tab> n <tab> ts <tab> seg_ant <tab> off_ant <tab> len_ant <tab> json
+
+    O ponteiro para o registro anterior do mesmo usuário forma uma lista
+    encadeada de trás para frente, e o índice em memória guarda só a cabeça de
+    cada usuário (memória O(usuários), não O(mensagens)). Por isso:
+    - append: uma escrita no fim do arquivo, O(1)
+    - últimas N mensagens: N leituras diretas (seek + read), sem ler o resto
+    - abrir: uma varredura sequencial dos segmentos para refazer o índice
+
+    Outros registros: L (lista [[ts, mensagem], ...] que substitui o histórico),
+    D (remoção) e C (cabeçalho de segmento compactado).
+
+    Compactação: os segmentos fechados são reescritos num único segmento com
+    um registro L por usuário vivo (arquivo temporário + fsync + os.replace),
+    sem bloquear os appends. Um processo é dono do diretório; dentro dele a
+    classe é segura entre threads (uma sessão Streamlit por thread).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = True,
+        auto_compact: bool = True,
+        compact_interval: float = 60.0,
+        compact_threshold: float = 0.5
+    ):
+        """
+        Args:
+            directory: Diretório dos segmentos
+            segment_bytes: Tamanho a partir do qual o segmento ativo é fechado
+            fsync: Se True, cada escrita só retorna depois de chegar ao disco
+            auto_compact: Inicia a thread de compactação em segundo plano
+            compact_interval: Intervalo entre verificações da compactação (segundos)
+            compact_threshold: Fração de bytes mortos que dispara a compactação
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._heads = {}  # user_id -> [ponteiro da cabeça, nº de mensagens, bytes vivos, último ts]
+        self._base = {}  # user_id -> registro L do segmento compactado
+        self._compacted = -1  # id do segmento compactado (os anteriores foram removidos)
+        self._fds = {}  # segmento -> descritor para leitura
+        self._dead_bytes = 0
+        self._total_bytes = 0
+        self.stats = {"appends": 0, "compactions": 0, "recovered_bytes": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if auto_compact:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), name="finai-log-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg-{segment:06d}.log")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[4:10]) for name in os.listdir(self.directory)
+            if name.startswith("seg-") and name.endswith(".log")
+        )
+
+    def _fd(self, segment: int) -> int:
+        fd = self._fds.get(segment)
+        if fd is None:
+            fd = self._fds[segment] = os.open(self._path(segment), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        return fd
+
+    def _read(self, pointer: Pointer) -> List[str]:
+        # Chamado sempre sob self._lock: seek + read no descritor compartilhado
+        # (os.pread não existe no Windows)
+        segment, offset, length = pointer
+        fd = self._fd(segment)
+        os.lseek(fd, offset, os.SEEK_SET)
+        line = os.read(fd, length).decode("utf-8")
+        return line.rstrip("\n").split("\t", 7)
+
+    def _sync_directory(self) -> None:
+        # Garante que os.replace/criação de arquivos sobrevivam a uma queda.
+        # No Windows não se abre diretório com os.open (e o NTFS já grava os metadados)
+        if os.name == "nt":
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _open_active(self, segment: int) -> None:
+        self._active = segment
+        self._writer = open(self._path(segment), "ab")
+        self._active_size = self._writer.tell()
+
+    # ------------------------------------------------------------------
+    # Recuperação (abertura)
+    # ------------------------------------------------------------------
+
+    def _recover(self) -> None:
+        """Refaz o índice varrendo os segmentos; descarta restos de compactação e linhas incompletas"""
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))
+
+        segments = self._segments()
+        for segment in reversed(segments):
+            with open(self._path(segment), "rb") as f:
+                first = f.readline()
+            if first.startswith(b"C\t"):
+                # Queda entre o os.replace e a remoção dos segmentos antigos
+                self._compacted = segment
+                for old in segments:
+                    if old < segment:
+                        os.remove(self._path(old))
+                segments = [s for s in segments if s >= segment]
+                break
+
+        for segment in segments:
+            self._scan(segment)
+
+        self._open_active(segments[-1] if segments else 0)
+
+    def _scan(self, segment: int) -> None:
+        offset = 0
+        with open(self._path(segment), "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Escrita interrompida no meio: descarta o final
+                    self.stats["recovered_bytes"] += len(raw)
+                    f.close()
+                    os.truncate(self._path(segment), offset)
+                    break
+                self._apply(raw.decode("utf-8").split("\t", 7), (segment, offset, len(raw)))
+                offset += len(raw)
+        self._total_bytes += offset
+
+    def _apply(self, fields: List[str], pointer: Pointer) -> None:
+        kind, user_id, n, ts = fields[0], fields[1], int(fields[2]), float(fields[3])
+        length = pointer[2]
+
+        if kind == "M":
+            entry = self._heads.get(user_id)
+            if entry is None:
+                self._heads[user_id] = [pointer, n, length, ts]
+            else:
+                entry[0] = pointer
+                entry[1] += n
+                entry[2] += length
+                entry[3] = ts
+        elif kind == "L":
+            self._drop(user_id)
+            self._heads[user_id] = [pointer, n, length, ts]
+            if pointer[0] == self._compacted:
+                self._base[user_id] = pointer
+        elif kind == "D":
+            self._drop(user_id)
+            self._dead_bytes += length
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._heads.pop(user_id, None)
+        self._base.pop(user_id, None)
+        if entry is not None:
+            self._dead_bytes += entry[2]
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def _write(self, kind: str, user_id: str, n: int, ts: float, payload: str, previous: Pointer = _NONE) -> Pointer:
+        if "\t" in user_id or "\n" in user_id:
+            raise ValueError("user_id não pode conter tabulação ou quebra de linha")
+
+        line = f"{kind}\t{user_id}\t{n}\t{ts:.6f}\t{previous[0]}\t{previous[1]}\t{previous[2]}\t{payload}\n"
+        data = line.encode("utf-8")
+
+        with self._lock:
+            if self._active_size >= self.segment_bytes:
+                self._roll()
+            pointer = (self._active, self._active_size, len(data))
+            self._writer.write(data)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            self._active_size += len(data)
+            self._total_bytes += len(data)
+            self._apply([kind, user_id, str(n), ts], pointer)
+            return pointer
+
+    def _roll(self, step: int = 1) -> None:
+        self._writer.close()
+        self._open_active(self._active + step)
+        if self.fsync:
+            self._sync_directory()
+
+    def append(self, user_id: str, message: Dict[str, Any]) -> None:
+        """Acrescenta uma mensagem ao histórico do usuário (O(1))"""
+        payload = json.dumps(message, ensure_ascii=False)
+        with self._lock:
+            entry = self._heads.get(user_id)
+            if entry is None:
+                self._write("M", user_id, 1, _next_ts(0.0), payload)
+            else:
+                self._write("M", user_id, 1, _next_ts(entry[3]), payload, entry[0])
+            self.stats["appends"] += 1
+
+    def append_many(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        for message in messages:
+            self.append(user_id, message)
+
+    def replace(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Substitui o histórico inteiro do usuário (um registro L)"""
+        with self._lock:
+            entry = self._heads.get(user_id)
+            stamps = _sequence_ts(len(messages), entry[3] if entry else 0.0)
+            payload = json.dumps([[ts, m] for ts, m in zip(stamps, messages)], ensure_ascii=False)
+            self._write("L", user_id, len(messages), stamps[-1] if stamps else _next_ts(0.0), payload)
+
+    def delete(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id not in self._heads:
+                return False
+            self._write("D", user_id, 0, time.time(), "null")
+            return True
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def _resolve(self, user_id: str, pointer: Pointer) -> Pointer:
+        # Ponteiros para segmentos já removidos pela compactação passam a apontar
+        # para o registro L do usuário no segmento compactado (ou para o fim, se
+        # o usuário foi removido)
+        if 0 <= pointer[0] < self._compacted:
+            return self._base.get(user_id, _NONE)
+        return pointer
+
+    def _records(self, user_id: str, pointer: Pointer = None) -> Iterator[Tuple[float, Any]]:
+        """
+        (ts, mensagem) do mais novo para o mais antigo, lendo sob demanda
+
+        Se a compactação roda com o iterador aberto, o ponteiro passa para o
+        registro L, que traz o histórico inteiro: só as mensagens com ts anterior
+        à última entregue seguem (os ts são crescentes por usuário). Um histórico
+        substituído nesse meio tempo tem ts maiores e não aparece.
+        """
+        if pointer is None:
+            with self._lock:
+                entry = self._heads.get(user_id)
+                pointer = entry[0] if entry else _NONE
+
+        last_ts = None
+        while pointer[0] >= 0:
+            with self._lock:
+                pointer = self._resolve(user_id, pointer)
+                if pointer[0] < 0:
+                    return
+                fields = self._read(pointer)
+            if fields[0] == "L":
+                for ts, message in reversed(json.loads(fields[7])):
+                    if last_ts is None or ts < last_ts:
+                        yield ts, message
+                return
+            last_ts = float(fields[3])
+            yield last_ts, json.loads(fields[7])
+            pointer = (int(fields[4]), int(fields[5]), int(fields[6]))
+
+    def iter_messages(
+        self, user_id: str, newest_first: bool = True, before: float = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre o histórico do usuário sob demanda
+
+        Com newest_first=True (padrão) lê do fim para o começo: pegar as
+        últimas N mensagens custa N leituras, independente do tamanho do histórico.
+
+        Args:
+            before: Só mensagens com ts anterior a este (cursor de paginação)
+        """
+        if not newest_first:
+            yield from reversed(list(self.iter_messages(user_id, True, before)))
+            return
+        for ts, message in self._records(user_id):
+            if before is None or ts < before:
+                yield message
+
+    def page(self, user_id: str, limit: int, before: float = None) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """
+        Uma página do histórico, em ordem cronológica
+
+        Returns:
+            (mensagens, cursor): passe o cursor como `before` para a página
+            anterior; None quando não há mais mensagens
+        """
+        records = ((ts, m) for ts, m in self._records(user_id) if before is None or ts < before)
+        return _page(records, limit)
+
+    def load(self, user_id: str, limit: int = None, before: float = None) -> List[Dict[str, Any]]:
+        """Histórico em ordem cronológica (só as últimas `limit` mensagens, se informado)"""
+        messages = []
+        for message in self.iter_messages(user_id, before=before):
+            if limit is not None and len(messages) >= limit:
+                break
+            messages.append(message)
+        messages.reverse()
+        return messages
+
+    def last_message(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return next(self.iter_messages(user_id), None)
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            entry = self._heads.get(user_id)
+            return entry[1] if entry else 0
+
+    def users(self) -> List[str]:
+        with self._lock:
+            return list(self._heads)
+
+    def __len__(self) -> int:
+        return len(self._heads)
+
+    # ------------------------------------------------------------------
+    # Compactação
+    # ------------------------------------------------------------------
+
+    def dead_fraction(self) -> float:
+        return self._dead_bytes / self._total_bytes if self._total_bytes else 0.0
+
+    def compact(self) -> bool:
+        """
+        Reescreve os segmentos fechados com um registro L por usuário vivo
+
+        Os appends continuam no novo segmento ativo enquanto a compactação roda;
+        o lock só é usado para fechar o segmento e para a troca final do índice.
+        O segmento compactado recebe o id logo após o último fechado (o ativo
+        pula um número), então nenhum ponteiro antigo coincide com os novos.
+
+        Returns:
+            True se compactou
+        """
+        with self._compact_lock:
+            with self._lock:
+                sealed = self._active
+                compacted = sealed + 1
+                self._roll(step=2)
+                snapshot = {user_id: entry[0] for user_id, entry in self._heads.items()}
+
+            tmp_path = self._path(compacted) + ".tmp"
+            base, written = {}, 0
+            with open(tmp_path, "wb") as out:
+                header = f"C\t\t0\t{time.time():.6f}\t-1\t-1\t-1\t{json.dumps({'covers': sealed})}\n".encode("utf-8")
+                out.write(header)
+                written += len(header)
+                for user_id, head in snapshot.items():
+                    records = list(self._records(user_id, head))
+                    records.reverse()
+                    last_ts = records[-1][0] if records else time.time()
+                    line = f"L\t{user_id}\t{len(records)}\t{last_ts:.6f}\t-1\t-1\t-1\t" \
+                           f"{json.dumps(records, ensure_ascii=False)}\n"
+                    data = line.encode("utf-8")
+                    out.write(data)
+                    base[user_id] = (compacted, written, len(data))
+                    written += len(data)
+                out.flush()
+                os.fsync(out.fileno())
+
+            with self._lock:
+                os.replace(tmp_path, self._path(compacted))
+                self._sync_directory()
+                for segment in [s for s in self._fds if s <= sealed]:
+                    os.close(self._fds.pop(segment))
+                old_segments = [s for s in self._segments() if s < compacted]
+
+                self._compacted = compacted
+                self._base = {}
+                live = 0
+                for user_id, entry in self._heads.items():
+                    if entry[0][0] <= sealed:
+                        entry[0] = entry_base = base[user_id]
+                        entry[2] = entry_base[2]
+                        self._base[user_id] = entry_base
+                    elif user_id in snapshot:
+                        # Escreveu durante a compactação: conta os registros novos e,
+                        # se o histórico ainda continua no snapshot, o registro L
+                        after, continues = self._bytes_after(entry[0], sealed)
+                        entry[2] = after
+                        if continues:
+                            entry[2] += base[user_id][2]
+                            self._base[user_id] = base[user_id]
+                    live += entry[2]
+                self._total_bytes = written + self._active_size
+                self._dead_bytes = max(self._total_bytes - live, 0)
+                self.stats["compactions"] += 1
+
+            for segment in old_segments:
+                os.remove(self._path(segment))
+            return True
+
+    def _bytes_after(self, pointer: Pointer, sealed: int) -> Tuple[int, bool]:
+        # Bytes dos registros posteriores ao snapshot e se a cadeia continua nele
+        total = 0
+        while pointer[0] > sealed:
+            fields = self._read(pointer)
+            total += pointer[2]
+            pointer = (int(fields[4]), int(fields[5]), int(fields[6]))
+        return total, pointer[0] >= 0
+
+    def _compact_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            if self.dead_fraction() >= self.compact_threshold and self._dead_bytes >= _MIN_COMPACT_BYTES:
+                try:
+                    self.compact()
+                except Exception:
+                    # Qualquer falha (disco, registro corrompido) é registrada e a
+                    # thread segue: a próxima verificação tenta de novo
+                    logger.exception("Erro na compactação do log de conversas")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+        with self._lock:
+            self._writer.close()
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+
+
+class _ConnectionPool:
+    """
+    Pool de conexões SQLite compartilhado entre threads
+
+    O Streamlit roda cada sessão numa thread; em vez de uma conexão por thread
+    (que vazaria a cada sessão nova), as threads pegam uma conexão livre do pool
+    e a devolvem ao fim da operação.
+    """
+
+    def __init__(self, path: str, size: int = 8):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SQLiteConversationStore:
+    """
+    Conversas numa base SQLite (WAL), uma linha por mensagem
+
+    O índice (user_id, ts) permite ler as últimas N mensagens de um usuário,
+    ou uma página anterior a um cursor, sem tocar no resto da base. Com WAL as
+    leituras não esperam as escritas; as escritas em lote (append_many,
+    append_batch, replace) usam uma transação só.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_user_ts ON messages (user_id, ts);
+    """
+
+    def __init__(self, path: str, pool_size: int = 8, page_size: int = 100):
+        """
+        Args:
+            path: Arquivo da base
+            pool_size: Máximo de conexões abertas
+            page_size: Mensagens lidas por consulta em iter_messages
+        """
+        self.path = path
+        self.page_size = page_size
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._pool = _ConnectionPool(path, pool_size)
+        with self._pool.connection() as conn:
+            conn.executescript(self._SCHEMA)
+
+    @staticmethod
+    def _last_ts(conn: sqlite3.Connection, user_id: str) -> float:
+        row = conn.execute("SELECT MAX(ts) FROM messages WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] or 0.0
+
+    def append(self, user_id: str, message: Dict[str, Any]) -> None:
+        self.append_batch([(user_id, message)])
+
+    def append_many(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        self.append_batch([(user_id, message) for message in messages])
+
+    def append_batch(self, items: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Grava várias mensagens (de um ou mais usuários) numa única transação"""
+        if not items:
+            return
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            last = {}
+            rows = []
+            for user_id, message in items:
+                if user_id not in last:
+                    last[user_id] = self._last_ts(conn, user_id)
+                last[user_id] = _next_ts(last[user_id])
+                rows.append((user_id, last[user_id], json.dumps(message, ensure_ascii=False)))
+            conn.executemany("INSERT INTO messages (user_id, ts, data) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+
+    def replace(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stamps = _sequence_ts(len(messages), self._last_ts(conn, user_id))
+            conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO messages (user_id, ts, data) VALUES (?, ?, ?)",
+                [(user_id, ts, json.dumps(m, ensure_ascii=False)) for ts, m in zip(stamps, messages)]
+            )
+            conn.execute("COMMIT")
+
+    def delete(self, user_id: str) -> bool:
+        with self._pool.connection() as conn:
+            return conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def _records(self, user_id: str, before: float = None) -> Iterator[Tuple[float, Any]]:
+        """(ts, mensagem) do mais novo para o mais antigo, em consultas de page_size linhas"""
+        cursor = float("inf") if before is None else before
+        while True:
+            with self._pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT ts, data FROM messages WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+                    (user_id, cursor, self.page_size)
+                ).fetchall()
+            for ts, data in rows:
+                yield ts, json.loads(data)
+            if len(rows) < self.page_size:
+                return
+            cursor = rows[-1][0]
+
+    def iter_messages(
+        self, user_id: str, newest_first: bool = True, before: float = None
+    ) -> Iterator[Dict[str, Any]]:
+        if not newest_first:
+            yield from reversed(list(self.iter_messages(user_id, True, before)))
+            return
+        for _, message in self._records(user_id, before):
+            yield message
+
+    def page(self, user_id: str, limit: int, before: float = None) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT ts, data FROM messages WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+                (user_id, float("inf") if before is None else before, limit + 1)
+            ).fetchall()
+        return _page(((ts, json.loads(data)) for ts, data in rows), limit)
+
+    def load(self, user_id: str, limit: int = None, before: float = None) -> List[Dict[str, Any]]:
+        """Histórico em ordem cronológica; com limit, uma única consulta pelo índice"""
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT data FROM messages WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+                (user_id, float("inf") if before is None else before, -1 if limit is None else limit)
+            ).fetchall()
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+    def last_message(self, user_id: str) -> Optional[Dict[str, Any]]:
+        messages = self.load(user_id, limit=1)
+        return messages[0] if messages else None
+
+    def count(self, user_id: str) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def users(self) -> List[str]:
+        with self._pool.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM messages")]
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(DISTINCT user_id) FROM messages").fetchone()[0]
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Lock exclusivo entre processos (fcntl no Unix, msvcrt no Windows)"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class VersionConflict(Exception):
+    """O registro mudou desde a versão lida (compare-and-swap recusado)"""
+
+    def __init__(self, user_id: str, expected: int, current: int):
+        super().__init__(f"Perfil {user_id}: versão esperada {expected}, atual {current}")
+        self.user_id = user_id
+        self.expected = expected
+        self.current = current
+
+
+class ProfileStore:
+    """
+    Perfis de usuário, um arquivo por usuário, com versão por registro
+
+    - Leitura sem lock: a escrita é atômica (arquivo temporário + fsync + os.replace)
+    - Escrita sob lock exclusivo do usuário, válido entre processos (arquivo .lock)
+    - compare_and_swap só grava se a versão ainda for a lida
+    - update altera só os campos informados, sem tocar nos outros usuários
+    - toda gravação renova data["last_updated"] (menos a remoção, que deixa data vazio)
+
+    Formato: {"version": n, "last_updated": "...", "data": {...}}
+    """
+
+    def __init__(self, directory: str, fsync: bool = True):
+        """
+        Args:
+            directory: Diretório dos perfis
+            fsync: Se True, cada escrita só retorna depois de chegar ao disco
+        """
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, user_id: str, suffix: str = ".json") -> str:
+        # IDs fora do padrão (com / ou ..) viram hash, nunca caminhos
+        safe = user_id if user_id.replace("-", "").replace("_", "").isalnum() else \
+            hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, safe + suffix)
+
+    def _read(self, user_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(user_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "data": {}}
+
+    def _write(self, user_id: str, version: int, data: Dict[str, Any]) -> None:
+        path = self._path(user_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        last_updated = datetime.now().isoformat()
+        if data:
+            # Como no formato antigo, o próprio perfil traz a data da última gravação
+            data = dict(data, last_updated=last_updated)
+        record = {"version": version, "last_updated": last_updated, "data": data}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def get(self, user_id: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Returns:
+            (dados, versão); versão 0 indica perfil inexistente
+        """
+        record = self._read(user_id)
+        return record["data"], record["version"]
+
+    def compare_and_swap(self, user_id: str, expected_version: int, data: Dict[str, Any]) -> int:
+        """
+        Grava `data` se a versão atual ainda for `expected_version`
+
+        Returns:
+            Nova versão
+
+        Raises:
+            VersionConflict: se outro processo/sessão gravou antes
+        """
+        with file_lock(self._path(user_id, ".lock")):
+            current = self._read(user_id)["version"]
+            if current != expected_version:
+                raise VersionConflict(user_id, expected_version, current)
+            self._write(user_id, current + 1, data)
+            return current + 1
+
+    def update(
+        self,
+        user_id: str,
+        fields: Dict[str, Any],
+        remove: List[str] = (),
+        expected_version: int = None
+    ) -> int:
+        """
+        Atualização parcial: só os campos informados mudam
+
+        Args:
+            fields: Campos a gravar
+            remove: Campos a remover
+            expected_version: Se informado, funciona como compare-and-swap
+
+        Returns:
+            Nova versão
+        """
+        with file_lock(self._path(user_id, ".lock")):
+            record = self._read(user_id)
+            if expected_version is not None and record["version"] != expected_version:
+                raise VersionConflict(user_id, expected_version, record["version"])
+            data = record["data"]
+            data.update(fields)
+            for name in remove:
+                data.pop(name, None)
+            self._write(user_id, record["version"] + 1, data)
+            return record["version"] + 1
+
+    def put(self, user_id: str, data: Dict[str, Any]) -> int:
+        """Substitui o perfil inteiro (sem checar versão)"""
+        with file_lock(self._path(user_id, ".lock")):
+            version = self._read(user_id)["version"] + 1
+            self._write(user_id, version, data)
+            return version
+
+    def delete(self, user_id: str) -> bool:
+        """Remove o perfil; a versão continua a crescer (evita ABA em compare_and_swap)"""
+        with file_lock(self._path(user_id, ".lock")):
+            record = self._read(user_id)
+            if not record["data"]:
+                return False
+            self._write(user_id, record["version"] + 1, {})
+            return True
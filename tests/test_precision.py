@@ -0,0 +1,124 @@
+"""
+FinAI Companion - Testes de Precisão
+Propriedade: em qualquer entrada, a precisão "exata" (Decimal) e a padrão
+(float) diferem no máximo 1 centavo (ou 1e-12 relativo, em montantes muito
+grandes), em todo método da FinancialCalculator que tem modo exato
+"""
+
+import numpy as np
+import pandas as pd
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from data_handler import FinancialCalculator
+
+RAPIDA = FinancialCalculator()
+EXATA = FinancialCalculator(precisao="exata")
+
+# Mesmas faixas dos cenários de benchmarks._cenarios_calculadora
+valores = st.integers(100_000, 50_000_000).map(lambda centavos: centavos / 100)
+taxas_anuais = st.floats(0.02, 0.15)
+taxas_mensais = st.floats(0.003, 0.02)
+anos = st.integers(1, 40)
+meses = st.integers(12, 420)
+dias = st.integers(1, 1_500)
+aportes = st.sampled_from([0.0, 100.0, 500.0, 1_500.0])
+sistemas = st.sampled_from(["PRICE", "SAC"])
+produtos = st.lists(
+    st.fixed_dictionaries({"taxa": taxas_anuais, "isento": st.booleans()}), min_size=1, max_size=4
+).map(lambda opcoes: [dict(opcao, nome=f"produto {i}") for i, opcao in enumerate(opcoes)])
+
+
+def _valores(resultado):
+    """Achata o retorno (escalar, dict, array ou DataFrame) em floats, sem colunas de texto"""
+    if isinstance(resultado, pd.DataFrame):
+        colunas = [col for col in resultado.columns if not isinstance(resultado[col].iloc[0], str)]
+        return [float(v) for v in resultado[colunas].to_numpy().ravel()]
+    if isinstance(resultado, dict):
+        return [float(v) for v in resultado.values()]
+    if isinstance(resultado, np.ndarray):
+        return [float(v) for v in resultado.ravel()]
+    return [float(resultado)]
+
+
+def assert_concordam(chamada):
+    """Roda `chamada` nas duas precisões e compara valor a valor"""
+    rapido, exato = _valores(chamada(RAPIDA)), _valores(chamada(EXATA))
+    assert len(rapido) == len(exato)
+    for v_float, v_exato in zip(rapido, exato):
+        assert abs(v_exato - v_float) <= max(0.01, 1e-12 * abs(v_float)) + 1e-9, (v_float, v_exato)
+
+
+def test_comparacao_exata_regressao():
+    # Misturava Decimal e float no modo exato (TypeError)
+    resultado = EXATA.comparar_investimentos(10000, 3, [{"nome": "CDB", "taxa": 0.11}])
+    assert resultado["Montante Final"].iloc[0] > 10000
+
+
+@given(valores, taxas_anuais, anos, aportes)
+def test_juros_compostos(principal, taxa, tempo, aporte):
+    assert_concordam(lambda calc: calc.juros_compostos(principal, taxa, tempo, aporte))
+
+
+@given(valores, taxas_mensais, meses, sistemas)
+def test_calcular_financiamento(valor, taxa, prazo, sistema):
+    assert_concordam(lambda calc: calc.calcular_financiamento(valor, taxa, prazo, sistema))
+
+
+@given(valores, taxas_anuais, anos)
+def test_calcular_poupanca_objetivo(objetivo, taxa, prazo):
+    assert_concordam(lambda calc: calc.calcular_poupanca_objetivo(objetivo, taxa, prazo))
+
+
+@given(valores, dias)
+def test_calcular_imposto_renda_investimento(rendimento, prazo):
+    assert_concordam(lambda calc: calc.calcular_imposto_renda_investimento(rendimento, prazo))
+
+
+@given(valores, dias)
+def test_imposto_exato_fecha(rendimento, prazo):
+    # No modo exato bruto - imposto é sempre o líquido, centavo a centavo
+    r = EXATA.calcular_imposto_renda_investimento(rendimento, prazo)
+    assert r["rendimento_bruto"] - r["imposto"] == r["rendimento_liquido"]
+
+
+@settings(max_examples=50)
+@given(valores, anos, produtos)
+def test_comparar_investimentos(valor, prazo, opcoes):
+    assert_concordam(lambda calc: calc.comparar_investimentos(valor, prazo, opcoes))
+
+
+@settings(max_examples=50)
+@given(valores, st.lists(anos, min_size=1, max_size=5), produtos, aportes)
+def test_comparar_investimentos_lote(valor, prazos, opcoes, aporte):
+    assert_concordam(lambda calc: calc.comparar_investimentos_lote(valor, prazos, opcoes, aporte))
+
+
+def _lote(elementos, tamanho=20):
+    return st.lists(st.tuples(*elementos), min_size=1, max_size=tamanho).map(
+        lambda linhas: [np.array(coluna) for coluna in zip(*linhas)]
+    )
+
+
+@settings(max_examples=50)
+@given(_lote([valores, taxas_anuais, anos, aportes]))
+def test_juros_compostos_lote(colunas):
+    assert_concordam(lambda calc: calc.juros_compostos_lote(*colunas))
+
+
+@settings(max_examples=50)
+@given(_lote([valores, taxas_mensais, meses, sistemas]))
+def test_calcular_financiamento_lote(colunas):
+    assert_concordam(lambda calc: calc.calcular_financiamento_lote(*colunas))
+
+
+@settings(max_examples=50)
+@given(_lote([valores, taxas_anuais, anos]))
+def test_calcular_poupanca_objetivo_lote(colunas):
+    assert_concordam(lambda calc: calc.calcular_poupanca_objetivo_lote(*colunas))
+
+
+@settings(max_examples=50)
+@given(_lote([valores, dias]))
+def test_calcular_imposto_renda_investimento_lote(colunas):
+    assert_concordam(lambda calc: calc.calcular_imposto_renda_investimento_lote(*colunas))
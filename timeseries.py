@@ -0,0 +1,374 @@
+"""
+FinAI Companion - Histórico de Taxas
+Armazenamento colunar das séries históricas (CDI, SELIC, IPCA, IBOVESPA)
+
+Cada série é um conjunto de arquivos .npy abertos com memory map: datas
+(datetime64[D], ordenadas), valores e, para taxas, os fatores acumulados.
+Abrir uma série de décadas não lê nada além do cabeçalho, uma busca por
+intervalo é uma busca binária (O(log n)) e "CDI acumulado entre duas datas"
+é a razão entre dois fatores acumulados (O(1) depois da busca).
+
+Convenção dos fatores: F[0] = 1 e F[k] = produto dos fatores dos k primeiros
+pontos. Um valor aplicado em d0 e resgatado em d1 rende as taxas dos pontos
+com data em [d0, d1): F[pos(d1)] / F[pos(d0)], com pos(d) = pontos antes de d.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+# Como cada série acumula: taxa diária em % a.a. (base 252), taxa mensal em %,
+# ou indicador (sem fator acumulado; ex.: nível do Ibovespa, IPCA em 12 meses)
+KINDS = {
+    "selic": "daily_rate",
+    "cdi": "daily_rate",
+    "ipca": "monthly_rate",
+    "ipca_12m": "indicator",
+    "ibovespa": "indicator",
+}
+
+DateLike = Union[date, str, np.datetime64]
+
+
+def to_day(valor: DateLike) -> np.datetime64:
+    return np.datetime64(valor, "D")
+
+
+def period_rates(values: np.ndarray, kind: str) -> np.ndarray:
+    """Taxa de cada período (decimal) a partir dos valores publicados"""
+    values = np.asarray(values, dtype=float)
+    if kind == "daily_rate":
+        return np.power(1 + values / 100, 1 / 252) - 1
+    if kind == "monthly_rate":
+        return values / 100
+    raise ValueError(f"Série do tipo {kind} não tem fator acumulado")
+
+
+def cumulative_factors(rates: np.ndarray, start: float = 1.0) -> np.ndarray:
+    """Fatores acumulados com F[0] = start (n taxas -> n + 1 fatores)"""
+    fatores = np.empty(len(rates) + 1)
+    fatores[0] = start
+    np.cumprod(1 + rates, out=fatores[1:])
+    fatores[1:] *= start
+    return fatores
+
+
+class SeriesArrays:
+    """
+    Uma série aberta (arrays somente leitura, em memory map)
+
+    Atributos: name, kind, dates, values, factors (None para indicadores)
+    """
+
+    # Fatores com percentual diferente de 100% guardados em memória
+    MAX_SCALED = 8
+
+    def __init__(self, name: str, kind: str, dates: np.ndarray, values: np.ndarray, factors: Optional[np.ndarray]):
+        self.name = name
+        self.kind = kind
+        self.dates = dates
+        self.values = values
+        self.factors = factors
+        self._scaled: "OrderedDict[float, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def first(self) -> Optional[np.datetime64]:
+        return self.dates[0] if len(self.dates) else None
+
+    @property
+    def last(self) -> Optional[np.datetime64]:
+        return self.dates[-1] if len(self.dates) else None
+
+    def position(self, when) -> Union[int, np.ndarray]:
+        """Quantidade de pontos com data anterior a `when` (escalar ou array)"""
+        return np.searchsorted(self.dates, np.asarray(when, dtype="datetime64[D]"), side="left")
+
+    def range(self, start: DateLike = None, end: DateLike = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Datas e valores em [start, end] (views, sem cópia)"""
+        i = 0 if start is None else int(self.position(to_day(start)))
+        j = len(self.dates) if end is None else int(np.searchsorted(self.dates, to_day(end), side="right"))
+        return self.dates[i:j], self.values[i:j]
+
+    def value_at(self, when: DateLike) -> float:
+        """Último valor publicado até `when` (inclusive)"""
+        i = int(np.searchsorted(self.dates, to_day(when), side="right")) - 1
+        if i < 0:
+            raise KeyError(f"{self.name}: sem dados até {when}")
+        return float(self.values[i])
+
+    def values_at(self, when) -> np.ndarray:
+        """Versão vetorizada de value_at"""
+        when = np.asarray(when, dtype="datetime64[D]")
+        i = np.searchsorted(self.dates, when, side="right") - 1
+        if len(self.dates) == 0 or (i < 0).any():
+            raise KeyError(f"{self.name}: sem dados até {when.min()}")
+        return self.values[i]
+
+    def cumulative(self, percentual: float = 1.0) -> np.ndarray:
+        """
+        Fatores acumulados rendendo `percentual` da taxa (1.0 = 100%)
+
+        100% usa os fatores gravados; outros percentuais (ex.: CDB de 110% do
+        CDI, que rende 1 + 1,1 * taxa do dia) são calculados uma vez, em O(n),
+        e reaproveitados.
+        """
+        if self.factors is None:
+            raise ValueError(f"{self.name} é um indicador: não tem fator acumulado")
+        if percentual == 1.0:
+            return self.factors
+        chave = round(float(percentual), 12)
+        with self._lock:
+            fatores = self._scaled.get(chave)
+            if fatores is not None:
+                self._scaled.move_to_end(chave)
+                return fatores
+        fatores = cumulative_factors(percentual * period_rates(self.values, self.kind))
+        with self._lock:
+            self._scaled[chave] = fatores
+            while len(self._scaled) > self.MAX_SCALED:
+                self._scaled.popitem(last=False)
+        return fatores
+
+    def accumulated(self, start: DateLike, end: DateLike, percentual: float = 1.0) -> float:
+        """
+        Fator acumulado de start (aplicação) a end (resgate): 1.0123 = +1,23%
+
+        Para indicadores, a razão entre os valores em end e em start.
+        """
+        if self.kind == "indicator":
+            return self.value_at(end) / self.value_at(start)
+        self._check_range(start, end)
+        fatores = self.cumulative(percentual)
+        return float(fatores[self.position(to_day(end))] / fatores[self.position(to_day(start))])
+
+    def accumulated_many(self, starts, ends, percentual: float = 1.0) -> np.ndarray:
+        """Versão vetorizada de accumulated para arrays de datas"""
+        starts = np.asarray(starts, dtype="datetime64[D]")
+        ends = np.asarray(ends, dtype="datetime64[D]")
+        if len(starts) and len(ends):
+            self._check_range(starts.min(), ends.max())
+            if (starts > ends).any():
+                raise ValueError(f"{self.name}: data inicial depois da final")
+        fatores = self.cumulative(percentual)
+        return fatores[self.position(ends)] / fatores[self.position(starts)]
+
+    def log_factors_at(self, when, percentual: float = 1.0) -> np.ndarray:
+        """
+        log do fator acumulado até cada data de `when`
+
+        Taxas mensais rendem pro rata pelos dias corridos do mês (como o VNA
+        dos títulos atrelados ao IPCA); taxas diárias, pelos pontos anteriores
+        à data. exp(log_factors_at(fim) - log_factors_at(inicio)) equivale a
+        accumulated_many(inicio, fim) para taxas diárias.
+        """
+        when = np.asarray(when, dtype="datetime64[D]")
+        if when.size:
+            self._check_range(when.min(), when.max())
+        fatores = self.cumulative(percentual)
+        if self.kind != "monthly_rate":
+            return np.log(fatores[self.position(when)])
+        # Mês que contém cada data e fração já decorrida dele
+        k = np.searchsorted(self.dates, when, side="right") - 1
+        inicio_mes = self.dates[k]
+        dias_mes = ((inicio_mes.astype("datetime64[M]") + 1).astype("datetime64[D]") - inicio_mes).astype(np.int64)
+        fracao = (when - inicio_mes).astype(np.int64) / dias_mes
+        log_fatores = np.log(fatores)
+        return log_fatores[k] + fracao * (log_fatores[k + 1] - log_fatores[k])
+
+    @property
+    def limit(self) -> Optional[np.datetime64]:
+        """Último resgate coberto pelo histórico (um período depois do último ponto)"""
+        if not len(self.dates):
+            return None
+        if self.kind == "monthly_rate":
+            return (self.dates[-1].astype("datetime64[M]") + 1).astype("datetime64[D]")
+        return np.busday_offset(self.dates[-1], 1, roll="forward")
+
+    def _check_range(self, start, end) -> None:
+        if not len(self.dates) or to_day(start) < self.dates[0] or to_day(end) > self.limit:
+            raise ValueError(
+                f"{self.name}: intervalo {start} a {end} fora do histórico ({self.first} a {self.last})"
+            )
+        if to_day(start) > to_day(end):
+            raise ValueError(f"{self.name}: data inicial {start} depois da final {end}")
+
+
+class TimeSeriesStore:
+    """
+    Diretório de séries colunares versionadas
+
+    Cada gravação cria arquivos de uma nova versão e só então troca o
+    {nome}.json (os.replace): leitores nunca veem uma série pela metade, e os
+    que já abriram a versão anterior continuam com seus memory maps.
+    """
+
+    def __init__(self, root: str = "./data/history"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._open: Dict[str, Tuple[int, SeriesArrays]] = {}
+        self._lock = threading.Lock()
+
+    def _meta_path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.json")
+
+    def _array_path(self, name: str, version: int, column: str) -> str:
+        return os.path.join(self.root, f"{name}.{version}.{column}.npy")
+
+    def _read_meta(self, name: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def names(self) -> Iterable[str]:
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith(".json"))
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.exists(self._meta_path(name))
+
+    def open(self, name: str) -> SeriesArrays:
+        """
+        Série em memory map; reaberta só quando outra gravação (deste ou de
+        outro processo) troca a versão
+        """
+        try:
+            mtime = os.stat(self._meta_path(name)).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(f"Série sem histórico: {name}") from None
+        aberta = self._open.get(name)
+        if aberta is not None and aberta[0] == mtime:
+            return aberta[1]
+        meta = self._read_meta(name)
+        colunas = {
+            coluna: np.load(self._array_path(name, meta["version"], coluna), mmap_mode="r")
+            for coluna in meta["columns"]
+        }
+        serie = SeriesArrays(name, meta["kind"], colunas["dates"], colunas["values"], colunas.get("factors"))
+        with self._lock:
+            self._open[name] = (mtime, serie)
+        return serie
+
+    def write(self, name: str, dates, values, kind: str = None) -> SeriesArrays:
+        """Grava (substitui) a série inteira; datas precisam estar em ordem crescente"""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.asarray(values, dtype=float)
+        kind = kind or KINDS.get(name, "indicator")
+        if len(dates) != len(values):
+            raise ValueError("datas e valores com tamanhos diferentes")
+        if len(dates) > 1 and not (np.diff(dates) > np.timedelta64(0, "D")).all():
+            raise ValueError("datas devem ser estritamente crescentes")
+        factors = None if kind == "indicator" else cumulative_factors(period_rates(values, kind))
+        return self._commit(name, kind, dates, values, factors)
+
+    def append(self, name: str, dates, values, kind: str = None) -> SeriesArrays:
+        """
+        Acrescenta pontos posteriores ao último gravado (os demais são
+        ignorados). Os novos fatores continuam do último fator acumulado.
+        """
+        if name not in self:
+            return self.write(name, dates, values, kind)
+        atual = self.open(name)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.asarray(values, dtype=float)
+        novos = dates > atual.last if len(atual) else np.ones(len(dates), dtype=bool)
+        if not novos.any():
+            return atual
+        dates, values = dates[novos], values[novos]
+        factors = None
+        if atual.factors is not None:
+            continuacao = cumulative_factors(period_rates(values, atual.kind), start=float(atual.factors[-1]))
+            factors = np.concatenate([atual.factors, continuacao[1:]])
+        return self._commit(
+            name, atual.kind, np.concatenate([atual.dates, dates]), np.concatenate([atual.values, values]), factors
+        )
+
+    def _commit(self, name, kind, dates, values, factors) -> SeriesArrays:
+        with self._lock:
+            anterior = self._read_meta(name)
+            version = anterior["version"] + 1 if anterior else 1
+            colunas = {"dates": dates, "values": values}
+            if factors is not None:
+                colunas["factors"] = factors
+            for coluna, array in colunas.items():
+                caminho = self._array_path(name, version, coluna)
+                with open(caminho + ".tmp", "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(caminho + ".tmp", caminho)
+            meta = {
+                "name": name,
+                "kind": kind,
+                "version": version,
+                "columns": list(colunas),
+                "length": int(len(dates)),
+                "first": str(dates[0]) if len(dates) else None,
+                "last": str(dates[-1]) if len(dates) else None,
+            }
+            tmp = self._meta_path(name) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._meta_path(name))
+            if anterior:
+                for coluna in anterior["columns"]:
+                    try:
+                        os.remove(self._array_path(name, anterior["version"], coluna))
+                    except OSError:
+                        # Windows: arquivo ainda em memory map por algum leitor
+                        pass
+            self._open.pop(name, None)
+        return self.open(name)
+
+    def update_from(self, provider, names: Iterable[str] = None) -> Dict[str, int]:
+        """
+        Atualização incremental a partir de um provedor de market_data: pede
+        só os pontos posteriores ao último gravado de cada série
+
+        Returns:
+            Pontos acrescentados por série
+        """
+        acrescentados = {}
+        for name in names or KINDS:
+            if not provider.supports(name):
+                continue
+            ultimo = self.open(name).last if name in self else None
+            since = ultimo.astype(date) if ultimo is not None else None
+            pontos = provider.fetch(name, since)
+            if pontos:
+                self.append(name, [d for d, _ in pontos], [v for _, v in pontos])
+            acrescentados[name] = len(pontos)
+        return acrescentados
+
+
+def main(argv) -> int:
+    """
+    Atualiza o histórico em disco a partir de um provedor
+
+    Uso:
+        python timeseries.py [provedor] [diretório]
+        python timeseries.py synthetic ./data/history
+    """
+    from market_data import make_provider
+
+    provider = make_provider(argv[0] if argv else None)
+    if hasattr(provider, "history_days"):
+        # Primeira carga do SGS: o limite de uma consulta de série diária é de 10 anos
+        provider.history_days = 3650
+    store = TimeSeriesStore(argv[1] if len(argv) > 1 else os.path.join(os.getenv("FINAI_DATA_DIR", "./data"), "history"))
+    for name, pontos in store.update_from(provider).items():
+        serie = store.open(name)
+        print(f"{name}: +{pontos} pontos ({len(serie)} de {serie.first} a {serie.last})")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
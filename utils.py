@@ -5,21 +5,61 @@ Funções auxiliares para persistência e configurações
 
 import json
 import os
+import threading
 from datetime import datetime
 from typing import List, Dict, Any
 import hashlib
+import secrets
+
+import metrics
+from market_data import FALLBACK as MARKET_FALLBACK
+from storage import ConversationLog, ProfileStore, SQLiteConversationStore, VersionConflict
+
+# Backends de conversa: caminho relativo ao storage_path e construtor
+CONVERSATION_BACKENDS = {
+    "log": ("conversations", ConversationLog),
+    "sqlite": ("conversations.db", SQLiteConversationStore),
+}
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _shared_store(backend: str, storage_path: str):
+    """Uma instância por arquivo/diretório no processo (o log não admite dois escritores)"""
+    if backend not in CONVERSATION_BACKENDS:
+        raise ValueError(f"Backend deve ser um de: {', '.join(CONVERSATION_BACKENDS)}")
+    name, factory = CONVERSATION_BACKENDS[backend]
+    path = os.path.abspath(os.path.join(storage_path, name))
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = factory(path)
+        return _STORES[path]
+
+
+# Duração e falhas das operações do ConversationManager no armazenamento
+STORAGE_SECONDS = metrics.histogram("finai_storage_seconds", "Duração das operações de armazenamento", ("op",), metrics.FAST_BUCKETS)
+STORAGE_ERRORS = metrics.counter("finai_storage_errors_total", "Operações de armazenamento que falharam", ("op",))
+
 
 class ConversationManager:
     """
     Gerencia persistência de conversas e contexto do usuário
+
+    Backends (mesma API pública):
+    - "log" (padrão): log append-only (storage.ConversationLog); salvar uma
+      mensagem nova custa uma escrita, independente do número de usuários
+    - "sqlite": base SQLite em WAL (storage.SQLiteConversationStore)
     """
     
-    def __init__(self, storage_path: str = "./data"):
+    def __init__(self, storage_path: str = "./data", backend: str = None, store=None):
         """
         Inicializa gerenciador de conversas
         
         Args:
             storage_path: Diretório para armazenar dados
+            backend: "log" ou "sqlite" (padrão: variável FINAI_CONVERSATION_BACKEND ou "log")
+            store: Backend já construído (ignora `backend`)
         """
         self.storage_path = storage_path
         
@@ -28,7 +68,27 @@ class ConversationManager:
         
         self.conversations_file = os.path.join(storage_path, "conversations.json")
         self.user_profile_file = os.path.join(storage_path, "user_profile.json")
+        backend = backend or os.getenv("FINAI_CONVERSATION_BACKEND", "log")
+        self.store = store or _shared_store(backend, storage_path)
+        self.profiles = ProfileStore(os.path.join(storage_path, "profiles"))
+        self._migrate_legacy_file()
+        self._migrate_legacy_profiles()
     
+    def _migrate_legacy_file(self) -> None:
+        """Importa uma única vez o conversations.json do formato antigo"""
+        if not os.path.exists(self.conversations_file):
+            return
+        try:
+            with open(self.conversations_file, 'r', encoding='utf-8') as f:
+                conversations = json.load(f)
+            for user_id, data in conversations.items():
+                if self.store.count(user_id) == 0:
+                    self.store.replace(user_id, data.get("messages", []))
+            os.replace(self.conversations_file, self.conversations_file + ".migrated")
+        except Exception as e:
+            print(f"Erro ao migrar conversas antigas: {e}")
+    
+    @metrics.timed(STORAGE_SECONDS, op="save_conversation")
     def save_conversation(
         self, 
         user_id: str, 
@@ -37,6 +97,12 @@ class ConversationManager:
         """
         Salva conversa de um usuário
         
+        Se a conversa salva é o começo da nova (caso comum: a lista só cresceu),
+        grava apenas as mensagens novas; senão substitui o histórico. O prefixo
+        é conferido inteiro (das mais recentes para as antigas, parando na
+        primeira diferença): respostas repetidas tornam a última mensagem igual
+        sem que o histórico seja o mesmo.
+        
         Args:
             user_id: Identificador único do usuário
             conversation: Lista de mensagens
@@ -45,59 +111,91 @@ class ConversationManager:
             True se salvou com sucesso
         """
         try:
-            # Carregar conversas existentes
-            conversations = self._load_all_conversations()
-            
-            # Adicionar/atualizar conversa do usuário
-            conversations[user_id] = {
-                "messages": conversation,
-                "last_updated": datetime.now().isoformat(),
-                "message_count": len(conversation)
-            }
+            saved = self.store.count(user_id)
             
-            # Salvar
-            with open(self.conversations_file, 'w', encoding='utf-8') as f:
-                json.dump(conversations, f, ensure_ascii=False, indent=2)
+            if 0 < saved <= len(conversation) and self._is_prefix(user_id, conversation, saved):
+                self.store.append_many(user_id, conversation[saved:])
+            elif saved != 0 or conversation:
+                self.store.replace(user_id, conversation)
             
             return True
             
         except Exception as e:
+            STORAGE_ERRORS.labels(op="save_conversation").inc()
             print(f"Erro ao salvar conversa: {e}")
             return False
     
-    def load_conversation(self, user_id: str) -> List[Dict[str, Any]]:
+    def _is_prefix(self, user_id: str, conversation: List[Dict[str, Any]], saved: int) -> bool:
+        # As `saved` mensagens gravadas são exatamente conversation[:saved]?
+        stored = self.store.iter_messages(user_id, newest_first=True)
+        return all(
+            next(stored, None) == message for message in reversed(conversation[:saved])
+        ) and next(stored, None) is None
+    
+    @metrics.timed(STORAGE_SECONDS, op="append")
+    def append_message(self, user_id: str, message: Dict[str, Any]) -> bool:
+        """
+        Acrescenta uma mensagem à conversa do usuário (O(1))
+        
+        Args:
+            user_id: Identificador do usuário
+            message: Mensagem ({"role": ..., "content": ...})
+            
+        Returns:
+            True se salvou com sucesso
+        """
+        try:
+            self.store.append(user_id, message)
+            return True
+        except Exception as e:
+            STORAGE_ERRORS.labels(op="append").inc()
+            print(f"Erro ao salvar mensagem: {e}")
+            return False
+    
+    @metrics.timed(STORAGE_SECONDS, op="load")
+    def load_conversation(self, user_id: str, limit: int = None, before: float = None) -> List[Dict[str, Any]]:
         """
         Carrega conversa de um usuário
         
         Args:
             user_id: Identificador do usuário
+            limit: Se informado, só as últimas `limit` mensagens
+            before: Só mensagens anteriores a este cursor (ver load_conversation_page)
             
         Returns:
             Lista de mensagens ou lista vazia
         """
-        conversations = self._load_all_conversations()
-        
-        if user_id in conversations:
-            return conversations[user_id].get("messages", [])
-        
-        return []
+        return self.store.load(user_id, limit=limit, before=before)
     
-    def _load_all_conversations(self) -> Dict[str, Any]:
+    @metrics.timed(STORAGE_SECONDS, op="page")
+    def load_conversation_page(self, user_id: str, limit: int, before: float = None) -> tuple:
         """
-        Carrega todas as conversas do arquivo
+        Carrega uma página da conversa, da mais recente para as anteriores
         
+        Args:
+            user_id: Identificador do usuário
+            limit: Mensagens por página
+            before: Cursor retornado pela página seguinte (None = mais recentes)
+            
+        Returns:
+            Tupla (mensagens em ordem cronológica, cursor da página anterior ou None)
+        """
+        return self.store.page(user_id, limit, before)
+
+    def iter_conversation(self, user_id: str, newest_first: bool = False):
+        """
+        Percorre a conversa sob demanda (ex.: exportação em PDF)
+
+        Args:
+            user_id: Identificador do usuário
+            newest_first: True para ler das mais recentes para as anteriores
+
         Returns:
-            Dicionário com todas as conversas
+            Iterador de mensagens
         """
-        if os.path.exists(self.conversations_file):
-            try:
-                with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        
-        return {}
+        return self.store.iter_messages(user_id, newest_first=newest_first)
     
+    @metrics.timed(STORAGE_SECONDS, op="delete")
     def delete_conversation(self, user_id: str) -> bool:
         """
         Remove conversa de um usuário
@@ -109,51 +207,63 @@ class ConversationManager:
             True se removeu com sucesso
         """
         try:
-            conversations = self._load_all_conversations()
-            
-            if user_id in conversations:
-                del conversations[user_id]
-                
-                with open(self.conversations_file, 'w', encoding='utf-8') as f:
-                    json.dump(conversations, f, ensure_ascii=False, indent=2)
-                
-                return True
-            
-            return False
-            
+            return self.store.delete(user_id)
         except:
+            STORAGE_ERRORS.labels(op="delete").inc()
             return False
     
-    def save_user_profile(self, user_id: str, profile: Dict[str, Any]) -> bool:
+    @metrics.timed(STORAGE_SECONDS, op="save_profile")
+    def save_user_profile(self, user_id: str, profile: Dict[str, Any], expected_version: int = None) -> bool:
         """
         Salva perfil/preferências do usuário
         
         Args:
             user_id: Identificador do usuário
             profile: Dados do perfil
+            expected_version: Se informado, só grava se o perfil ainda estiver nesta
+                versão (ver load_user_profile_versioned)
             
         Returns:
-            True se salvou com sucesso
+            True se salvou com sucesso (False também em conflito de versão)
         """
         try:
-            # Carregar perfis existentes
-            profiles = self._load_all_profiles()
-            
-            # Adicionar timestamp
-            profile["last_updated"] = datetime.now().isoformat()
-            
-            # Atualizar perfil
-            profiles[user_id] = profile
+            if expected_version is None:
+                self.profiles.put(user_id, profile)
+            else:
+                self.profiles.compare_and_swap(user_id, expected_version, profile)
+            return True
             
-            # Salvar
-            with open(self.user_profile_file, 'w', encoding='utf-8') as f:
-                json.dump(profiles, f, ensure_ascii=False, indent=2)
+        except VersionConflict:
+            return False
+        except Exception as e:
+            STORAGE_ERRORS.labels(op="save_profile").inc()
+            print(f"Erro ao salvar perfil: {e}")
+            return False
+    
+    @metrics.timed(STORAGE_SECONDS, op="update_profile")
+    def update_user_profile(self, user_id: str, fields: Dict[str, Any], expected_version: int = None) -> bool:
+        """
+        Atualiza só os campos informados do perfil
+        
+        Args:
+            user_id: Identificador do usuário
+            fields: Campos a gravar
+            expected_version: Versão lida (opcional, compare-and-swap)
             
+        Returns:
+            True se salvou com sucesso
+        """
+        try:
+            self.profiles.update(user_id, fields, expected_version=expected_version)
             return True
-            
-        except:
+        except VersionConflict:
+            return False
+        except Exception as e:
+            STORAGE_ERRORS.labels(op="update_profile").inc()
+            print(f"Erro ao atualizar perfil: {e}")
             return False
     
+    @metrics.timed(STORAGE_SECONDS, op="load_profile")
     def load_user_profile(self, user_id: str) -> Dict[str, Any]:
         """
         Carrega perfil do usuário
@@ -164,24 +274,31 @@ class ConversationManager:
         Returns:
             Dicionário com perfil ou dicionário vazio
         """
-        profiles = self._load_all_profiles()
-        return profiles.get(user_id, {})
+        return self.profiles.get(user_id)[0]
     
-    def _load_all_profiles(self) -> Dict[str, Any]:
+    @metrics.timed(STORAGE_SECONDS, op="load_profile")
+    def load_user_profile_versioned(self, user_id: str) -> tuple:
         """
-        Carrega todos os perfis
+        Carrega perfil e versão (para gravar depois com expected_version)
         
         Returns:
-            Dicionário com perfis
+            Tupla (perfil, versão); versão 0 se o perfil não existe
         """
-        if os.path.exists(self.user_profile_file):
-            try:
-                with open(self.user_profile_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        
-        return {}
+        return self.profiles.get(user_id)
+    
+    def _migrate_legacy_profiles(self) -> None:
+        """Importa uma única vez o user_profile.json do formato antigo"""
+        if not os.path.exists(self.user_profile_file):
+            return
+        try:
+            with open(self.user_profile_file, 'r', encoding='utf-8') as f:
+                profiles = json.load(f)
+            for user_id, profile in profiles.items():
+                if self.profiles.get(user_id)[1] == 0:
+                    self.profiles.put(user_id, profile)
+            os.replace(self.user_profile_file, self.user_profile_file + ".migrated")
+        except Exception as e:
+            print(f"Erro ao migrar perfis antigos: {e}")
 
 
 def generate_user_id(identifier: str = None) -> str:
@@ -189,15 +306,16 @@ def generate_user_id(identifier: str = None) -> str:
     Gera ID único para usuário
     
     Args:
-        identifier: String identificadora (ex: email, IP)
+        identifier: Identidade já autenticada (ex: e-mail do login). Sem ela,
+            o ID é aleatório (secrets), impossível de adivinhar
         
     Returns:
-        Hash MD5 como identificador
+        Hash SHA-256 do identificador ou token aleatório
     """
     if identifier is None:
-        identifier = str(datetime.now().timestamp())
+        return secrets.token_urlsafe(24)
     
-    return hashlib.md5(identifier.encode()).hexdigest()
+    return hashlib.sha256(identifier.encode()).hexdigest()
 
 
 def load_conversation_history() -> List[Dict[str, Any]]:
@@ -249,6 +367,35 @@ def format_currency(value: float, currency: str = "BRL") -> str:
         return f"{value:,.2f}"
 
 
+def format_dataframe(
+    df,
+    currency_columns: List[str] = (),
+    percent_columns: List[str] = (),
+    currency: str = "BRL"
+):
+    """
+    Formata colunas numéricas de um DataFrame para exibição
+
+    Os cálculos devem manter as colunas numéricas (para ordenar e agregar);
+    esta função é aplicada apenas na hora de mostrar ou exportar.
+
+    Args:
+        df: DataFrame com colunas numéricas
+        currency_columns: Colunas formatadas como moeda
+        percent_columns: Colunas já em % (ex: 12.5 -> "12,50%")
+        currency: Código da moeda
+
+    Returns:
+        Cópia do DataFrame com as colunas indicadas como texto
+    """
+    formatted = df.copy()
+    for column in currency_columns:
+        formatted[column] = [format_currency(v, currency) for v in df[column]]
+    for column in percent_columns:
+        formatted[column] = [f"{v:.2f}%".replace(".", ",") for v in df[column]]
+    return formatted
+
+
 def validate_numeric_input(value: Any, min_value: float = None, max_value: float = None) -> bool:
     """
     Valida entrada numérica
@@ -439,7 +586,8 @@ class FinancialDataValidator:
 
 # Constantes úteis
 FINANCIAL_CONSTANTS = {
-    "TAXA_SELIC_ATUAL": 0.1075,  # Atualizar periodicamente
+    # Só a referência sem provedor: a taxa atual vem de market_data
+    "TAXA_SELIC_ATUAL": MARKET_FALLBACK["selic"] / 100,
     "IPCA_ANUAL_MEDIO": 0.045,    # Média histórica
     "LIMITE_FGC": 250000,          # Limite de garantia FGC
     "ALIQUOTA_IR": {               # Tabela regressiva IR